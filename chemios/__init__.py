@@ -1,4 +1,4 @@
-__all__ = ['pumps', 'temperature_controllers', 'spectrometers']
+__all__ = ['pumps', 'temperature_controllers', 'spectrometers', 'protocols', 'recording', 'control', 'simulation']
 
 # Set default logging handler to avoid "No handler found" warnings.
 import logging
@@ -8,3 +8,20 @@ except ImportError:
     class NullHandler(logging.Handler):
         def emit(self, record):
             pass
+
+from ._constants import StatusCodes
+from ._lazy import lazy_exports
+
+#Subpackages are imported on first use, so `import chemios` stays fast
+_exports = {
+            'pumps': '.pumps',
+            'temperature_controllers': '.temperature_controllers',
+            'spectrometers': '.spectrometers',
+            'protocols': '.protocols',
+            'recording': '.recording',
+            'control': '.control',
+            'simulation': '.simulation',
+            'Protocol': '.protocols',
+            'ProtocolScheduler': '.protocols'
+           }
+__getattr__, __dir__ = lazy_exports(__name__, _exports)
@@ -0,0 +1,38 @@
+''' Chemios Constants
+'''
+
+class StatusCodes(object):
+    '''Status codes used to report the state of protocols and devices
+
+    Each status is a string of the code followed by its name and,
+    optionally, a short description (e.g., "200 Running - Heating reactor").
+
+    Attributes:
+        IDLE (int): Code for a protocol that has not started
+        RUNNING (int): Code for a protocol that is currently running
+        STOPPED (int): Code for a protocol that has finished or was stopped
+    '''
+    IDLE = 100
+    RUNNING = 200
+    STOPPED = 300
+
+    @staticmethod
+    def _format(code, name, text=None):
+        if text:
+            return "{} {} - {}".format(code, name, text)
+        return "{} {}".format(code, name)
+
+    @classmethod
+    def idle(cls, text=None):
+        '''Idle status with optional description text'''
+        return cls._format(cls.IDLE, "Idle", text)
+
+    @classmethod
+    def running(cls, text=None):
+        '''Running status with optional description text'''
+        return cls._format(cls.RUNNING, "Running", text)
+
+    @classmethod
+    def stopped(cls, text=None):
+        '''Stopped status with optional description text'''
+        return cls._format(cls.STOPPED, "Stopped", text)
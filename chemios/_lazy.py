@@ -0,0 +1,46 @@
+''' Chemios Lazy Import Module
+
+Lets a package name its exports without importing them, so a program only
+pays for the drivers (and their numpy, tinydb or minimalmodbus imports) it
+actually uses.
+'''
+import importlib
+import sys
+
+
+def lazy_exports(package, exports):
+    '''Module __getattr__ and __dir__ (PEP 562) that import exports on first use
+
+    Args:
+        package (str): __name__ of the package
+        exports (dict): Relative module of each exported name, e.g.
+            {'Chemyx': '._chemyx'}. A name whose module is '.' + name is the
+            subpackage itself.
+
+    Returns:
+        tuple: (__getattr__, __dir__) to assign in the package's __init__
+
+    Note:
+        Python before 3.7 ignores a module __getattr__, so there every export
+        is imported at once.
+    '''
+    namespace = sys.modules[package].__dict__
+
+    def __getattr__(name):
+        try:
+            module_name = exports[name]
+        except KeyError:
+            raise AttributeError("module {!r} has no attribute {!r}".format(package, name))
+        module = importlib.import_module(module_name, package)
+        value = module if module_name == '.' + name else getattr(module, name)
+        #Later lookups find the name directly
+        namespace[name] = value
+        return value
+
+    def __dir__():
+        return sorted(set(namespace) | set(exports))
+
+    if sys.version_info < (3, 7):
+        for name in exports:
+            __getattr__(name)
+    return __getattr__, __dir__
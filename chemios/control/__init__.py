@@ -0,0 +1,15 @@
+from chemios._lazy import lazy_exports
+
+#Exports are imported on first use
+_exports = {
+            'PID': '._pid',
+            'SetpointProfile': '._pid',
+            'RateLimiter': '._actuators',
+            'PumpActuator': '._actuators',
+            'SpectralSensor': '._sensors',
+            'TemperatureSensor': '._sensors',
+            'ControlLoop': '._loop',
+            'LoopMetrics': '._loop'
+           }
+__all__ = list(_exports)
+__getattr__, __dir__ = lazy_exports(__name__, _exports)
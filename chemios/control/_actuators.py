@@ -0,0 +1,115 @@
+''' Chemios Actuator Module
+
+Limits on what a control loop may ask of a device, and the adapters that
+turn loop outputs into device commands.
+'''
+import time
+
+
+class RateLimiter(object):
+    '''Class to keep actuator commands within range and slew rate
+
+    Attributes:
+        minimum (float, optional): Lowest value
+        maximum (float, optional): Highest value
+        max_rate (float, optional): Largest change per second. Defaults to unlimited.
+        deadband (float, optional): Changes smaller than this keep the last value, which
+            spares slow serial devices needless commands. Defaults to 0.
+
+    Note:
+        Keep a pump between 0.05 and 2 mL/min, changing by at most 0.1 mL/min per second::
+
+            limiter = RateLimiter(minimum=0.05, maximum=2, max_rate=0.1, deadband=0.005)
+            rate = limiter.limit(pid_output)
+    '''
+    def __init__(self, minimum=None, maximum=None, max_rate=None, deadband=0.0):
+        if minimum is not None and maximum is not None and minimum > maximum:
+            raise ValueError("minimum {} is above maximum {}".format(minimum, maximum))
+        if max_rate is not None and max_rate <= 0:
+            raise ValueError("max_rate must be positive")
+        self.minimum = minimum
+        self.maximum = maximum
+        self.max_rate = max_rate
+        self.deadband = deadband
+        self.reset()
+
+    def reset(self, value=None, timestamp=None):
+        '''Start from a known value, e.g. the rate a pump is running at
+
+        Args:
+            value (float, optional): Current actuator value. Defaults to unknown.
+            timestamp (float, optional): time.monotonic seconds of value. Defaults to now.
+        '''
+        self.value = value
+        self.timestamp = None if value is None else (time.monotonic() if timestamp is None else timestamp)
+        self.limited = False
+
+    def limit(self, value, timestamp=None):
+        '''Value the actuator may be set to now
+
+        Args:
+            value (float): Requested value
+            timestamp (float, optional): time.monotonic seconds. Defaults to now.
+
+        Returns:
+            float: Allowed value; self.limited is True if it differs from the request
+        '''
+        if timestamp is None:
+            timestamp = time.monotonic()
+        allowed = value
+        if self.minimum is not None:
+            allowed = max(allowed, self.minimum)
+        if self.maximum is not None:
+            allowed = min(allowed, self.maximum)
+        if self.value is not None:
+            #The deadband applies to the request, so slow slewing cannot be held in it
+            if abs(allowed - self.value) < self.deadband:
+                allowed = self.value
+            elif self.max_rate is not None:
+                step = self.max_rate*max(timestamp - self.timestamp, 0)
+                allowed = min(max(allowed, self.value - step), self.value + step)
+        self.limited = allowed != value
+        #Time spent holding a value earns no slew allowance
+        self.value = allowed
+        self.timestamp = timestamp
+        return allowed
+
+
+class PumpActuator(object):
+    '''Class to drive a pump's flow rate from a control loop
+
+    Commands are only sent when the limited value changes.
+
+    Attributes:
+        pump (:obj:`chemios.pumps.Pump`): Pump to drive
+        units (str, optional): Units of the loop output. Defaults to 'mL/min'.
+        limiter (:obj:`RateLimiter`, optional): Range and slew limits of the rate
+        resolution (float, optional): Step the rate is rounded to before sending. Defaults to 0.001,
+            the resolution of the pump commands.
+    '''
+    def __init__(self, pump, units='mL/min', limiter=None, resolution=0.001):
+        self.pump = pump
+        self.units = units
+        self.limiter = limiter
+        self.resolution = resolution
+        self.commands = 0
+        self._sent = None
+
+    def __call__(self, value):
+        '''Set the pump rate
+
+        Args:
+            value (float): Requested rate in self.units
+
+        Returns:
+            float: Rate the pump was left at
+        '''
+        if self.limiter is not None:
+            value = self.limiter.limit(value)
+        if self.resolution:
+            value = round(value/self.resolution)*self.resolution
+        if value != self._sent:
+            self.pump.set_rate({'value': value, 'units': self.units})
+            self.commands += 1
+            self._sent = value
+        return value
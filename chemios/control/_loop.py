@@ -0,0 +1,207 @@
+''' Chemios Control Loop Module
+
+Runs sensor -> controller -> actuator on a fixed period on its own thread
+and keeps latency and jitter of every iteration as metrics.
+'''
+import collections
+import logging
+import math
+import threading
+import time
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return math.nan
+    return ordered[min(int(fraction*len(ordered)), len(ordered) - 1)]
+
+
+class LoopMetrics(object):
+    '''Class to hold the timing metrics of a control loop
+
+    Attributes:
+        period (float): Scheduled seconds between iterations
+        size (int, optional): Iterations kept for the statistics. Defaults to 1000.
+    '''
+    def __init__(self, period, size=1000):
+        self.period = period
+        self.latency = collections.deque(maxlen=size)
+        self.jitter = collections.deque(maxlen=size)
+        self.duration = collections.deque(maxlen=size)
+        self.iterations = 0
+        self.overruns = 0
+        self.errors = 0
+
+    def record(self, latency, jitter, duration):
+        '''Add one iteration
+
+        Args:
+            latency (float): Seconds from the measurement to the actuator command finishing
+            jitter (float): Seconds the iteration started after its scheduled time
+            duration (float): Seconds the iteration took
+        '''
+        self.iterations += 1
+        self.latency.append(latency)
+        self.jitter.append(jitter)
+        self.duration.append(duration)
+
+    def summary(self):
+        '''Statistics of the kept iterations
+
+        Returns:
+            dict: 'iterations', 'overruns', 'errors', and the mean, 95th percentile and
+            maximum of 'latency', 'jitter' and 'duration' in seconds
+        '''
+        summary = {
+                   'iterations': self.iterations,
+                   'overruns': self.overruns,
+                   'errors': self.errors
+                  }
+        for name in ('latency', 'jitter', 'duration'):
+            values = getattr(self, name)
+            summary[name + '_mean'] = sum(values)/len(values) if values else math.nan
+            summary[name + '_p95'] = _percentile(values, 0.95)
+            summary[name + '_max'] = max(values) if values else math.nan
+        return summary
+
+
+class ControlLoop(object):
+    '''Class to run a feedback loop on a fixed period
+
+    Iterations are scheduled on a fixed grid from the start, so timing errors
+    do not accumulate. An iteration that overruns its period skips the missed
+    slots rather than running them in a burst; each skip counts as an overrun.
+
+    Attributes:
+        sensor (callable): Returns a measurement, or a (measurement, time.monotonic seconds
+            it was taken) pair, e.g. :obj:`SpectralSensor` or :obj:`TemperatureSensor`
+        controller (object): Has update(measurement, dt, setpoint) returning the output,
+            e.g. :obj:`PID`, and optionally track(applied)
+        actuator (callable): Takes the output and returns the value applied, e.g.
+            :obj:`PumpActuator`
+        period (float): Seconds between iterations
+        setpoint (float or callable, optional): Setpoint, or a function of the seconds since
+            start such as :obj:`SetpointProfile`. Defaults to the controller's own setpoint.
+        history_size (int, optional): Iterations kept in self.history. Defaults to 1000.
+
+    Note:
+        Hold a fluorescence peak at 520 nm with the rate of one pump::
+
+            spec.start_acquisition(10000)
+            sensor = SpectralSensor(spec, FeatureExtractor(spec.get_wavelengths(), (450, 650), track=20))
+            actuator = PumpActuator(pump, limiter=RateLimiter(0.05, 2, max_rate=0.1))
+            with ControlLoop(sensor, PID(0.02, 0.005, setpoint=520, bias=0.5), actuator, period=0.5) as loop:
+                time.sleep(600)
+            print(loop.metrics.summary())
+    '''
+    def __init__(self, sensor, controller, actuator, period, setpoint=None, history_size=1000):
+        if period <= 0:
+            raise ValueError("period must be positive")
+        self.sensor = sensor
+        self.controller = controller
+        self.actuator = actuator
+        self.period = period
+        self.setpoint = setpoint
+        self.metrics = LoopMetrics(period, history_size)
+        self.history = collections.deque(maxlen=history_size)
+
+        #Internal variables
+        self._start = None
+        self._last_step = None
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    @property
+    def running(self):
+        '''True while the loop thread is running'''
+        return self._thread is not None and self._thread.is_alive()
+
+    def _setpoint(self, now):
+        if self.setpoint is None:
+            return None
+        if callable(self.setpoint):
+            return self.setpoint(now - self._start)
+        return self.setpoint
+
+    def step(self, scheduled=None):
+        '''Run one iteration
+
+        Args:
+            scheduled (float, optional): time.monotonic seconds the iteration was due.
+                Defaults to now.
+
+        Returns:
+            dict: 'time', 'setpoint', 'measurement', 'output', 'applied' and 'latency'
+        '''
+        started = time.monotonic()
+        if scheduled is None:
+            scheduled = started
+        if self._start is None:
+            self._start = started
+        try:
+            measurement = self.sensor()
+            if isinstance(measurement, tuple):
+                measurement, measured = measurement
+            else:
+                measured = started
+            setpoint = self._setpoint(started)
+            dt = self.period if self._last_step is None else started - self._last_step
+            output = self.controller.update(measurement, dt, setpoint)
+            applied = self.actuator(output)
+            if hasattr(self.controller, 'track') and applied is not None:
+                self.controller.track(applied)
+        except Exception as e:
+            self.metrics.errors += 1
+            logging.warning("Control loop iteration failed: {}".format(e))
+            return None
+        finally:
+            self._last_step = started
+        finished = time.monotonic()
+        record = {
+                  'time': started - self._start,
+                  'setpoint': getattr(self.controller, 'setpoint', setpoint),
+                  'measurement': measurement,
+                  'output': output,
+                  'applied': applied,
+                  'latency': finished - measured
+                 }
+        self.history.append(record)
+        self.metrics.record(record['latency'], started - scheduled, finished - started)
+        return record
+
+    def start(self):
+        '''Start the loop on its own thread'''
+        if self.running:
+            raise ValueError("Control loop is already running")
+        self._stop_event.clear()
+        self._start = time.monotonic()
+        self._last_step = None
+        self._thread = threading.Thread(target=self._run, daemon=True, name='ControlLoop')
+        self._thread.start()
+
+    def stop(self):
+        '''Stop the loop after the current iteration'''
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        scheduled = self._start
+        while not self._stop_event.is_set():
+            self.step(scheduled)
+            scheduled += self.period
+            now = time.monotonic()
+            if now > scheduled:
+                missed = int((now - scheduled)//self.period) + 1
+                self.metrics.overruns += missed
+                scheduled += missed*self.period
+            self._stop_event.wait(scheduled - time.monotonic())
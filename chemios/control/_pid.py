@@ -0,0 +1,156 @@
+''' Chemios PID Module
+
+Controllers for closed-loop experiments: a PID with anti-windup and a
+setpoint profile for tracking setpoints that change over a run.
+'''
+import bisect
+
+
+def _clamp(value, limits):
+    low, high = limits
+    if low is not None and value < low:
+        return low
+    if high is not None and value > high:
+        return high
+    return value
+
+
+class PID(object):
+    '''Class for a discrete PID controller
+
+    The derivative acts on the measurement, so setpoint steps do not kick
+    the output. The integral stops growing while the output is saturated,
+    and :meth:`track` back-calculates it from the value the actuator really
+    applied, so a rate-limited pump does not wind it up either.
+
+    Attributes:
+        kp (float): Proportional gain
+        ki (float, optional): Integral gain per second. Defaults to 0.
+        kd (float, optional): Derivative gain in seconds. Defaults to 0.
+        setpoint (float, optional): Target of the measurement. Defaults to 0.
+        output_limits (tuple, optional): (low, high) output, either may be None.
+            Defaults to unlimited.
+        bias (float, optional): Output with zero error, e.g. the starting pump rate.
+            Defaults to 0.
+        derivative_filter (float, optional): Time constant in seconds of a low pass filter
+            on the derivative. Defaults to 0 (unfiltered).
+        reverse (bool, optional): If true, a measurement above the setpoint raises the
+            output, e.g. for a diluent pump. Defaults to False.
+
+    Note:
+        Call update once per period::
+
+            pid = PID(kp=0.5, ki=0.1, setpoint=520, output_limits=(0.05, 2), bias=0.5)
+            rate = pid.update(peak_wavelength, dt=1.0)
+    '''
+    def __init__(self, kp, ki=0.0, kd=0.0, setpoint=0.0, output_limits=(None, None), bias=0.0,
+                 derivative_filter=0.0, reverse=False):
+        low, high = output_limits
+        if low is not None and high is not None and low > high:
+            raise ValueError("Lower output limit {} is above the upper limit {}".format(low, high))
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.setpoint = setpoint
+        self.output_limits = (low, high)
+        self.bias = bias
+        self.derivative_filter = derivative_filter
+        self.reverse = reverse
+        self.reset()
+
+    def reset(self):
+        '''Clear the integral and derivative state'''
+        self.integral = 0.0
+        self.derivative = 0.0
+        self.output = None
+        self.components = {'p': 0.0, 'i': 0.0, 'd': 0.0}
+        self._last_measurement = None
+
+    def update(self, measurement, dt, setpoint=None):
+        '''Compute the output for a new measurement
+
+        Args:
+            measurement (float): Latest measurement
+            dt (float): Seconds since the previous update
+            setpoint (float, optional): New setpoint. Defaults to self.setpoint.
+
+        Returns:
+            float: Output within output_limits
+        '''
+        if setpoint is not None:
+            self.setpoint = setpoint
+        if dt <= 0:
+            raise ValueError("dt must be positive")
+        sign = -1 if self.reverse else 1
+        error = sign*(self.setpoint - measurement)
+
+        proportional = self.kp*error
+        if self._last_measurement is not None and self.kd:
+            rate = -sign*(measurement - self._last_measurement)/dt
+            alpha = dt/(self.derivative_filter + dt)
+            self.derivative += alpha*(rate - self.derivative)
+        self._last_measurement = measurement
+        derivative = self.kd*self.derivative
+
+        #Only integrate while that does not push a saturated output further out
+        integral = self.integral + self.ki*error*dt
+        unclamped = self.bias + proportional + integral + derivative
+        output = _clamp(unclamped, self.output_limits)
+        if output == unclamped or (output - unclamped)*error > 0:
+            self.integral = integral
+
+        output = _clamp(self.bias + proportional + self.integral + derivative, self.output_limits)
+        self.components = {'p': proportional, 'i': self.integral, 'd': derivative}
+        self.output = output
+        return output
+
+    def track(self, applied):
+        '''Back-calculate the integral from the output the actuator really applied
+
+        Args:
+            applied (float): Value the actuator was set to
+        '''
+        if self.output is None or applied == self.output:
+            return
+        self.integral += applied - self.output
+        self.components['i'] = self.integral
+        self.output = applied
+
+
+class SetpointProfile(object):
+    '''Class for a setpoint that changes along a run
+
+    The setpoint is interpolated linearly between (seconds, setpoint) points
+    and held at the first and last values outside them.
+
+    Attributes:
+        points (list): (seconds since the start, setpoint) pairs
+
+    Note:
+        Ramp from 500 to 540 nm over ten minutes, then hold::
+
+            profile = SetpointProfile([(0, 500), (600, 540)])
+            loop = ControlLoop(sensor, pid, actuator, period=1.0, setpoint=profile)
+    '''
+    def __init__(self, points):
+        points = sorted((float(t), float(value)) for t, value in points)
+        if not points:
+            raise ValueError("A setpoint profile needs at least one point")
+        self.times = [t for t, value in points]
+        self.values = [value for t, value in points]
+
+    def __call__(self, elapsed):
+        '''Setpoint elapsed seconds after the start'''
+        i = bisect.bisect_right(self.times, elapsed)
+        if i == 0:
+            return self.values[0]
+        if i == len(self.times):
+            return self.values[-1]
+        t0, t1 = self.times[i - 1], self.times[i]
+        v0, v1 = self.values[i - 1], self.values[i]
+        return v0 + (v1 - v0)*(elapsed - t0)/(t1 - t0)
+
+    @property
+    def duration(self):
+        '''Seconds until the last point'''
+        return self.times[-1]
@@ -0,0 +1,78 @@
+''' Chemios Sensor Module
+
+Adapters that give a control loop one measurement per call, with the time
+the measurement was taken so the loop can report true latency.
+'''
+import math
+import time
+
+
+class SpectralSensor(object):
+    '''Class to measure a spectral feature during continuous acquisition
+
+    Each call takes the newest frame from the spectrometer's acquisition
+    buffer, so the loop never works through a backlog of stale spectra.
+
+    Attributes:
+        spectrometer (:obj:`chemios.spectrometers.OceanOptics`): Spectrometer that is acquiring
+            continuously (see start_acquisition)
+        extractor (:obj:`chemios.spectrometers.FeatureExtractor`): Extractor for the frames
+        feature (str, optional): 'peak_wavelength', 'peak_height', 'fwhm' or 'bands'.
+            Defaults to 'peak_wavelength'.
+        band (int, optional): Index of the band area when feature is 'bands'. Defaults to 0.
+        transform (callable, optional): Applied to the intensities before extraction, e.g.
+            conversion to absorbance
+        timeout (float, optional): Seconds to wait for a frame. Defaults to waiting forever.
+    '''
+    def __init__(self, spectrometer, extractor, feature='peak_wavelength', band=0, transform=None, timeout=None):
+        self.spectrometer = spectrometer
+        self.extractor = extractor
+        self.feature = feature
+        self.band = band
+        self.transform = transform
+        self.timeout = timeout
+        self.features = None
+
+    def __call__(self):
+        '''Measure the feature
+
+        Returns:
+            tuple: (value, time.monotonic seconds the frame was acquired)
+        '''
+        frame = self.spectrometer.latest_frame(self.timeout)
+        if frame is None:
+            raise IOError("Spectrometer acquisition has stopped")
+        values = frame['intensities']
+        if self.transform is not None:
+            values = self.transform(values)
+        self.features = self.extractor.extract(values, frame['timestamp'])
+        value = self.features[self.feature]
+        if self.feature == 'bands':
+            value = value[self.band]
+        value = float(value)
+        if math.isnan(value):
+            raise ValueError("{} is not resolved in the frame".format(self.feature))
+        return value, frame['timestamp']
+
+
+class TemperatureSensor(object):
+    '''Class to measure the temperature of a controller
+
+    Attributes:
+        controller (object): Controller with get_current_temperature, e.g.
+            :obj:`chemios.temperature_controllers.OmegaCN9300Series`
+    '''
+    def __init__(self, controller):
+        self.controller = controller
+
+    def __call__(self):
+        '''Measure the temperature
+
+        Returns:
+            tuple: (temperature in deg C, time.monotonic seconds of the reading, or of
+            the start of the read if the controller gives no timestamp)
+        '''
+        #Stamped before the read, like plain sensors, so the bus transaction counts as latency
+        started = time.monotonic()
+        reading = self.controller.get_current_temperature()
+        return reading['current_temp'], reading.get('timestamp', started)
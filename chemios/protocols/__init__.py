@@ -0,0 +1,12 @@
+from chemios._lazy import lazy_exports
+
+#Exports are imported on first use
+_exports = {
+            'Protocol': '._base',
+            'ProtocolScheduler': '._scheduler',
+            'DeviceLease': '._scheduler',
+            'SteadyStateScheduler': '._steady_state',
+            'residence_time': '._steady_state'
+           }
+__all__ = list(_exports)
+__getattr__, __dir__ = lazy_exports(__name__, _exports)
@@ -0,0 +1,51 @@
+''' Chemios Protocol Module
+'''
+import queue
+import threading
+from chemios._constants import StatusCodes
+
+class Protocol(object):
+    '''Base class for protocols
+
+    A protocol is a sequence of steps run against a set of devices
+    (pumps, spectrometers, temperature controllers).  Subclasses implement
+    :meth:`start`, which may be a coroutine or a normal method.
+
+    Attributes:
+        name (str): Reference name for the protocol (optional)
+        devices (list): Device objects driven by the protocol. The
+            :class:`ProtocolScheduler` leases all of them before calling start.
+        buffer_size (int): Maximum number of readings held in
+            readings_buffer. Defaults to 0 (unbounded).
+
+    Notes:
+        Declare every device the protocol will touch in devices.  Leasing
+        extra devices from inside start can deadlock with other protocols.
+    '''
+    def __init__(self, name=None, devices=None, buffer_size=0):
+        self.name = name if name else type(self).__name__
+        self.devices = list(devices) if devices else []
+        self.state = StatusCodes.idle()
+        self.readings_buffer = queue.Queue(maxsize=buffer_size)
+
+        #Internal variables
+        self._step = 0
+        self._steps = None
+        self._stop_event = threading.Event()
+
+    def status(self):
+        '''Get the status of a protocol'''
+        return self.state
+
+    def start(self):
+        '''Start a protocol'''
+        raise NotImplementedError()
+
+    def stop(self):
+        '''Ask a running protocol to stop after its current step'''
+        self._stop_event.set()
+
+    @property
+    def stopping(self):
+        '''True once stop has been called'''
+        return self._stop_event.is_set()
@@ -0,0 +1,200 @@
+''' Chemios Protocol Scheduler Module
+
+Runs several protocols at once while making sure no two of them drive the
+same device at the same time.
+'''
+import collections.abc
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from chemios._constants import StatusCodes
+
+
+class DeviceLease(object):
+    '''Exclusive hold on a set of devices
+
+    Locks are always taken in the scheduler's global device order, so two
+    leases over overlapping devices can never wait on each other in a cycle.
+
+    Attributes:
+        scheduler (:obj:`ProtocolScheduler`): Scheduler that owns the device locks
+        devices (list): Devices covered by the lease
+        timeout (float, optional): Seconds to wait for all devices. Defaults to waiting forever.
+
+    Note:
+        Use as a context manager::
+
+            with scheduler.lease([pump, temperature_controller]):
+                pump.set_rate(rate)
+    '''
+    def __init__(self, scheduler, devices, timeout=None):
+        self.scheduler = scheduler
+        self.devices = list(devices)
+        self.timeout = timeout
+        self._locks = scheduler._ordered_locks(self.devices)
+        self._held = []
+
+    def acquire(self):
+        '''Acquire every device lock or none of them
+
+        Raises:
+            TimeoutError: If the devices are not free within timeout
+        '''
+        if self.timeout is not None:
+            deadline = time.monotonic() + self.timeout
+        for lock in self._locks:
+            if self.timeout is None:
+                lock.acquire()
+            else:
+                remaining = max(deadline - time.monotonic(), 0)
+                if not lock.acquire(timeout=remaining):
+                    self.release()
+                    raise TimeoutError("Devices not free after {} seconds"
+                                       .format(self.timeout))
+            self._held.append(lock)
+        return self
+
+    def release(self):
+        '''Release the held device locks in reverse order'''
+        while self._held:
+            self._held.pop().release()
+
+    @property
+    def active(self):
+        '''True while the lease holds its devices'''
+        return len(self._held) == len(self._locks)
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *args):
+        self.release()
+
+
+class ProtocolScheduler(object):
+    '''Class to run protocols concurrently with device leases
+
+    Each submitted protocol runs on its own thread. Before its start method
+    is called, the protocol is given a :class:`DeviceLease` over its
+    devices, so protocols on disjoint hardware run fully in parallel and
+    protocols sharing a device run one after another.
+
+    Attributes:
+        lease_timeout (float, optional): Default seconds a protocol waits
+            for its devices. Defaults to waiting forever.
+
+    Note:
+        Devices are identified by object identity, so share one driver
+        instance (e.g., one :class:`chemios.pumps.Chemyx`) between protocols.
+    '''
+    def __init__(self, lease_timeout=None):
+        self.lease_timeout = lease_timeout
+
+        #Internal variables
+        self._registry_lock = threading.Lock()
+        self._devices = {}  #id(device) -> (rank, device, lock)
+        self._ranks = itertools.count()
+        self._threads = []
+
+    def _ordered_locks(self, devices):
+        '''Locks for devices sorted into the global acquisition order'''
+        entries = {}
+        with self._registry_lock:
+            for device in devices:
+                key = id(device)
+                if key not in self._devices:
+                    #Keep a reference to the device so its id cannot be reused
+                    self._devices[key] = (next(self._ranks), device, threading.RLock())
+                entries[key] = self._devices[key]
+        return [lock for rank, device, lock in sorted(entries.values(), key=lambda e: e[0])]
+
+    def lease(self, devices, timeout=None):
+        '''Create a lease on a set of devices
+
+        Args:
+            devices (list): Devices to lease
+            timeout (float, optional): Seconds to wait for the devices
+
+        Returns:
+            :obj:`DeviceLease` that is acquired when entered
+        '''
+        return DeviceLease(self, devices, timeout=timeout)
+
+    def submit(self, protocol, timeout=None):
+        '''Run a protocol on its own thread once its devices are free
+
+        Args:
+            protocol (:obj:`chemios.Protocol`): Protocol to run
+            timeout (float, optional): Seconds to wait for the devices.
+                Defaults to lease_timeout.
+
+        Returns:
+            :obj:`concurrent.futures.Future` holding the result of start
+        '''
+        if timeout is None:
+            timeout = self.lease_timeout
+        future = Future()
+        thread = threading.Thread(target=self._run, args=(protocol, timeout, future),
+                                  name=protocol.name, daemon=True)
+        self._threads.append(thread)
+        thread.start()
+        return future
+
+    def run(self, protocols, timeout=None):
+        '''Run protocols concurrently and wait for all of them
+
+        Args:
+            protocols (list): Protocols to run
+            timeout (float, optional): Seconds each protocol waits for its devices
+
+        Returns:
+            list: Results of each protocol's start method, in order
+
+        Raises:
+            The first exception raised by a protocol, after all have finished
+        '''
+        futures = [self.submit(protocol, timeout=timeout) for protocol in protocols]
+        errors = [future.exception() for future in futures]
+        for error in errors:
+            if error is not None:
+                raise error
+        return [future.result() for future in futures]
+
+    def join(self, timeout=None):
+        '''Wait for all submitted protocols to finish'''
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = [thread for thread in self._threads if thread.is_alive()]
+
+    def _run(self, protocol, timeout, future):
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            with self.lease(protocol.devices, timeout=timeout):
+                protocol.state = StatusCodes.running()
+                logging.debug("Started protocol {}".format(protocol.name))
+                result = protocol.start()
+                if isinstance(result, collections.abc.Coroutine):
+                    #asyncio is slow to import, so only protocols that need it load it
+                    import asyncio
+                    loop = asyncio.new_event_loop()
+                    try:
+                        result = loop.run_until_complete(result)
+                    finally:
+                        loop.close()
+        except BaseException as e:
+            protocol.state = StatusCodes.stopped(str(e))
+            logging.warning("Protocol {} stopped: {}".format(protocol.name, e))
+            future.set_exception(e)
+        else:
+            protocol.state = StatusCodes.stopped()
+            logging.debug("Finished protocol {}".format(protocol.name))
+            future.set_result(result)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.join()
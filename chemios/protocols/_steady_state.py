@@ -0,0 +1,296 @@
+''' Chemios Steady State Module
+
+Works out when a flow reactor reaches steady state from the pump rates,
+the reactor volume and the temperature settle state, so spectra are taken
+as soon as the outlet stops changing rather than after a guessed wait.
+'''
+import logging
+import math
+import threading
+import time
+from chemios.temperature_controllers import SettleDetector
+
+#mL per volume unit and minutes per time unit of pump rates
+VOLUME_UNITS = {'nL': 1e-6, 'uL': 1e-3, 'mL': 1.0, 'L': 1e3}
+TIME_UNITS = {'min': 1.0, 'hr': 60.0}
+
+
+def flow_rate(rate):
+    '''Flow rate in mL/min of a pump rate dictionary
+
+    Args:
+        rate (dict): {'value': flowrate, 'units': e.g. 'uL/min'}, as held in pump.rate
+    '''
+    if rate is None or rate.get('value') is None:
+        return 0.0
+    volume, duration = rate['units'].split('/')
+    return rate['value']*VOLUME_UNITS[volume]/TIME_UNITS[duration]
+
+
+def total_flow_rate(pumps):
+    '''Sum of the flow rates in mL/min of the pumps infusing into the reactor'''
+    return sum(flow_rate(pump.rate) for pump in pumps if getattr(pump, 'direction', None) != 'WDR')
+
+
+def residence_time(pumps, reactor_volume):
+    '''Mean residence time in seconds at the pumps' current rates
+
+    Args:
+        pumps (list): Pumps feeding the reactor, with their rate attribute set
+        reactor_volume (float): Reactor volume in mL
+
+    Returns:
+        float: Seconds, inf if no pump is infusing
+    '''
+    flow = total_flow_rate(pumps)
+    if flow <= 0:
+        return math.inf
+    return 60*reactor_volume/flow
+
+
+def step_response(theta, peclet=None):
+    '''Fraction of a step change at the inlet seen at the outlet
+
+    Uses the axial dispersion model for small dispersion,
+    F = (1 - erf((1 - theta)/(2*sqrt(theta/Pe))))/2.
+
+    Args:
+        theta (float): Time in residence times since the step
+        peclet (float, optional): Peclet number of the reactor. Defaults to plug flow.
+    '''
+    if theta <= 0:
+        return 0.0
+    if peclet is None:
+        return 1.0 if theta >= 1 else 0.0
+    return 0.5*(1 - math.erf((1 - theta)/(2*math.sqrt(theta/peclet))))
+
+
+def _solve_response(fraction, peclet):
+    '''Residence times until the step response reaches fraction'''
+    if peclet is None:
+        return 1.0
+    low, high = 0.0, 1.0
+    while step_response(high, peclet) < fraction:
+        high *= 2
+    for i in range(60):
+        middle = (low + high)/2
+        if step_response(middle, peclet) < fraction:
+            low = middle
+        else:
+            high = middle
+    return high
+
+
+class SteadyStateScheduler(object):
+    '''Class to run a list of conditions, acquiring each at steady state
+
+    A condition changes the pump rates and, optionally, the temperature
+    setpoints. The outlet is steady once a step response has reached
+    1 - tolerance, counted from the later of the rate change and the
+    moment every temperature settled, plus the transit through any
+    transfer line to the detector. When neither the new fluid nor the
+    fluid heated to new temperatures of the next condition can reach the
+    detector within acquisition_time, the next condition is applied as the
+    current acquisition starts, so the reactor flushes and the zones ramp
+    while spectra are taken.
+
+    Attributes:
+        pumps (list): Pumps feeding the reactor
+        reactor_volume (float): Reactor volume in mL
+        transfer_volume (float, optional): Unheated volume in mL between the reactor outlet
+            and the detector. Defaults to 0.
+        peclet (float, optional): Peclet number for the dispersion of the reactor.
+            Defaults to plug flow.
+        tolerance (float, optional): Fraction of a step change still allowed at the outlet.
+            Defaults to 0.01.
+        temperature_controllers (list, optional): Controllers with get_current_temperature
+            and set_temperature
+        settle_tolerance (float, optional): Tolerance in deg C of the settle detectors.
+            Defaults to 0.5.
+        acquisition_time (float, optional): Longest expected acquisition in seconds, used to
+            decide whether the next condition can be pipelined. Defaults to 0 (never pipeline).
+        poll_interval (float, optional): Seconds between temperature readings while waiting.
+            Defaults to 1.
+
+    Note:
+        Conditions hold a rate per pump and, optionally, a setpoint per controller::
+
+            scheduler = SteadyStateScheduler([pump_a, pump_b], reactor_volume=2.0, peclet=200,
+                                             temperature_controllers=[omega], acquisition_time=30)
+            conditions = [{'rates': [{'value': 100, 'units': 'uL/min'}]*2, 'temperatures': [60]},
+                          {'rates': [{'value': 50, 'units': 'uL/min'}]*2, 'temperatures': [60]}]
+            results = scheduler.run(conditions, lambda condition: spec.absorbance_read(1000, 10))
+    '''
+    def __init__(self, pumps, reactor_volume, transfer_volume=0, peclet=None, tolerance=0.01, temperature_controllers=None,
+                 settle_tolerance=0.5, acquisition_time=0, poll_interval=1.0):
+        self.pumps = list(pumps)
+        self.reactor_volume = reactor_volume
+        self.transfer_volume = transfer_volume
+        self.peclet = peclet
+        self.tolerance = tolerance
+        self.temperature_controllers = list(temperature_controllers) if temperature_controllers else []
+        self.acquisition_time = acquisition_time
+        self.poll_interval = poll_interval
+        self.detectors = [SettleDetector(tolerance=settle_tolerance) for c in self.temperature_controllers]
+        self.history = []
+
+        #Internal variables
+        self._breakthrough = _solve_response(tolerance, peclet)
+        self._washout = _solve_response(1 - tolerance, peclet)
+        self._rates_changed = None
+        self._settled = None
+        self._temperatures = None
+        self._stop_event = threading.Event()
+
+    def residence_time(self):
+        '''Mean residence time in seconds at the current pump rates'''
+        return residence_time(self.pumps, self.reactor_volume)
+
+    def _transit(self, theta, flow):
+        '''Seconds for theta reactor volumes and the transfer line at flow mL/min'''
+        if flow <= 0:
+            return math.inf
+        return 60*(theta*self.reactor_volume + self.transfer_volume)/flow
+
+    def washout_time(self):
+        '''Seconds after a change until the detector is within tolerance of steady state'''
+        return self._transit(self._washout, total_flow_rate(self.pumps))
+
+    def breakthrough_time(self):
+        '''Seconds after a rate change before the detector moves by more than tolerance'''
+        return self._transit(self._breakthrough, total_flow_rate(self.pumps))
+
+    def stop(self):
+        '''Abort waiting for steady state'''
+        self._stop_event.set()
+
+    def apply(self, condition):
+        '''Set the pump rates and temperature setpoints of a condition
+
+        Args:
+            condition (dict): 'rates' (a rate dictionary per pump, None to leave a pump as is)
+                and optionally 'temperatures' (a setpoint per controller)
+        '''
+        rates = condition.get('rates') or [None]*len(self.pumps)
+        if len(rates) != len(self.pumps):
+            raise ValueError("Condition has {} rates for {} pumps".format(len(rates), len(self.pumps)))
+        temperatures = condition.get('temperatures')
+        if temperatures is not None and len(temperatures) != len(self.temperature_controllers):
+            raise ValueError("Condition has {} temperatures for {} controllers"
+                             .format(len(temperatures), len(self.temperature_controllers)))
+        for pump, rate in zip(self.pumps, rates):
+            if rate is not None:
+                pump.set_rate(rate)
+        self._rates_changed = time.monotonic()
+        if temperatures is not None and list(temperatures) != self._temperatures:
+            for controller, detector, setpoint in zip(self.temperature_controllers, self.detectors, temperatures):
+                controller.set_temperature(setpoint)
+                detector.reset(setpoint)
+            self._temperatures = list(temperatures)
+            self._settled = None
+        elif self._settled is None and not self.temperature_controllers:
+            self._settled = self._rates_changed
+
+    def _poll_temperatures(self):
+        '''Feed the settle detectors; True once every zone is stable at its new setpoint'''
+        stable = True
+        setpoints = self._temperatures or [None]*len(self.temperature_controllers)
+        for controller, detector, setpoint in zip(self.temperature_controllers, self.detectors, setpoints):
+            temperature = controller.get_current_temperature()['current_temp']
+            #A zone that has not started to respond is flat too, but still at the old temperature
+            at_setpoint = setpoint is None or abs(temperature - setpoint) <= detector.tolerance
+            stable = detector.update(temperature) and at_setpoint and stable
+        return stable
+
+    def steady_time(self):
+        '''time.monotonic seconds when the outlet will be steady, or None until temperatures settle'''
+        if self._settled is None:
+            return None
+        return max(self._rates_changed, self._settled) + self.washout_time()
+
+    def wait_for_steady_state(self, timeout=None):
+        '''Block until the outlet is steady
+
+        Args:
+            timeout (float, optional): Seconds to wait. Defaults to waiting forever.
+
+        Returns:
+            bool: True at steady state, False if stopped
+        '''
+        if self._rates_changed is None:
+            raise ValueError("Apply a condition before waiting for steady state")
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._stop_event.is_set():
+            if self._settled is None and self._poll_temperatures():
+                self._settled = time.monotonic()
+            steady = self.steady_time()
+            now = time.monotonic()
+            if steady is not None and now >= steady:
+                return True
+            if deadline is not None and now >= deadline:
+                raise TimeoutError("No steady state after {} seconds".format(timeout))
+            wait = self.poll_interval if steady is None else min(steady - now, self.poll_interval)
+            if deadline is not None:
+                wait = min(wait, deadline - now)
+            self._stop_event.wait(max(wait, 0))
+        return False
+
+    def overlap_time(self, condition):
+        '''Seconds after applying condition before the detector sees any of its effect
+
+        New fluid must cross the reactor and the transfer line; fluid at new
+        temperatures only the transfer line.
+        '''
+        rates = condition.get('rates') or [None]*len(self.pumps)
+        flow = sum(flow_rate(rate if rate is not None else pump.rate)
+                   for pump, rate in zip(self.pumps, rates) if getattr(pump, 'direction', None) != 'WDR')
+        temperatures = condition.get('temperatures')
+        if temperatures is not None and list(temperatures) != self._temperatures:
+            return self._transit(0, flow)
+        return self._transit(self._breakthrough, flow)
+
+    def can_pipeline(self, condition):
+        '''True if condition can be applied while the current acquisition runs'''
+        return 0 < self.acquisition_time <= self.overlap_time(condition)
+
+    def run(self, conditions, acquire, timeout=None):
+        '''Apply each condition, wait for steady state and acquire
+
+        Args:
+            conditions (list): Conditions as for :meth:`apply`
+            acquire (callable): Called with each condition at steady state; its return
+                value is collected
+            timeout (float, optional): Seconds to wait for each steady state
+
+        Returns:
+            list: Results of acquire, one per condition reached before a stop
+        '''
+        results = []
+        self._stop_event.clear()
+        if conditions:
+            self.apply(conditions[0])
+        for i, condition in enumerate(conditions):
+            waited = time.monotonic()
+            if not self.wait_for_steady_state(timeout):
+                break
+            following = conditions[i + 1] if i + 1 < len(conditions) else None
+            pipelined = following is not None and self.can_pipeline(following)
+            if pipelined:
+                overlap = self.overlap_time(following)
+            started = time.monotonic()
+            if pipelined:
+                self.apply(following)
+            results.append(acquire(condition))
+            finished = time.monotonic()
+            if pipelined and finished - started > overlap:
+                logging.warning("Acquisition took {:.1f} s, longer than the {:.1f} s before the next "
+                                "condition reached the detector".format(finished - started, overlap))
+            self.history.append({
+                                 'condition': condition,
+                                 'waited': started - waited,
+                                 'acquired': finished - started,
+                                 'pipelined': pipelined
+                                })
+            if following is not None and not pipelined:
+                self.apply(following)
+        return results
@@ -1,5 +1,11 @@
-from ._chemyx import Chemyx
-from ._harvard_apparatus import HarvardApparatus
-from ._new_era import NewEra
-from ._syringe_data import SyringeData
+from chemios._lazy import lazy_exports
 
+#Exports are imported on first use
+_exports = {
+            'Chemyx': '._chemyx',
+            'HarvardApparatus': '._harvard_apparatus',
+            'NewEra': '._new_era',
+            'SyringeData': '._syringe_data'
+           }
+__all__ = list(_exports)
+__getattr__, __dir__ = lazy_exports(__name__, _exports)
@@ -29,11 +29,8 @@ class Pump(object):
         self.sio = io.TextIOWrapper(io.BufferedRWPair(self.ser, self.ser))
         self.rate = {'value': None,'units': None}
         self.direction = None #INF for infuse or WDR for withdraw
-        current_path = module_path()
-        old_path = os.getcwd()
-        os.chdir(current_path)
-        self.sdb = SyringeData('../data/syringe_db.json')
-        os.chdir(old_path)
+        #Absolute path, since changing directory is not safe with several threads
+        self.sdb = SyringeData(os.path.join(module_path(), '..', 'data', 'syringe_db.json'))
         self.volume = None
         self.diameter = None
         self.units_dict = {'mL/min': '0', 'mL/hr': '1', 'uL/min': '2', 'uL/hr': 3}
@@ -11,9 +11,10 @@ import time
 import re
 import io
 import logging
+import os
 from chemios.utils import serial_write, write_i2c, sio_write
 from ._syringe_data import SyringeData
-from ._base import Pump
+from ._base import Pump, module_path
 
 class HarvardApparatus(Pump):
     """ Class for interacting with Haravard Apparatus syringe pumps
@@ -38,7 +39,7 @@ class HarvardApparatus(Pump):
         self.sio = io.TextIOWrapper(io.BufferedRWPair(self.ser, self.ser))
         self.rate = {'value': None,'units': None}
         self.direction = None #INF for infuse or WDR for withdraw
-        self.sdb = SyringeData('../../../data/syringe_db.json')
+        self.sdb = SyringeData(os.path.join(module_path(), '..', 'data', 'syringe_db.json'))
         self.volume = None
         self.diameter = None
         self.units_dict = {'mL/min': '0', 'mL/hr': '1', 'uL/min': '2', 'uL/hr': 3}
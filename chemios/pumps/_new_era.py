@@ -12,6 +12,11 @@ import io
 import logging
 
 
+def construct_cmd(cmd, address):
+    """Prefix a command with the network address of an NE pump"""
+    return '%i%s'%(address, cmd)
+
+
 class NewEra(object):
     """ Class for interacting with pumps
 
@@ -8,7 +8,6 @@ pump classes can validate whether a given flowrate can be achieved
 by a syringe pump. 
 
 '''
-from tinydb import TinyDB, Query
 import logging
 
 def update_dict(key, value):
@@ -35,6 +34,8 @@ class SyringeData(object):
 
     def __init__(self, filepath: str):
         #Create or open a syringe_data database 
+        #tinydb is imported here so importing a pump driver stays fast
+        from tinydb import TinyDB
         self.db = TinyDB(filepath)
         self.syringes = self.db.table('syringes')
         self.pumps = self.db.table('pumps')
@@ -59,6 +60,7 @@ class SyringeData(object):
                         'inner_diameter': inner_diameter,
         }
         #Add or update syringe information
+        from tinydb import Query
         Syringe = Query()
         syringe_id = self.syringes.upsert(new_syringe,
                                           (Syringe.manufacturer == manufacturer) &
@@ -157,6 +159,7 @@ class SyringeData(object):
 
         #Get unique id
         if 'volume' in keys:
+            from tinydb import Query
             Syringes = Query()
             syringe = self.syringes.search((Syringes.manufacturer == query['manufacturer']) &
                                            (Syringes.volume == query['volume']))
@@ -167,6 +170,7 @@ class SyringeData(object):
                 return None
             return syringe[0].doc_id
         elif 'model' in keys:
+            from tinydb import Query
             Pumps = Query()
             pump = self.pumps.get((Pumps.manufacturer == query['manufacturer']) &
                                   (Pumps.model == query['model']))
@@ -208,6 +212,7 @@ class SyringeData(object):
         Returns:
             float: syringe diameter in millimeters
         '''
+        from tinydb import Query
         Syringe = Query()
         syringe = self.syringes.search((Syringe.manufacturer == manufacturer) & 
                                        (Syringe.volume == volume))
@@ -0,0 +1,12 @@
+from chemios._lazy import lazy_exports
+
+#Exports are imported on first use
+_exports = {
+            'Recorder': '._recorder',
+            'SpectraArchive': '._spectra_archive',
+            'RunReader': '._query',
+            'minmax_downsample': '._query',
+            'lttb_downsample': '._query'
+           }
+__all__ = list(_exports)
+__getattr__, __dir__ = lazy_exports(__name__, _exports)
@@ -0,0 +1,338 @@
+''' Chemios Run Query Module
+
+Streams recorded runs back chunk by chunk, so multi-hour logs can be
+filtered and downsampled with constant memory.
+'''
+import fnmatch
+import glob
+import json
+import os
+import numpy as np
+from ._recorder import TIMESTAMP, METADATA_FILE
+
+
+def _bucket_edges(start, stop, buckets):
+    if buckets < 1:
+        raise ValueError("Please ask for at least one bucket")
+    if stop <= start:
+        stop = start + 1e-9
+    return np.linspace(start, stop, buckets + 1)
+
+
+def _bucket_index(timestamps, edges):
+    index = np.searchsorted(edges, timestamps, side='right') - 1
+    #Put the stop time in the last bucket
+    return np.minimum(index, len(edges) - 2)
+
+
+def _scalar(chunk, column):
+    values = np.asarray(chunk[column])
+    if values.ndim != 1 or values.dtype.kind not in 'biuf':
+        raise ValueError("Column {} is not a numeric scalar column".format(column))
+    return values.astype(np.float64, copy=False)
+
+
+def minmax_downsample(chunks, column, buckets, start, stop):
+    '''Reduce a column to its minimum and maximum per time bucket
+
+    Args:
+        chunks (iterable): Chunks (dicts of arrays) in time order
+        column (str): Numeric column to reduce
+        buckets (int): Number of equal-width time buckets
+        start (float): Start of the first bucket in seconds
+        stop (float): End of the last bucket in seconds
+
+    Returns:
+        dict: 'timestamp' (bucket centres), 'min', 'max' and 'count' arrays.
+        Empty buckets are dropped.
+    '''
+    edges = _bucket_edges(start, stop, buckets)
+    minimum = np.full(buckets, np.inf)
+    maximum = np.full(buckets, -np.inf)
+    count = np.zeros(buckets, dtype=np.int64)
+    for chunk in chunks:
+        values = _scalar(chunk, column)
+        keep = ~np.isnan(values)
+        index = _bucket_index(chunk[TIMESTAMP][keep], edges)
+        values = values[keep]
+        np.minimum.at(minimum, index, values)
+        np.maximum.at(maximum, index, values)
+        count += np.bincount(index, minlength=buckets)
+    filled = count > 0
+    centres = (edges[:-1] + edges[1:])/2
+    return {
+            TIMESTAMP: centres[filled],
+            'min': minimum[filled],
+            'max': maximum[filled],
+            'count': count[filled]
+           }
+
+
+def _bucket_means(chunks, column, edges):
+    buckets = len(edges) - 1
+    total_t = np.zeros(buckets)
+    total_v = np.zeros(buckets)
+    count = np.zeros(buckets, dtype=np.int64)
+    for chunk in chunks:
+        values = _scalar(chunk, column)
+        keep = ~np.isnan(values)
+        timestamps = chunk[TIMESTAMP][keep]
+        index = _bucket_index(timestamps, edges)
+        total_t += np.bincount(index, weights=timestamps, minlength=buckets)
+        total_v += np.bincount(index, weights=values[keep], minlength=buckets)
+        count += np.bincount(index, minlength=buckets)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return total_t/count, total_v/count, count
+
+
+def lttb_downsample(chunks, column, points, start, stop):
+    '''Largest-Triangle-Three-Buckets downsampling over a stream of chunks
+
+    Buckets are equal-width in time.  The first pass computes the mean of
+    each bucket; the second keeps, per bucket, the point that spans the
+    largest triangle with the point kept in the previous bucket and the
+    mean of the next one.  Only one chunk is held in memory at a time.
+
+    Args:
+        chunks (callable): Function returning a new iterable of chunks
+            in time order. It is called twice, once per pass.
+        column (str): Numeric column to downsample
+        points (int): Number of points to return (at most)
+        start (float): Start time in seconds
+        stop (float): Stop time in seconds
+
+    Returns:
+        tuple: (timestamps, values) arrays of the kept points
+    '''
+    edges = _bucket_edges(start, stop, points)
+    mean_t, mean_v, count = _bucket_means(chunks(), column, edges)
+    #Mean of the next non-empty bucket for each bucket
+    filled = np.flatnonzero(count)
+    next_filled = np.searchsorted(filled, np.arange(points), side='right')
+    has_next = next_filled < len(filled)
+    next_t = np.where(has_next, mean_t[filled[np.minimum(next_filled, len(filled) - 1)]], np.nan)
+    next_v = np.where(has_next, mean_v[filled[np.minimum(next_filled, len(filled) - 1)]], np.nan)
+
+    kept_t, kept_v = [], []
+    previous = None  #(t, v) kept in the previous bucket
+    best = None  #(area, t, v) of the current bucket
+    current = -1
+    for chunk in chunks():
+        values = _scalar(chunk, column)
+        keep = ~np.isnan(values)
+        timestamps = chunk[TIMESTAMP][keep]
+        values = values[keep]
+        index = _bucket_index(timestamps, edges)
+        boundaries = np.flatnonzero(np.diff(index)) + 1
+        for segment in np.split(np.arange(len(index)), boundaries):
+            if len(segment) == 0:
+                continue
+            bucket = index[segment[0]]
+            if bucket != current:
+                if best is not None:
+                    previous = best[1:]
+                    kept_t.append(best[1])
+                    kept_v.append(best[2])
+                best = None
+                current = bucket
+            t, v = timestamps[segment], values[segment]
+            if previous is None:
+                #Always keep the first point
+                if best is None:
+                    best = (np.inf, t[0], v[0])
+            elif not has_next[bucket]:
+                #Always keep the last point
+                best = (0.0, t[-1], v[-1])
+            else:
+                area = np.abs((previous[0] - next_t[bucket])*(v - previous[1]) -
+                              (previous[0] - t)*(next_v[bucket] - previous[1]))
+                i = int(np.argmax(area))
+                if best is None or area[i] > best[0]:
+                    best = (area[i], t[i], v[i])
+    if best is not None:
+        kept_t.append(best[1])
+        kept_v.append(best[2])
+    return np.array(kept_t), np.array(kept_v)
+
+
+class RunReader(object):
+    '''Class to query runs written by :class:`chemios.recording.Recorder`
+
+    All queries are generators that read one chunk at a time, so memory
+    use does not grow with the length of the run.
+
+    Attributes:
+        path (str): Directory of the run
+
+    Note:
+        Plot a day-long temperature log with 2000 points::
+
+            run = RunReader('runs/2018-06-01')
+            envelope = run.minmax('oven', 'current_temp', buckets=1000)
+            timestamps, values = run.lttb('oven', 'current_temp', points=2000)
+    '''
+    def __init__(self, path):
+        self.path = path
+        metadata_file = os.path.join(self.path, METADATA_FILE)
+        if os.path.exists(metadata_file):
+            with open(metadata_file) as f:
+                self.metadata = json.load(f)
+        else:
+            self.metadata = {'streams': {}}
+
+    @property
+    def streams(self):
+        '''Names of the recorded streams'''
+        names = [name for name in os.listdir(self.path)
+                 if os.path.isdir(os.path.join(self.path, name))]
+        return sorted(names)
+
+    def _chunk_files(self, stream):
+        directory = os.path.join(self.path, stream)
+        parquet = sorted(glob.glob(os.path.join(directory, '*.parquet')))
+        if parquet:
+            return 'parquet', parquet
+        return 'npy', sorted(glob.glob(os.path.join(directory, TIMESTAMP, '*.npy')))
+
+    def columns(self, stream):
+        '''Names of the columns of a stream'''
+        fmt, files = self._chunk_files(stream)
+        if fmt == 'parquet':
+            import pyarrow.parquet as pq
+            return list(pq.read_schema(files[0]).names) if files else []
+        directory = os.path.join(self.path, stream)
+        return sorted(name for name in os.listdir(directory)
+                      if os.path.isdir(os.path.join(directory, name)))
+
+    def _shape(self, stream, column):
+        streams = self.metadata.get('streams', {})
+        shape = streams.get(stream, {}).get('columns', {}).get(column, {}).get('shape')
+        return tuple(shape) if shape else (-1,)
+
+    def _load(self, stream, fmt, chunk_file, columns):
+        '''Load the columns of one chunk as memory-mapped or arrow-backed arrays'''
+        if fmt == 'npy':
+            name = os.path.basename(chunk_file)
+            directory = os.path.join(self.path, stream)
+            chunk = {TIMESTAMP: np.load(chunk_file, mmap_mode='r')}
+            rows = len(chunk[TIMESTAMP])
+            for column in columns:
+                column_file = os.path.join(directory, column, name)
+                if os.path.exists(column_file):
+                    chunk[column] = np.load(column_file, mmap_mode='r')
+                else:
+                    chunk[column] = np.full(rows, np.nan)
+            return chunk
+        import pyarrow.parquet as pq
+        parquet_file = pq.ParquetFile(chunk_file)
+        #Read only the requested columns this chunk has
+        present = set(parquet_file.schema_arrow.names)
+        table = parquet_file.read(columns=[c for c in [TIMESTAMP] + list(columns) if c in present])
+        chunk = {}
+        for column in [TIMESTAMP] + list(columns):
+            if column not in table.column_names:
+                chunk[column] = np.full(table.num_rows, np.nan)
+                continue
+            array = table.column(column).combine_chunks()
+            if hasattr(array, 'flatten') and array.type.num_fields == 1:
+                values = np.asarray(array.flatten())
+                chunk[column] = values.reshape((table.num_rows,) + self._shape(stream, column))
+            else:
+                chunk[column] = array.to_numpy(zero_copy_only=False)
+        return chunk
+
+    def chunks(self, stream, columns=None, start=None, stop=None):
+        '''Iterate over the chunks of a stream within a time range
+
+        Args:
+            stream (str): Stream name
+            columns (list, optional): Columns to load. Defaults to all columns.
+            start (float, optional): First time in seconds (inclusive)
+            stop (float, optional): Last time in seconds (exclusive)
+
+        Yields:
+            dict: Column name to array, always including 'timestamp'
+        '''
+        if columns is None:
+            columns = [c for c in self.columns(stream) if c != TIMESTAMP]
+        fmt, files = self._chunk_files(stream)
+        for chunk_file in files:
+            chunk = self._load(stream, fmt, chunk_file, columns)
+            timestamps = chunk[TIMESTAMP]
+            if len(timestamps) == 0:
+                continue
+            if stop is not None and timestamps[0] >= stop:
+                return
+            if start is not None and timestamps[-1] < start:
+                continue
+            first = 0 if start is None else int(np.searchsorted(timestamps, start, side='left'))
+            last = len(timestamps) if stop is None else int(np.searchsorted(timestamps, stop, side='left'))
+            if first == 0 and last == len(timestamps):
+                yield chunk
+            elif last > first:
+                yield {name: values[first:last] for name, values in chunk.items()}
+
+    def select(self, streams=None, columns=None, start=None, stop=None):
+        '''Iterate over chunks of several streams
+
+        Args:
+            streams (str or list, optional): Stream names or glob patterns
+                (e.g., 'pump_*'). Defaults to all streams.
+            columns (list, optional): Columns to load
+            start (float, optional): First time in seconds (inclusive)
+            stop (float, optional): Last time in seconds (exclusive)
+
+        Yields:
+            tuple: (stream name, chunk)
+        '''
+        if streams is None:
+            streams = ['*']
+        elif isinstance(streams, str):
+            streams = [streams]
+        for name in self.streams:
+            if not any(fnmatch.fnmatchcase(name, pattern) for pattern in streams):
+                continue
+            stream_columns = columns
+            if columns is not None:
+                available = self.columns(name)
+                stream_columns = [c for c in columns if c in available]
+            for chunk in self.chunks(name, stream_columns, start, stop):
+                yield name, chunk
+
+    def time_range(self, stream):
+        '''First and last timestamp of a stream in seconds'''
+        fmt, files = self._chunk_files(stream)
+        if not files:
+            return None
+        first = self._load(stream, fmt, files[0], [])[TIMESTAMP]
+        last = self._load(stream, fmt, files[-1], [])[TIMESTAMP]
+        return float(first[0]), float(last[-1])
+
+    def _bounds(self, stream, start, stop):
+        if start is None or stop is None:
+            bounds = self.time_range(stream)
+            if bounds is None:
+                bounds = (0.0, 0.0)
+            start = bounds[0] if start is None else start
+            stop = bounds[1] if stop is None else stop
+        return start, stop
+
+    def minmax(self, stream, column, buckets, start=None, stop=None):
+        '''Minimum and maximum of a column per time bucket
+
+        See :func:`minmax_downsample` for the returned arrays.
+        '''
+        start, stop = self._bounds(stream, start, stop)
+        #Include the stop time itself when the range comes from the data
+        chunks = self.chunks(stream, [column], start, np.nextafter(stop, np.inf))
+        return minmax_downsample(chunks, column, buckets, start, stop)
+
+    def lttb(self, stream, column, points, start=None, stop=None):
+        '''Downsample a column to at most points points with LTTB
+
+        See :func:`lttb_downsample`.
+        '''
+        start, stop = self._bounds(stream, start, stop)
+        def chunks():
+            return self.chunks(stream, [column], start, np.nextafter(stop, np.inf))
+        return lttb_downsample(chunks, column, points, start, stop)
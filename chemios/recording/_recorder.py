@@ -0,0 +1,367 @@
+''' Chemios Recorder Module
+
+Appends device readings (e.g., from ``get_info``, ``get_current_temperature``
+or ``absorbance_read``) into chunked columnar files on disk.
+
+Layout of a run directory::
+
+    run.json                            run metadata
+    <stream>/<column>/<chunk>.npy       one file per column per chunk (npy)
+    <stream>/<chunk>.parquet            one file per chunk (parquet)
+
+'''
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import numpy as np
+
+TIMESTAMP = 'timestamp'
+#Column of a 'timestamp' field of a reading, which would collide with TIMESTAMP
+READING_TIMESTAMP = 'reading_timestamp'
+#Bytes a stream buffers per chunk before it is handed to the writer
+CHUNK_BYTES = 8*2**20
+METADATA_FILE = 'run.json'
+FORMATS = ['npy', 'parquet']
+
+
+def _parquet_available():
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _flatten(reading, prefix=''):
+    '''Flatten nested dictionaries into dotted column names'''
+    fields = {}
+    for key, value in reading.items():
+        name = prefix + str(key)
+        if isinstance(value, dict):
+            fields.update(_flatten(value, name + '.'))
+        else:
+            fields[name] = value
+    return fields
+
+
+def _is_number(value):
+    return isinstance(value, (bool, int, float, np.number, np.bool_))
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        logging.debug("Recorder could not store {!r} in a float column".format(value))
+        return np.nan
+
+
+def _pack_objects(values, dtype=None):
+    '''Convert an object column to float64 or str
+
+    Args:
+        values (numpy.ndarray): Object buffer of the chunk
+        dtype (str, optional): 'float' or 'str' to keep the type of earlier chunks.
+            Defaults to float64 if every value converts, otherwise str.
+    '''
+    if dtype != 'str':
+        try:
+            return np.array([np.nan if v is None else float(v) for v in values], dtype=np.float64)
+        except (TypeError, ValueError):
+            if dtype == 'float':
+                #Values that do not convert become NaN so every chunk has the same schema
+                return np.array([np.nan if v is None else _to_float(v) for v in values], dtype=np.float64)
+    return np.array(['' if v is None else str(v) for v in values])
+
+
+def _check_name(kind, name):
+    '''Raise ValueError if name cannot be a file or directory name'''
+    if os.sep in name or (os.altsep and os.altsep in name) or name in ('', '.', '..'):
+        raise ValueError("Invalid {} name {!r}".format(kind, name))
+
+
+def chunk_name(index):
+    '''File name stem of a chunk'''
+    return '{:06d}'.format(index)
+
+
+class _Column(object):
+    '''Preallocated buffer for one column of a stream'''
+    def __init__(self, name, value):
+        self.name = name
+        #Type of an object column, fixed by its first chunk
+        self.dtype = None
+        if _is_number(value):
+            self.kind, self.shape = 'number', ()
+        elif value is None or isinstance(value, str):
+            self.kind, self.shape = 'object', ()
+        else:
+            self.kind, self.shape = 'array', np.shape(value)
+
+    @property
+    def row_bytes(self):
+        '''Bytes of one row of the buffer'''
+        return 8*int(np.prod(self.shape))
+
+    def allocate(self, rows):
+        if self.kind == 'object':
+            return np.full(rows, None, dtype=object)
+        return np.full((rows,) + self.shape, np.nan, dtype=np.float64)
+
+    def pack(self, buffer):
+        if self.kind == 'object':
+            packed = _pack_objects(buffer, self.dtype)
+            self.dtype = 'float' if packed.dtype.kind == 'f' else 'str'
+            return packed
+        return buffer
+
+
+class _Stream(object):
+    '''Row buffer for one named stream of readings
+
+    The rows per chunk are set by the first reading: at most max_rows, and
+    fewer for wide rows such as spectra so a chunk stays within chunk_bytes.
+    '''
+    def __init__(self, name, max_rows, chunk_bytes=CHUNK_BYTES):
+        self.name = name
+        self.max_rows = max_rows
+        self.chunk_bytes = chunk_bytes
+        self.chunk_size = max_rows
+        self.columns = {}
+        self.buffers = {TIMESTAMP: np.empty(max_rows, dtype=np.float64)}
+        self.rows = 0
+        self.chunks = 0
+        self.total_rows = 0
+        self.last_timestamp = -np.inf
+
+    def _size_chunks(self):
+        row_bytes = 8 + sum(column.row_bytes for column in self.columns.values())
+        self.chunk_size = max(1, min(self.max_rows, self.chunk_bytes//row_bytes))
+        self.buffers = {TIMESTAMP: np.empty(self.chunk_size, dtype=np.float64)}
+
+    def append(self, timestamp, fields):
+        if TIMESTAMP in fields:
+            fields = dict(fields)
+            fields[READING_TIMESTAMP] = fields.pop(TIMESTAMP)
+        new = [name for name in fields if name not in self.columns]
+        for name in new:
+            _check_name('column', name)
+        for name in new:
+            self.columns[name] = _Column(name, fields[name])
+        if new and self.total_rows == 0:
+            self._size_chunks()
+        for name in self.columns:
+            if name not in self.buffers:
+                self.buffers[name] = self.columns[name].allocate(self.chunk_size)
+        row = self.rows
+        for name, value in fields.items():
+            column = self.columns[name]
+            buffer = self.buffers[name]
+            if value is None and column.kind != 'object':
+                continue
+            try:
+                buffer[row] = value
+            except (TypeError, ValueError):
+                if column.kind == 'array' and np.shape(value) != column.shape:
+                    raise ValueError("Column {} of stream {} has shape {}, got {}"
+                                     .format(name, self.name, column.shape, np.shape(value)))
+                logging.debug("Recorder could not store {!r} in column {}".format(value, name))
+        self.buffers[TIMESTAMP][row] = timestamp
+        self.last_timestamp = timestamp
+        self.rows += 1
+        self.total_rows += 1
+
+    def take(self):
+        '''Hand over the filled part of the buffers and start a new chunk'''
+        rows = self.rows
+        chunk = {TIMESTAMP: self.buffers[TIMESTAMP][:rows]}
+        for name, column in self.columns.items():
+            chunk[name] = column.pack(self.buffers[name][:rows])
+        index = self.chunks
+        self.chunks += 1
+        self.rows = 0
+        self.buffers = {TIMESTAMP: np.empty(self.chunk_size, dtype=np.float64)}
+        for name, column in self.columns.items():
+            self.buffers[name] = column.allocate(self.chunk_size)
+        return index, chunk
+
+    def metadata(self):
+        columns = {TIMESTAMP: {'shape': []}}
+        for name, column in self.columns.items():
+            columns[name] = {'shape': list(column.shape)}
+        return {'chunks': self.chunks, 'rows': self.total_rows, 'chunk_size': self.chunk_size, 'columns': columns}
+
+
+def write_chunk(directory, index, chunk, fmt):
+    '''Write one chunk of columns to a stream directory'''
+    if fmt == 'npy':
+        for name, values in chunk.items():
+            column_dir = os.path.join(directory, name)
+            os.makedirs(column_dir, exist_ok=True)
+            np.save(os.path.join(column_dir, chunk_name(index) + '.npy'), values)
+    else:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        arrays = {}
+        for name, values in chunk.items():
+            if values.ndim > 1:
+                width = int(np.prod(values.shape[1:]))
+                flat = pa.array(np.ascontiguousarray(values).reshape(-1))
+                arrays[name] = pa.FixedSizeListArray.from_arrays(flat, width)
+            else:
+                arrays[name] = pa.array(values)
+        os.makedirs(directory, exist_ok=True)
+        pq.write_table(pa.table(arrays), os.path.join(directory, chunk_name(index) + '.parquet'))
+
+
+class Recorder(object):
+    '''Class to record device readings into chunked columnar storage
+
+    Readings are dictionaries (nested dictionaries become dotted column names,
+    e.g. ``rate.value``) or arrays such as spectra, which are stored in a
+    column called ``value``.  Each reading is stamped with monotonic seconds
+    since the recorder started; a 'timestamp' field of the reading itself is
+    stored as ``reading_timestamp``.  Full chunks are written by a background thread.
+
+    Attributes:
+        path (str): Directory of the run. It is created if it does not exist.
+        chunk_size (int, optional): Most rows per chunk. Defaults to 4096.
+        chunk_bytes (int, optional): Most bytes per chunk, which gives streams of
+            spectra fewer rows per chunk. Defaults to 8 MiB.
+        fmt (str, optional): 'npy' or 'parquet'. Defaults to parquet when
+            pyarrow is installed and npy otherwise.
+        max_pending (int, optional): Chunks waiting to be written before
+            record blocks. Defaults to 8. Together with chunk_bytes, this bounds memory.
+
+    Note:
+        Use as a context manager so the last partial chunks are written::
+
+            with Recorder('runs/2018-06-01') as recorder:
+                recorder.record('pump_1', pump.get_info())
+                recorder.record('oven', controller.get_current_temperature())
+    '''
+    def __init__(self, path, chunk_size=4096, fmt=None, max_pending=8, chunk_bytes=CHUNK_BYTES):
+        if fmt is None:
+            fmt = 'parquet' if _parquet_available() else 'npy'
+        if fmt not in FORMATS:
+            raise ValueError("Format must be one of {}".format(FORMATS))
+        if fmt == 'parquet' and not _parquet_available():
+            raise ImportError("pyarrow is required to record in parquet format")
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1")
+        self.path = path
+        self.chunk_size = chunk_size
+        self.chunk_bytes = chunk_bytes
+        self.fmt = fmt
+        self.max_pending = max_pending
+
+        #Internal variables
+        os.makedirs(self.path, exist_ok=True)
+        self.streams = {}
+        self.started = time.time()
+        self._origin = time.monotonic()
+        self._lock = threading.Lock()
+        self._pending = queue.Queue(maxsize=max_pending)
+        self._error = None
+        self._closed = False
+        self._writer = threading.Thread(target=self._write_loop, name='RecorderWriter', daemon=True)
+        self._writer.start()
+
+    def timestamp(self):
+        '''Monotonic seconds since the recorder started'''
+        return time.monotonic() - self._origin
+
+    def record(self, stream, reading, timestamp=None):
+        '''Append one reading to a stream
+
+        Args:
+            stream (str): Stream name, usually the device name
+            reading (dict or array): Reading to store
+            timestamp (float, optional): Seconds since the recorder started.
+                Defaults to now. Timestamps within a stream must not decrease.
+        '''
+        self._check()
+        if not isinstance(reading, dict):
+            reading = {'value': reading}
+        fields = _flatten(reading)
+        with self._lock:
+            if self._closed:
+                raise ValueError("Recorder is closed")
+            if timestamp is None:
+                timestamp = self.timestamp()
+            data = self.streams.get(stream)
+            if data is None:
+                _check_name('stream', stream)
+                data = self.streams[stream] = _Stream(stream, self.chunk_size, self.chunk_bytes)
+            if timestamp < data.last_timestamp:
+                raise ValueError("Timestamps of stream {} must not decrease".format(stream))
+            data.append(timestamp, fields)
+            if data.rows == data.chunk_size:
+                self._submit(data)
+
+    def flush(self):
+        '''Write all buffered readings and the run metadata'''
+        self._check()
+        with self._lock:
+            for data in self.streams.values():
+                if data.rows:
+                    self._submit(data)
+        self._pending.join()
+        self._check()
+        self._write_metadata()
+
+    def close(self):
+        '''Flush and stop the background writer'''
+        if self._closed:
+            return
+        try:
+            self.flush()
+        finally:
+            self._closed = True
+            self._pending.put(None)
+            self._writer.join()
+
+    def _submit(self, data):
+        index, chunk = data.take()
+        self._pending.put((data.name, index, chunk))
+
+    def _check(self):
+        if self._error is not None:
+            raise IOError("Recorder failed to write a chunk: {}".format(self._error))
+
+    def _write_loop(self):
+        while True:
+            item = self._pending.get()
+            try:
+                if item is None:
+                    return
+                name, index, chunk = item
+                write_chunk(os.path.join(self.path, name), index, chunk, self.fmt)
+            except Exception as e:
+                logging.warning("Recorder could not write chunk: {}".format(e))
+                self._error = e
+            finally:
+                self._pending.task_done()
+
+    def _write_metadata(self):
+        with self._lock:
+            metadata = {
+                        'format': self.fmt,
+                        'started': self.started,
+                        'chunk_size': self.chunk_size,
+                        'streams': {name: data.metadata() for name, data in self.streams.items()}
+                       }
+        temporary = os.path.join(self.path, METADATA_FILE + '.tmp')
+        with open(temporary, 'w') as f:
+            json.dump(metadata, f, indent=2)
+        os.replace(temporary, os.path.join(self.path, METADATA_FILE))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,240 @@
+''' Chemios Spectra Archive Module
+
+Stores long runs of spectra as fixed-width float32 rows in a memory-mapped
+file, so frames never pile up in memory.
+
+Layout of an archive directory::
+
+    archive.json        header (pixels, frames, start time)
+    wavelengths.npy     wavelength axis, stored once
+    frames.f32          float32 frames, one row of pixels per frame
+    timestamps.f64      float64 seconds since the archive was created
+
+'''
+import json
+import os
+import time
+import numpy as np
+
+HEADER_FILE = 'archive.json'
+WAVELENGTHS_FILE = 'wavelengths.npy'
+FRAMES_FILE = 'frames.f32'
+TIMESTAMPS_FILE = 'timestamps.f64'
+MODES = ['r', 'a', 'w']
+
+
+class SpectraArchive(object):
+    '''Class for memory-mapped archives of spectra
+
+    Attributes:
+        path (str): Directory of the archive
+        wavelengths (array, optional): Wavelength axis. Required to create an archive.
+        mode (str, optional): 'r' to read, 'a' to append to an existing
+            archive or 'w' to create a new one. Defaults to 'r'.
+        block_frames (int, optional): Frames to grow the files by when full.
+            Defaults to 4096.
+
+    The header's frame count is written on flush and close. Opening an
+    archive that was not closed also counts the frames appended after that,
+    as long as their timestamps are positive and non-decreasing.
+
+    Note:
+        Frames can be appended straight from the spectrometer::
+
+            with SpectraArchive('runs/kinetics', wavelengths, mode='w') as archive:
+                for i in range(n):
+                    archive.append(spec.absorbance_read(1000, 10))
+
+        and read back by time range without loading the whole file::
+
+            timestamps, frames = SpectraArchive('runs/kinetics').read(60, 120)
+    '''
+    def __init__(self, path, wavelengths=None, mode='r', block_frames=4096):
+        if mode not in MODES:
+            raise ValueError("Mode must be one of {}".format(MODES))
+        self.path = path
+        self.mode = mode
+        self.block_frames = block_frames
+
+        if mode == 'w':
+            if wavelengths is None:
+                raise ValueError("Please pass wavelengths to create an archive")
+            os.makedirs(self.path, exist_ok=True)
+            self.wavelengths = np.ascontiguousarray(wavelengths, dtype=np.float64)
+            np.save(self._file(WAVELENGTHS_FILE), self.wavelengths)
+            self.pixels = len(self.wavelengths)
+            self.frames_count = 0
+            self.started = time.time()
+            for name in (FRAMES_FILE, TIMESTAMPS_FILE):
+                open(self._file(name), 'wb').close()
+            self._write_header()
+        else:
+            with open(self._file(HEADER_FILE)) as f:
+                header = json.load(f)
+            self.pixels = header['pixels']
+            self.frames_count = self._recover(header['frames'])
+            self.started = header['started']
+            self.wavelengths = np.load(self._file(WAVELENGTHS_FILE), mmap_mode='r')
+
+        #Internal variables
+        self._capacity = 0
+        self._frames = None
+        self._timestamps = None
+        self._map(self.frames_count)
+        #Continue the timestamp index from the archive's start time
+        self._origin = time.monotonic() - (time.time() - self.started)
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _recover(self, frames):
+        '''Frames on disk, counting those appended after the header was last written
+
+        The files grow a block at a time and the unused rows are zero, so frames
+        past the header's count run until the timestamps stop being positive and
+        non-decreasing.
+        '''
+        capacity = os.path.getsize(self._file(TIMESTAMPS_FILE))//8
+        if capacity <= frames:
+            return frames
+        timestamps = np.memmap(self._file(TIMESTAMPS_FILE), dtype=np.float64, mode='r', shape=(capacity,))
+        previous = timestamps[frames - 1] if frames else 0.0
+        tail = np.asarray(timestamps[frames:])
+        valid = (tail > 0) & (np.diff(np.concatenate([[previous], tail])) >= 0)
+        extra = len(tail) if valid.all() else int(np.argmin(valid))
+        del timestamps
+        return frames + extra
+
+    def _map(self, capacity):
+        '''Memory-map the frame and timestamp files with room for capacity frames'''
+        self._frames = None
+        self._timestamps = None
+        writable = self.mode != 'r'
+        if writable:
+            for name, width in ((FRAMES_FILE, 4*self.pixels), (TIMESTAMPS_FILE, 8)):
+                with open(self._file(name), 'r+b') as f:
+                    f.truncate(capacity*width)
+        self._capacity = capacity
+        if capacity == 0:
+            return
+        mode = 'r+' if writable else 'r'
+        self._frames = np.memmap(self._file(FRAMES_FILE), dtype=np.float32,
+                                 mode=mode, shape=(capacity, self.pixels))
+        self._timestamps = np.memmap(self._file(TIMESTAMPS_FILE), dtype=np.float64,
+                                     mode=mode, shape=(capacity,))
+
+    def _write_header(self):
+        header = {
+                  'pixels': self.pixels,
+                  'frames': self.frames_count,
+                  'started': self.started,
+                  'dtype': 'float32'
+                 }
+        temporary = self._file(HEADER_FILE + '.tmp')
+        with open(temporary, 'w') as f:
+            json.dump(header, f, indent=2)
+        os.replace(temporary, self._file(HEADER_FILE))
+
+    def timestamp(self):
+        '''Seconds since the archive was created'''
+        return time.monotonic() - self._origin
+
+    def append(self, spectrum, timestamp=None):
+        '''Append one frame
+
+        Args:
+            spectrum (array): Intensities or absorbances of one frame, or a
+                [wavelengths, values] pair as returned by
+                :meth:`chemios.spectrometers.OceanOptics.absorbance_read`
+            timestamp (float, optional): Seconds since the archive was
+                created. Defaults to now.
+
+        Returns:
+            int: Index of the frame
+        '''
+        if self.mode == 'r':
+            raise ValueError("Archive is open for reading")
+        values = np.asarray(spectrum)
+        if values.ndim == 2:
+            values = values[-1]
+        if values.shape != (self.pixels,):
+            raise ValueError("Frame has {} pixels, archive has {}"
+                             .format(values.shape[-1], self.pixels))
+        if timestamp is None:
+            timestamp = self.timestamp()
+        index = self.frames_count
+        if index and timestamp < self._timestamps[index - 1]:
+            raise ValueError("Timestamps must not decrease")
+        if index == self._capacity:
+            self._map(self._capacity + self.block_frames)
+        self._frames[index] = values
+        self._timestamps[index] = timestamp
+        self.frames_count = index + 1
+        return index
+
+    def flush(self):
+        '''Write frames and header to disk'''
+        if self.mode == 'r':
+            return
+        if self._frames is not None:
+            self._frames.flush()
+            self._timestamps.flush()
+        self._write_header()
+
+    def close(self):
+        '''Flush and trim the files to the frames written'''
+        if self.mode != 'r':
+            self.flush()
+            self._map(self.frames_count)
+            self.mode = 'r'
+
+    def __len__(self):
+        return self.frames_count
+
+    @property
+    def timestamps(self):
+        '''Memory-mapped timestamps of all frames'''
+        if self._timestamps is None:
+            return np.empty(0, dtype=np.float64)
+        return self._timestamps[:self.frames_count]
+
+    @property
+    def frames(self):
+        '''Memory-mapped (frames x pixels) array of all frames'''
+        if self._frames is None:
+            return np.empty((0, self.pixels), dtype=np.float32)
+        return self._frames[:self.frames_count]
+
+    def index_range(self, start=None, stop=None):
+        '''Frame indices covering a time range
+
+        Args:
+            start (float, optional): First time in seconds (inclusive)
+            stop (float, optional): Last time in seconds (exclusive)
+
+        Returns:
+            tuple: (first, last) frame indices for slicing
+        '''
+        timestamps = self.timestamps
+        first = 0 if start is None else int(np.searchsorted(timestamps, start, side='left'))
+        last = len(timestamps) if stop is None else int(np.searchsorted(timestamps, stop, side='left'))
+        return first, max(first, last)
+
+    def read(self, start=None, stop=None):
+        '''Read frames in a time range without copying them into memory
+
+        Args:
+            start (float, optional): First time in seconds (inclusive)
+            stop (float, optional): Last time in seconds (exclusive)
+
+        Returns:
+            tuple: (timestamps, frames) memory-mapped views
+        '''
+        first, last = self.index_range(start, stop)
+        return self.timestamps[first:last], self.frames[first:last]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
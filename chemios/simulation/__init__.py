@@ -0,0 +1,16 @@
+from chemios._lazy import lazy_exports
+
+#Exports are imported on first use
+_exports = {
+            'DeviceServer': '._serial_devices',
+            'ChemyxSimulator': '._serial_devices',
+            'HarvardApparatusSimulator': '._serial_devices',
+            'NewEraSimulator': '._serial_devices',
+            'ModbusBusSimulator': '._modbus',
+            'OmegaSimulator': '._modbus',
+            'SimulatedSeabreeze': '._seabreeze',
+            'SimulationHarness': '._harness',
+            'scale_benchmark': '._harness'
+           }
+__all__ = list(_exports)
+__getattr__, __dir__ = lazy_exports(__name__, _exports)
@@ -0,0 +1,320 @@
+''' Chemios Simulation Harness Module
+
+Spins up many simulated pumps, temperature controllers and spectrometers,
+connects the real drivers to them and measures how the framework scales.
+'''
+import itertools
+import logging
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import serial
+from chemios.pumps import Chemyx, HarvardApparatus, NewEra
+from chemios.temperature_controllers import OmegaCN9300Series, ModbusBus
+from chemios.spectrometers import OceanOptics, FeatureExtractor
+from chemios.control import PID, PumpActuator, SpectralSensor, ControlLoop
+from ._serial_devices import DeviceServer, ChemyxSimulator, HarvardApparatusSimulator, NewEraSimulator
+from ._modbus import ModbusBusSimulator
+from ._seabreeze import SimulatedSeabreeze, DARK_COUNTS
+
+PUMP_MODELS = ('Chemyx', 'HarvardApparatus', 'NewEra')
+#Seconds to wait after a failed pump command, doubled after each failure in a row
+PUMP_RETRY_DELAY = (0.01, 1.0)
+#Failures in a row after which a pump is left alone for the rest of the benchmark
+PUMP_MAX_FAILURES = 10
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return math.nan
+    return ordered[min(int(fraction*len(ordered)), len(ordered) - 1)]
+
+
+class _NewEraRate(object):
+    '''Gives a NewEra pump the set_rate(rate) of the other drivers'''
+    def __init__(self, pump):
+        self.pump = pump
+
+    def set_rate(self, rate):
+        value = rate['value']*{'mL/min': 1000, 'mL/hr': 1000/60.0, 'uL/min': 1, 'uL/hr': 1/60.0}[rate['units']]
+        self.pump.set_rate({'value': value, 'units': 'UM'}, 'INF')
+
+
+class _Reactor(object):
+    '''Concentration at a spectrometer that follows a pump's rate with a first order lag'''
+    def __init__(self, pump, gain=0.5, time_constant=0.5):
+        self.pump = pump
+        self.gain = gain
+        self.time_constant = time_constant
+        self.value = 0.0
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            now = time.monotonic()
+            target = self.gain*self.pump.flow_rate
+            self.value += (target - self.value)*(1 - math.exp(-(now - self._last)/self.time_constant))
+            self._last = now
+            return self.value
+
+
+class SimulationHarness(object):
+    '''Class to run the drivers against many simulated devices on one host
+
+    Pumps cycle through the Chemyx, Harvard Apparatus and New Era command
+    sets, each on its own pseudo-terminal. Omega controllers share Modbus RTU
+    buses of controllers_per_bus slaves. Each spectrometer's emission peak
+    follows the flow of the pump with the same index, so closed loops run
+    end to end through real drivers.
+
+    Attributes:
+        pumps (int, optional): Simulated pumps. Defaults to 0.
+        controllers (int, optional): Simulated Omega controllers. Defaults to 0.
+        spectrometers (int, optional): Simulated spectrometers. Defaults to 0.
+        controllers_per_bus (int, optional): Controllers on each Modbus bus. Defaults to 16.
+        pump_models (tuple, optional): Pump command sets to cycle through. Defaults to all three.
+        baudrate (int, optional): Baud rate of the Modbus buses. Defaults to 19200.
+
+    Note:
+        Measure the throughput of ten of each device::
+
+            with SimulationHarness(pumps=10, controllers=10, spectrometers=10) as harness:
+                report = harness.benchmark(duration=10)
+            print(report['pump_commands_per_second'], report['loop_latency_p95'])
+    '''
+    def __init__(self, pumps=0, controllers=0, spectrometers=0, controllers_per_bus=16,
+                 pump_models=PUMP_MODELS, baudrate=19200):
+        for model in pump_models:
+            if model not in PUMP_MODELS:
+                raise ValueError("{} is not one of the simulated pump models {}".format(model, PUMP_MODELS))
+        self.counts = {'pumps': pumps, 'controllers': controllers, 'spectrometers': spectrometers}
+        self.controllers_per_bus = controllers_per_bus
+        self.pump_models = tuple(pump_models)
+        self.baudrate = baudrate
+        self.server = None
+        self.seabreeze = None
+        self.pump_devices = []
+        self.buses = []
+        self.spectrometer_devices = []
+        self.drivers = {'pumps': [], 'controllers': [], 'spectrometers': []}
+        self._modbus_buses = []
+        self._zones = []
+        self._ports = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        '''Create the simulated devices and connect a driver to each'''
+        self.server = DeviceServer()
+        self.server.start()
+        simulators = {'Chemyx': ChemyxSimulator, 'HarvardApparatus': HarvardApparatusSimulator,
+                      'NewEra': NewEraSimulator}
+        models = itertools.cycle(self.pump_models)
+        for i in range(self.counts['pumps']):
+            model = next(models)
+            self.pump_devices.append((model, self.server.add(simulators[model](name='{}{}'.format(model, i)))))
+        for i in range(0, self.counts['controllers'], self.controllers_per_bus):
+            bus = self.server.add(ModbusBusSimulator(name='ModbusBus{}'.format(len(self.buses))))
+            for address in range(1, min(self.controllers_per_bus, self.counts['controllers'] - i) + 1):
+                bus.add_slave(address)
+            self.buses.append(bus)
+        self.seabreeze = SimulatedSeabreeze()
+        for i in range(self.counts['spectrometers']):
+            signal = _Reactor(self.pump_devices[i][1]) if i < len(self.pump_devices) else None
+            self.spectrometer_devices.append(self.seabreeze.add_device('SIM{:05d}'.format(i), signal=signal))
+
+        #Drivers connect in parallel; several take tenths of a second each
+        with ThreadPoolExecutor(max_workers=32) as executor:
+            self.drivers['pumps'] = list(executor.map(self._connect_pump, self.pump_devices))
+        for bus in self.buses:
+            modbus = ModbusBus(bus.port, self.baudrate)
+            zones = [OmegaCN9300Series(bus.port, address, bus=modbus) for address in sorted(bus.slaves)]
+            self._modbus_buses.append(modbus)
+            self._zones.append(zones)
+            self.drivers['controllers'].extend(zones)
+        for device in self.spectrometer_devices:
+            spectrometer = OceanOptics(device.serial_number, self.seabreeze)
+            spectrometer.__enter__()
+            self.drivers['spectrometers'].append(spectrometer)
+
+    def _connect_pump(self, model_device):
+        model, device = model_device
+        if model == 'Chemyx':
+            port = serial.Serial(device.port, 9600, timeout=0)
+            driver = Chemyx('Fusion 100', port, name=device.name, retry=0.2,
+                            syringe_manufacturer='terumo-japan', syringe_volume=1)
+        elif model == 'HarvardApparatus':
+            port = serial.Serial(device.port, 9600, timeout=0)
+            driver = HarvardApparatus('Phd-Ultra', port, name=device.name)
+        else:
+            port = serial.Serial(device.port, 9600, timeout=0.1)
+            driver = _NewEraRate(NewEra('NE-1000', device.address, ser=port))
+        self._ports.append(port)
+        return driver
+
+    def stop(self):
+        '''Disconnect the drivers and remove the simulated devices'''
+        for spectrometer in self.drivers['spectrometers']:
+            spectrometer.__exit__()
+        for modbus in self._modbus_buses:
+            modbus.close()
+        for port in self._ports:
+            port.close()
+        if self.server is not None:
+            self.server.stop()
+            self.server = None
+        self._modbus_buses = []
+        self._zones = []
+        self._ports = []
+
+    @property
+    def devices(self):
+        '''Number of simulated devices'''
+        return sum(self.counts.values())
+
+    def _drive_pump(self, pump, stop, latencies):
+        rates = itertools.cycle([{'value': 0.2, 'units': 'mL/min'}, {'value': 0.4, 'units': 'mL/min'}])
+        failures = 0
+        while not stop.is_set():
+            start = time.monotonic()
+            try:
+                pump.set_rate(next(rates))
+            except Exception as e:
+                failures += 1
+                logging.warning("Pump command failed: {}".format(e))
+                if failures >= PUMP_MAX_FAILURES:
+                    logging.error("Pump failed {} commands in a row; no longer driving it".format(failures))
+                    return
+                #Back off rather than spin on a pump that keeps failing
+                stop.wait(min(PUMP_RETRY_DELAY[0]*2**(failures - 1), PUMP_RETRY_DELAY[1]))
+                continue
+            failures = 0
+            latencies.append(time.monotonic() - start)
+
+    def benchmark(self, duration=10.0, poll_interval=1.0, loop_period=0.1, integration_time=1000):
+        '''Load every device for a while and measure the framework
+
+        Pumps without a spectrometer get rate changes back to back. Each
+        spectrometer runs a closed loop that drives the pump with its index,
+        or only acquires if there is no such pump. Controllers are polled
+        through their buses.
+
+        Args:
+            duration (float, optional): Seconds of load. Defaults to 10.
+            poll_interval (float, optional): Seconds between polls of each bus. Defaults to 1.
+            loop_period (float, optional): Seconds between control loop iterations. Defaults to 0.1.
+            integration_time (int, optional): Spectrometer integration time in microseconds.
+                Defaults to 1000.
+
+        Returns:
+            dict: 'devices' and 'duration', device rates 'pump_commands_per_second',
+            'modbus_transactions_per_second' and 'frames_per_second', the mean and 95th
+            percentile of 'pump_command_latency', 'cpu_per_device' (process CPU seconds per
+            second per device), 'simulator_cpu_per_device', and the mean, 95th percentile
+            and maximum of 'loop_latency' with 'loop_jitter_p95' and 'loop_overruns'
+        '''
+        stop = threading.Event()
+        pumps = self.drivers['pumps']
+        spectrometers = self.drivers['spectrometers']
+        looped = min(len(pumps), len(spectrometers))
+        latencies = []
+        loops = []
+        threads = [threading.Thread(target=self._drive_pump, args=(pump, stop, latencies), daemon=True)
+                   for pump in pumps[looped:]]
+
+        pump_commands = sum(device.commands for model, device in self.pump_devices)
+        transactions = sum(modbus.transactions for modbus in self._modbus_buses)
+        frames = sum(device.frames for device in self.spectrometer_devices)
+        simulator_cpu = self._simulator_cpu()
+        cpu = time.process_time()
+        start = time.monotonic()
+
+        for spectrometer in spectrometers:
+            spectrometer.start_acquisition(integration_time, buffer_size=4)
+        for i in range(looped):
+            device = self.spectrometer_devices[i]
+            sensor = SpectralSensor(spectrometers[i], FeatureExtractor(device.wavelengths, peak_window=(500, 600)),
+                                    feature='peak_height', timeout=1)
+            #Hold the peak where the pump runs at about 0.3 mL/min
+            counts = 20.0*integration_time
+            lamp = device.lamp[device.emission.argmax()]
+            pid = PID(kp=0.5/counts, ki=2.0/counts, setpoint=DARK_COUNTS + counts*(lamp + 0.15),
+                      output_limits=(0, 1), bias=0.3)
+            loops.append(ControlLoop(sensor, pid, PumpActuator(pumps[i]), period=loop_period))
+        for modbus, zones in zip(self._modbus_buses, self._zones):
+            modbus.start_polling(zones, interval=poll_interval)
+        for thread in threads:
+            thread.start()
+        for loop in loops:
+            loop.start()
+
+        stop.wait(duration)
+        stop.set()
+        for loop in loops:
+            loop.stop()
+        for thread in threads:
+            thread.join()
+        for modbus in self._modbus_buses:
+            modbus.stop_polling()
+        for spectrometer in spectrometers:
+            spectrometer.stop_acquisition()
+
+        elapsed = time.monotonic() - start
+        devices = max(self.devices, 1)
+        report = {
+                  'devices': dict(self.counts),
+                  'duration': elapsed,
+                  'pump_commands_per_second': (sum(device.commands for model, device in self.pump_devices)
+                                               - pump_commands)/elapsed,
+                  'modbus_transactions_per_second': (sum(modbus.transactions for modbus in self._modbus_buses)
+                                                     - transactions)/elapsed,
+                  'frames_per_second': (sum(device.frames for device in self.spectrometer_devices) - frames)/elapsed,
+                  'pump_command_latency_mean': sum(latencies)/len(latencies) if latencies else math.nan,
+                  'pump_command_latency_p95': _percentile(latencies, 0.95),
+                  'cpu_per_device': (time.process_time() - cpu)/elapsed/devices,
+                  'simulator_cpu_per_device': (self._simulator_cpu() - simulator_cpu)/elapsed/devices
+                 }
+        loop_latency = [value for loop in loops for value in loop.metrics.latency]
+        loop_jitter = [value for loop in loops for value in loop.metrics.jitter]
+        report['loop_latency_mean'] = sum(loop_latency)/len(loop_latency) if loop_latency else math.nan
+        report['loop_latency_p95'] = _percentile(loop_latency, 0.95)
+        report['loop_latency_max'] = max(loop_latency) if loop_latency else math.nan
+        report['loop_jitter_p95'] = _percentile(loop_jitter, 0.95)
+        report['loop_overruns'] = sum(loop.metrics.overruns for loop in loops)
+        return report
+
+    def _simulator_cpu(self):
+        return (sum(device.cpu_time for model, device in self.pump_devices)
+                + sum(bus.cpu_time for bus in self.buses)
+                + sum(device.cpu_time for device in self.spectrometer_devices))
+
+
+def scale_benchmark(counts, duration=10.0, pumps=1, controllers=1, spectrometers=1, **kwargs):
+    '''Benchmark a growing number of simulated devices
+
+    Args:
+        counts (list): Values of N to run
+        duration (float, optional): Seconds of load at each N. Defaults to 10.
+        pumps (int, optional): Pumps per N. Defaults to 1.
+        controllers (int, optional): Temperature controllers per N. Defaults to 1.
+        spectrometers (int, optional): Spectrometers per N. Defaults to 1.
+        kwargs: Passed on to :meth:`SimulationHarness.benchmark`
+
+    Returns:
+        list: Report of each N, with 'n' added
+    '''
+    reports = []
+    for n in counts:
+        with SimulationHarness(pumps=n*pumps, controllers=n*controllers, spectrometers=n*spectrometers) as harness:
+            report = harness.benchmark(duration, **kwargs)
+        report['n'] = n
+        reports.append(report)
+    return reports
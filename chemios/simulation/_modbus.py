@@ -0,0 +1,162 @@
+''' Chemios Simulated Modbus Module
+
+Omega CN9300 series controllers as Modbus RTU slaves sharing one
+pseudo-terminal, as they would share an RS-485 bus.
+'''
+import math
+import struct
+import time
+from ._serial_devices import PtyDevice
+
+TEMPERATURE_REGISTER = 28
+SETPOINT_REGISTER = 127
+DEVICE_INFO_REGISTER = 0x04FC
+DEVICE_INFO = 9311
+PRE_SECURITY_REGISTER = 768
+SECURITY_REGISTER_PRE = 5376
+SECURITY_REGISTER_POST = 5632
+
+#Modbus exception codes
+ILLEGAL_FUNCTION = 1
+ILLEGAL_ADDRESS = 2
+DEVICE_FAILURE = 4
+
+
+def crc16(data):
+    '''Modbus RTU CRC of data, as the two bytes sent after it'''
+    crc = 0xFFFF
+    for byte in data:
+        crc ^= byte
+        for i in range(8):
+            if crc & 1:
+                crc = (crc >> 1) ^ 0xA001
+            else:
+                crc >>= 1
+    return struct.pack('<H', crc)
+
+
+class OmegaSimulator(object):
+    '''Simulated Omega CN9300 series controller with a first order response
+
+    Attributes:
+        ambient (float, optional): Starting temperature and setpoint in deg C. Defaults to 25.
+        time_constant (float, optional): Seconds to close 63% of the gap to the setpoint.
+            Defaults to 60.
+    '''
+    def __init__(self, ambient=25.0, time_constant=60.0):
+        self.time_constant = time_constant
+        self.setpoint = ambient
+        self.temperature = ambient
+        self.locked = True
+        self.registers = {DEVICE_INFO_REGISTER: DEVICE_INFO}
+        self._pre_security = None
+        self._last = time.monotonic()
+
+    def _update(self):
+        now = time.monotonic()
+        fraction = 1 - math.exp(-(now - self._last)/self.time_constant)
+        self.temperature += (self.setpoint - self.temperature)*fraction
+        self._last = now
+
+    def read(self, register):
+        '''Contents of a register'''
+        self._update()
+        if register == TEMPERATURE_REGISTER:
+            return int(round(self.temperature*10)) & 0xFFFF
+        if register == SETPOINT_REGISTER:
+            return int(round(self.setpoint*10)) & 0xFFFF
+        return self.registers.get(register, 0)
+
+    def write(self, register, value):
+        '''Write a register
+
+        Returns:
+            bool: False if the controller refuses the write
+        '''
+        self._update()
+        if register == PRE_SECURITY_REGISTER:
+            self._pre_security = value
+        elif register == SECURITY_REGISTER_PRE and self._pre_security == 5:
+            self.locked = False
+        elif register == SECURITY_REGISTER_POST and self._pre_security == 6:
+            self.locked = True
+        elif register == SETPOINT_REGISTER:
+            if self.locked:
+                return False
+            self.setpoint = value/10.0
+        else:
+            self.registers[register] = value
+        return True
+
+
+class ModbusBusSimulator(PtyDevice):
+    '''Class for Modbus RTU slaves on one pseudo-terminal
+
+    Serves function codes 3 (read holding registers), 6 (write register) and
+    16 (write registers). Requests to absent slaves go unanswered, like on a
+    real bus.
+
+    Attributes:
+        max_block (int, optional): Most registers one read may ask for. Defaults to 125.
+    '''
+    def __init__(self, max_block=125, name=None):
+        super(ModbusBusSimulator, self).__init__(name)
+        self.max_block = max_block
+        self.slaves = {}
+        self.errors = 0
+
+    def add_slave(self, address, slave=None):
+        '''Add a slave, by default an OmegaSimulator, and return it'''
+        if not 1 <= address <= 247:
+            raise ValueError("Slave address {} is not between 1 and 247".format(address))
+        self.slaves[address] = slave if slave is not None else OmegaSimulator()
+        return self.slaves[address]
+
+    def frames(self):
+        frames = []
+        while len(self._buffer) >= 8:
+            function = self._buffer[1]
+            length = 8
+            if function == 16:
+                length = 9 + self._buffer[6]
+                if len(self._buffer) < length:
+                    break
+            frame, self._buffer = self._buffer[:length], self._buffer[length:]
+            if crc16(frame[:-2]) != frame[-2:]:
+                #Lost framing; drop everything up to the next silence
+                self.errors += 1
+                self._buffer = b''
+                break
+            frames.append(frame)
+        return frames
+
+    def _exception(self, address, function, code):
+        body = struct.pack('>BBB', address, function | 0x80, code)
+        return body + crc16(body)
+
+    def handle(self, frame):
+        address, function = frame[0], frame[1]
+        slave = self.slaves.get(address)
+        if slave is None:
+            return None
+        if function == 3:
+            start, count = struct.unpack('>HH', frame[2:6])
+            if not 1 <= count <= self.max_block:
+                return self._exception(address, function, ILLEGAL_ADDRESS)
+            values = [slave.read(start + i) for i in range(count)]
+            body = struct.pack('>BBB{}H'.format(count), address, function, 2*count, *values)
+        elif function == 6:
+            register, value = struct.unpack('>HH', frame[2:6])
+            if not slave.write(register, value):
+                return self._exception(address, function, DEVICE_FAILURE)
+            body = frame[:6]
+        elif function == 16:
+            start, count = struct.unpack('>HH', frame[2:6])
+            values = struct.unpack('>{}H'.format(count), frame[7:7 + 2*count])
+            for i, value in enumerate(values):
+                if not slave.write(start + i, value):
+                    return self._exception(address, function, DEVICE_FAILURE)
+            body = frame[:6]
+        else:
+            return self._exception(address, function, ILLEGAL_FUNCTION)
+        return body + crc16(body)
@@ -0,0 +1,114 @@
+''' Chemios Simulated Seabreeze Module
+
+A stand-in for seabreeze.spectrometers whose devices produce synthetic
+spectra in real time, for use as the seabreeze argument of OceanOptics.
+'''
+import time
+import zlib
+import numpy as np
+from ._serial_devices import _cpu_time
+
+PIXELS = 2048
+MAX_COUNTS = 65535
+DARK_COUNTS = 1000.0
+
+
+class SimulatedSpectrometer(object):
+    '''Class for a simulated spectrometer device
+
+    The spectrum is a broad lamp plus an emission peak whose height follows
+    signal, so a closed loop can see the effect of its actuators.
+
+    Attributes:
+        serial_number (str): Serial number to open the device by
+        peak (float, optional): Wavelength of the emission peak in nm. Defaults to 550.
+        width (float, optional): Standard deviation of the peak in nm. Defaults to 15.
+        signal (callable, optional): Returns the peak height relative to the lamp.
+            Defaults to a constant 0.5.
+        noise (float, optional): Standard deviation of the counts. Defaults to 0.
+        real_time (bool, optional): Block for the integration time. Defaults to True.
+    '''
+    def __init__(self, serial_number, peak=550.0, width=15.0, signal=None, noise=0.0, real_time=True):
+        self.serial_number = serial_number
+        self.signal = signal if signal is not None else (lambda: 0.5)
+        self.noise = noise
+        self.real_time = real_time
+        self.wavelengths = np.linspace(200.0, 1000.0, PIXELS)
+        self.lamp = np.exp(-((self.wavelengths - 600.0)/150.0)**2)
+        self.emission = np.exp(-0.5*((self.wavelengths - peak)/width)**2)
+        self.frames = 0
+        self.cpu_time = 0.0
+        self._random = np.random.RandomState(zlib.crc32(serial_number.encode()))
+
+    def spectrum(self, integration_time):
+        '''Counts of one frame at an integration time in microseconds'''
+        start = _cpu_time()
+        counts = DARK_COUNTS + 20.0*integration_time*(self.lamp + self.signal()*self.emission)
+        if self.noise:
+            counts += self._random.normal(0, self.noise, PIXELS)
+        counts = np.minimum(counts, MAX_COUNTS)
+        self.frames += 1
+        self.cpu_time += _cpu_time() - start
+        return counts
+
+
+class _SpectrometerHandle(object):
+    '''Open device, with the methods of seabreeze.spectrometers.Spectrometer'''
+    max_intensity = MAX_COUNTS
+    integration_time_micros_limits = (10, 10000000)
+
+    def __init__(self, device):
+        self.device = device
+        self.serial_number = device.serial_number
+        self.integration_time = 1000
+
+    def integration_time_micros(self, integration_time):
+        self.integration_time = integration_time
+
+    def wavelengths(self):
+        return self.device.wavelengths.copy()
+
+    def intensities(self, correct_dark_counts=True, correct_nonlinearity=True):
+        if self.device.real_time:
+            time.sleep(self.integration_time*1e-6)
+        return self.device.spectrum(self.integration_time)
+
+    def close(self):
+        return
+
+
+class _SpectrometerClass(object):
+    '''Stands in for the Spectrometer class of seabreeze.spectrometers'''
+    def __init__(self, seabreeze):
+        self.seabreeze = seabreeze
+
+    def from_serial_number(self, serial_number):
+        try:
+            return _SpectrometerHandle(self.seabreeze.devices[serial_number])
+        except KeyError:
+            raise IOError("No simulated spectrometer {}".format(serial_number))
+
+
+class SimulatedSeabreeze(object):
+    '''Class standing in for seabreeze.spectrometers
+
+    Note:
+        Open a simulated device with the real driver::
+
+            seabreeze = SimulatedSeabreeze()
+            seabreeze.add_device('SIM00001', noise=10)
+            with OceanOptics('SIM00001', seabreeze) as spec:
+                spec.read_spectrometer_raw(1000)
+    '''
+    def __init__(self):
+        self.devices = {}
+        self.Spectrometer = _SpectrometerClass(self)
+
+    def add_device(self, serial_number, **kwargs):
+        '''Add a device; kwargs go to :obj:`SimulatedSpectrometer`'''
+        self.devices[serial_number] = SimulatedSpectrometer(serial_number, **kwargs)
+        return self.devices[serial_number]
+
+    def list_devices(self):
+        '''Serial numbers of the devices'''
+        return list(self.devices)
@@ -0,0 +1,293 @@
+''' Chemios Simulated Serial Devices Module
+
+Pumps that speak the Chemyx, Harvard Apparatus and New Era serial command
+sets on pseudo-terminals, so the real drivers can open them by port name.
+One DeviceServer thread serves every device through a selector.
+'''
+import logging
+import os
+import re
+import selectors
+import threading
+import time
+
+#Chemyx unit numbers
+CHEMYX_UNITS = {'0': 'mL/min', '1': 'mL/hr', '2': 'uL/min', '3': 'uL/hr'}
+#mL/min per unit of each rate
+RATE_UNITS = {'mL/min': 1.0, 'mL/hr': 1/60.0, 'uL/min': 1e-3, 'uL/hr': 1e-3/60,
+              'ml/min': 1.0, 'ml/h': 1/60.0, 'ul/min': 1e-3, 'ul/h': 1e-3/60,
+              'MM': 1.0, 'MH': 1/60.0, 'UM': 1e-3, 'UH': 1e-3/60}
+
+
+def _cpu_time():
+    #CPU time of the calling thread where the platform has it
+    return time.thread_time() if hasattr(time, 'thread_time') else time.process_time()
+
+
+class PtyDevice(object):
+    '''Base class for a device on a pseudo-terminal
+
+    Subclasses split incoming bytes into frames and answer each frame in
+    :meth:`handle`.
+
+    Attributes:
+        name (str, optional): Reference name of the device
+
+    Note:
+        On a pseudo-terminal, flushOutput discards bytes the server has not
+        read yet, so a driver that flushes before each write can lose a
+        command sent just before. Give the server a moment between commands.
+    '''
+    def __init__(self, name=None):
+        if not hasattr(os, 'openpty'):
+            raise IOError("Simulated serial devices need pseudo-terminals, which this system lacks")
+        import tty
+        self.name = name or self.__class__.__name__
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        os.set_blocking(self.master, False)
+        self.port = os.ttyname(self.slave)
+        self.commands = 0
+        self.dropped = 0
+        self.cpu_time = 0.0
+        self._buffer = b''
+
+    def fileno(self):
+        return self.master
+
+    def frames(self):
+        '''Split complete frames off the input buffer
+
+        Returns:
+            list: Frames as bytes
+        '''
+        raise NotImplementedError
+
+    def handle(self, frame):
+        '''Answer one frame
+
+        Returns:
+            bytes: Response, or None to stay silent
+        '''
+        raise NotImplementedError
+
+    def feed(self, data):
+        '''Handle bytes read from the port'''
+        start = _cpu_time()
+        self._buffer += data
+        for frame in self.frames():
+            self.commands += 1
+            try:
+                response = self.handle(frame)
+            except Exception as e:
+                logging.warning("{} could not handle {!r}: {}".format(self.name, frame, e))
+                continue
+            if response:
+                try:
+                    os.write(self.master, response)
+                except BlockingIOError:
+                    #Nobody reads the port; a real device would drop it too
+                    self.dropped += 1
+        self.cpu_time += _cpu_time() - start
+
+    def close(self):
+        for fd in (self.master, self.slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+class _LineDevice(PtyDevice):
+    '''Device whose commands end with a carriage return'''
+    def frames(self):
+        *lines, self._buffer = re.split(b'[\r\n]', self._buffer)
+        return [line.strip() for line in lines if line.strip()]
+
+
+class _Pump(_LineDevice):
+    '''Common state of the simulated pumps'''
+    def __init__(self, name=None):
+        super(_Pump, self).__init__(name)
+        self.rate = 0.0         #mL/min
+        self.running = False
+        self.direction = 'INF'
+        self.diameter = None
+
+    @property
+    def flow_rate(self):
+        '''Signed flow rate in mL/min while running, else 0'''
+        if not self.running:
+            return 0.0
+        return -self.rate if self.direction == 'WDR' else self.rate
+
+
+class ChemyxSimulator(_Pump):
+    '''Simulated Chemyx syringe pump'''
+    def __init__(self, name=None):
+        super(ChemyxSimulator, self).__init__(name)
+        self.units = '0'
+        self.value = 0.0
+        self.volume = 0.0
+
+    def handle(self, frame):
+        command = frame.decode(errors='replace').split()
+        if command[:2] == ['set', 'units']:
+            self.units = command[2]
+            self.rate = self.value*RATE_UNITS[CHEMYX_UNITS[self.units]]
+            return 'units = {}\r\n'.format(self.units).encode()
+        if command[:2] == ['set', 'rate']:
+            self.value = float(command[2])
+            self.rate = self.value*RATE_UNITS[CHEMYX_UNITS[self.units]]
+            return 'rate = {}\r\n'.format(command[2]).encode()
+        if command[:2] == ['set', 'diameter']:
+            self.diameter = float(command[2])
+            return 'diameter = {}\r\n'.format(command[2]).encode()
+        if command[:2] == ['set', 'volume']:
+            self.volume = float(command[2])
+            self.direction = 'WDR' if self.volume < 0 else 'INF'
+            return 'volume = {}\r\n'.format(command[2]).encode()
+        if command == ['start']:
+            self.running = True
+        elif command == ['stop']:
+            self.running = False
+        elif command == ['view', 'parameter']:
+            return ('diameter = {:.3f}\r\nrate = {:.3f}\r\nunit = {}\r\nvolume = {:.3f}\r\n'
+                    .format(self.diameter or 0, self.value, self.units, self.volume)).encode()
+        return None
+
+
+class HarvardApparatusSimulator(_Pump):
+    '''Simulated Harvard Apparatus PHD Ultra syringe pump'''
+    def handle(self, frame):
+        command = frame.decode(errors='replace').split()
+        if command == ['CMD']:
+            return b'Ultra\r\n:'
+        if command[0] == 'irate':
+            self.rate = float(command[1])*RATE_UNITS[command[2]]
+            self.direction = 'INF'
+        elif command[0] == 'wrate':
+            self.rate = float(command[1])*RATE_UNITS[command[2]]
+            self.direction = 'WDR'
+        elif command[0] == 'irun':
+            self.running, self.direction = True, 'INF'
+        elif command[0] == 'wrun':
+            self.running, self.direction = True, 'WDR'
+        elif command[0] == 'stop':
+            self.running = False
+        elif command[0] == 'syrm':
+            if len(command) > 2:
+                self.diameter = float(command[2])
+            return (' '.join(command) + '\r\n:').encode()
+        return None
+
+
+class NewEraSimulator(_Pump):
+    '''Simulated New Era NE-1000 syringe pump
+
+    Attributes:
+        address (int, optional): Network address of the pump. Defaults to 0.
+    '''
+    _command = re.compile(r'^(\d*)\s*([A-Z]{3})\s*(.*)$')
+
+    def __init__(self, address=0, name=None):
+        super(NewEraSimulator, self).__init__(name)
+        self.address = address
+
+    def _reply(self, data=''):
+        status = 'S'
+        if self.running:
+            status = 'W' if self.direction == 'WDR' else 'I'
+        return '\x02{:02d}{}{}\x03'.format(self.address, status, data).encode()
+
+    def handle(self, frame):
+        match = self._command.match(frame.decode(errors='replace'))
+        if match is None:
+            return '\x02{:02d}S?\x03'.format(self.address).encode()
+        address, command, argument = match.groups()
+        if int(address or 0) != self.address:
+            return None
+        if command == 'RAT':
+            units = re.search(r'[A-Z]{2}$', argument)
+            if units is not None:
+                self.rate = float(argument[:-2])*RATE_UNITS[units.group()]
+            return self._reply()
+        if command == 'DIR':
+            if argument:
+                self.direction = argument.strip()
+                return self._reply()
+            return self._reply(self.direction)
+        if command == 'DIA':
+            if argument:
+                self.diameter = float(argument)
+            return self._reply()
+        if command == 'RUN':
+            self.running = True
+        elif command == 'STP':
+            self.running = False
+        elif command == 'VER':
+            return self._reply('NE1000V3.928')
+        elif command == 'PHN':
+            return self._reply('01')
+        return self._reply()
+
+
+class DeviceServer(object):
+    '''Class to serve many simulated devices from one thread
+
+    Attributes:
+        devices (list): Devices being served
+    '''
+    def __init__(self):
+        self.devices = []
+        self._selector = selectors.DefaultSelector()
+        self._wake_read, self._wake_write = os.pipe()
+        self._selector.register(self._wake_read, selectors.EVENT_READ, None)
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread = None
+
+    def add(self, device):
+        '''Serve a device'''
+        with self._lock:
+            self.devices.append(device)
+            self._selector.register(device.fileno(), selectors.EVENT_READ, device)
+        os.write(self._wake_write, b'x')
+        return device
+
+    def start(self):
+        '''Start the server thread'''
+        self._running = True
+        self._thread = threading.Thread(target=self._serve, daemon=True, name='DeviceServer')
+        self._thread.start()
+
+    def _serve(self):
+        while self._running:
+            for key, events in self._selector.select(timeout=0.5):
+                device = key.data
+                if device is None:
+                    os.read(self._wake_read, 4096)
+                    continue
+                try:
+                    data = os.read(key.fd, 4096)
+                except (BlockingIOError, InterruptedError):
+                    continue
+                except OSError:
+                    #The port was closed
+                    with self._lock:
+                        self._selector.unregister(key.fd)
+                    continue
+                device.feed(data)
+
+    def stop(self):
+        '''Stop the server thread and close every device'''
+        self._running = False
+        os.write(self._wake_write, b'x')
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        for device in self.devices:
+            device.close()
+        self._selector.close()
+        os.close(self._wake_read)
+        os.close(self._wake_write)
@@ -1 +1,21 @@
-from ._oceanoptics import OceanOptics
\ No newline at end of file
+from chemios._lazy import lazy_exports
+
+#Exports are imported on first use
+_exports = {
+            'OceanOptics': '._oceanoptics',
+            'ScanAverager': '._averaging',
+            'batch_absorbance': '._processing',
+            'iter_absorbance': '._processing',
+            'batch_fluorescence': '._processing',
+            'band_weights': '._processing',
+            'FeatureExtractor': '._features',
+            'SpectrometerGroup': '._group',
+            'AutoExposure': '._exposure',
+            'PixelReducer': '._reduction',
+            'CalibrationStore': '._calibration',
+            'save_spectrum': '._spectrum_file',
+            'load_spectrum': '._spectrum_file',
+            'read_header': '._spectrum_file'
+           }
+__all__ = list(_exports)
+__getattr__, __dir__ = lazy_exports(__name__, _exports)
@@ -0,0 +1,123 @@
+''' Chemios Scan Averaging Module
+
+Folds spectrometer scans one at a time into preallocated buffers, so
+averaging many scans needs the memory of one.
+'''
+import numpy as np
+
+MODES = ['mean', 'ema']
+
+
+class ScanAverager(object):
+    '''Class for streaming averages of scans
+
+    In 'mean' mode the running mean and Welford's variance are updated with
+    each scan. In 'ema' mode an exponential moving average and exponentially
+    weighted variance are updated, weighting new scans by alpha.
+
+    Attributes:
+        pixels (int): Number of pixels per scan
+        mode (str, optional): 'mean' or 'ema'. Defaults to 'mean'.
+        alpha (float, optional): Weight of each new scan in 'ema' mode. Defaults to 0.1.
+
+    Note:
+        Stop averaging once the median signal to noise ratio passes 100::
+
+            averager = ScanAverager(2048)
+            for scan in scans:
+                averager.add(scan)
+                if np.median(averager.snr(dark)) > 100:
+                    break
+    '''
+    def __init__(self, pixels, mode='mean', alpha=0.1):
+        if mode not in MODES:
+            raise ValueError("Averaging mode must be one of {}".format(MODES))
+        if not 0 < alpha <= 1:
+            raise ValueError("alpha must be between 0 and 1")
+        self.pixels = pixels
+        self.mode = mode
+        self.alpha = alpha
+        self.count = 0
+
+        #Preallocated buffers
+        self._mean = np.zeros(pixels)
+        self._m2 = np.zeros(pixels)
+        self._delta = np.empty(pixels)
+        self._scratch = np.empty(pixels)
+
+    def reset(self):
+        '''Forget all scans, keeping the buffers'''
+        self.count = 0
+        self._mean.fill(0)
+        self._m2.fill(0)
+
+    def add(self, scan):
+        '''Fold one scan into the average in place
+
+        Args:
+            scan (array): Intensities of one scan
+        '''
+        delta, scratch = self._delta, self._scratch
+        self.count += 1
+        if self.count == 1:
+            np.copyto(self._mean, scan)
+            return
+        np.subtract(scan, self._mean, out=delta)
+        if self.mode == 'mean':
+            #Welford: mean += delta/n; m2 += delta*(x - new mean)
+            np.multiply(delta, 1.0/self.count, out=scratch)
+            self._mean += scratch
+            np.subtract(scan, self._mean, out=scratch)
+            scratch *= delta
+            self._m2 += scratch
+        else:
+            #Exponentially weighted mean and variance (m2 holds the variance)
+            np.multiply(delta, self.alpha, out=scratch)
+            self._mean += scratch
+            scratch *= delta
+            self._m2 += scratch
+            self._m2 *= 1 - self.alpha
+
+    @property
+    def mean(self):
+        '''Current average of the scans (read-only view)'''
+        view = self._mean.view()
+        view.flags.writeable = False
+        return view
+
+    @property
+    def variance(self):
+        '''Per-pixel variance of single scans'''
+        if self.count < 2:
+            return np.full(self.pixels, np.inf)
+        if self.mode == 'mean':
+            return self._m2/(self.count - 1)
+        return self._m2.copy()
+
+    @property
+    def effective_count(self):
+        '''Number of equally weighted scans the average is worth'''
+        if self.mode == 'mean':
+            return self.count
+        #An EMA settles at the variance reduction of (2 - alpha)/alpha scans
+        steady = (2 - self.alpha)/self.alpha
+        return min(self.count, steady)
+
+    @property
+    def noise(self):
+        '''Per-pixel standard error of the average'''
+        if self.count < 2:
+            return np.full(self.pixels, np.inf)
+        return np.sqrt(self.variance/self.effective_count)
+
+    def snr(self, offset=0):
+        '''Per-pixel signal to noise ratio of the average
+
+        Args:
+            offset (float or array, optional): Baseline subtracted from the
+                average before dividing by the noise (e.g., the dark). Defaults to 0.
+        '''
+        with np.errstate(divide='ignore', invalid='ignore'):
+            snr = np.abs(self._mean - offset)/self.noise
+        snr[np.isnan(snr)] = 0
+        return snr
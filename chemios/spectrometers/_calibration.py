@@ -0,0 +1,160 @@
+''' Chemios Calibration Store Module
+
+Keeps dark and blank spectra between sessions, keyed by spectrometer
+serial number, integration time and pixel reduction, so they are only
+measured again once they go stale.
+
+Layout of a calibration store directory::
+
+    calibrations.json                        index with capture times
+    <serial>/<kind>_<time>us_<roi>.npy       float32 reference spectra
+
+'''
+import json
+import os
+import threading
+import time
+import numpy as np
+
+INDEX_FILE = 'calibrations.json'
+FULL_SPECTRUM = 'full'
+
+
+def _exact(value):
+    '''Shortest text that reads back as the same float, without a trailing .0'''
+    text = repr(float(value))
+    return text[:-2] if text.endswith('.0') else text
+
+
+def roi_key(reduction=None):
+    '''Name of a pixel reduction for keys and file names
+
+    Args:
+        reduction (tuple, optional): (rois, binning) as passed to
+            :meth:`chemios.spectrometers.OceanOptics.set_reduction`. Defaults to
+            the whole spectrum.
+
+    Returns:
+        str: e.g. 'full' or 'roi300-400_500-700_bin4'
+    '''
+    if reduction is None:
+        return FULL_SPECTRUM
+    rois, binning = reduction
+    key = 'roi' + '_'.join('{}-{}'.format(_exact(low), _exact(high)) for low, high in rois) if rois else 'all'
+    return '{}_bin{}'.format(key, binning)
+
+
+class CalibrationStore(object):
+    '''Class for persistent reference spectra
+
+    Attributes:
+        path (str): Directory of the store. Created if it does not exist.
+        max_age (float or dict, optional): Seconds after capture that a reference stays
+            valid, for all kinds or per kind (e.g., {'dark': 600, 'blank': 3600}).
+            Defaults to references never going stale.
+
+    Note:
+        Load references at startup and only measure the stale ones::
+
+            store = CalibrationStore('calibrations', max_age={'dark': 600, 'blank': 3600})
+            with OceanOptics('FLMS02673', sb, calibration=store) as spec:
+                for kind in spec.load_references(1000):
+                    ...  #measure and store_dark/store_blank at 1000 us
+    '''
+    def __init__(self, path, max_age=None):
+        self.path = path
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        index_path = os.path.join(path, INDEX_FILE)
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                self.index = json.load(f)
+        else:
+            self.index = {}
+
+    @staticmethod
+    def key(serial, kind, integration_time, reduction=None):
+        '''Index key of a reference spectrum'''
+        return '{}/{}_{}us_{}'.format(serial, kind, _exact(integration_time), roi_key(reduction))
+
+    def _write_index(self):
+        temporary = os.path.join(self.path, INDEX_FILE + '.tmp')
+        with open(temporary, 'w') as f:
+            json.dump(self.index, f, indent=2, sort_keys=True)
+        os.replace(temporary, os.path.join(self.path, INDEX_FILE))
+
+    def _max_age(self, kind):
+        if isinstance(self.max_age, dict):
+            return self.max_age.get(kind)
+        return self.max_age
+
+    def save(self, serial, kind, values, integration_time, reduction=None, captured=None):
+        '''Save a reference spectrum, replacing any with the same key
+
+        Args:
+            serial (str): Serial number of the spectrometer
+            kind (str): Kind of reference, e.g. 'dark' or 'blank'
+            values (array): Intensities of the reference
+            integration_time (float): Integration time in microseconds
+            reduction (tuple, optional): (rois, binning) the values were reduced with
+            captured (float, optional): Capture time in seconds since the epoch. Defaults to now.
+        '''
+        key = self.key(serial, kind, integration_time, reduction)
+        values = np.asarray(values, dtype=np.float32)
+        with self._lock:
+            os.makedirs(os.path.join(self.path, str(serial)), exist_ok=True)
+            np.save(os.path.join(self.path, key + '.npy'), values)
+            self.index[key] = {
+                               'serial': serial,
+                               'kind': kind,
+                               'integration_time': integration_time,
+                               'roi': roi_key(reduction),
+                               'pixels': len(values),
+                               'captured': time.time() if captured is None else captured
+                              }
+            self._write_index()
+
+    def age(self, serial, kind, integration_time, reduction=None):
+        '''Seconds since a reference was captured, or None if there is none'''
+        entry = self.index.get(self.key(serial, kind, integration_time, reduction))
+        if entry is None:
+            return None
+        return time.time() - entry['captured']
+
+    def is_valid(self, serial, kind, integration_time, reduction=None):
+        '''True if a reference exists and is not stale'''
+        age = self.age(serial, kind, integration_time, reduction)
+        if age is None:
+            return False
+        max_age = self._max_age(kind)
+        return max_age is None or age <= max_age
+
+    def load(self, serial, kind, integration_time, reduction=None):
+        '''Load a reference spectrum if it is still valid
+
+        Args:
+            serial (str): Serial number of the spectrometer
+            kind (str): Kind of reference, e.g. 'dark' or 'blank'
+            integration_time (float): Integration time in microseconds
+            reduction (tuple, optional): (rois, binning) of the reference
+
+        Returns:
+            Numpy float array of intensities, or None if the reference is missing or stale
+        '''
+        if not self.is_valid(serial, kind, integration_time, reduction):
+            return None
+        key = self.key(serial, kind, integration_time, reduction)
+        return np.load(os.path.join(self.path, key + '.npy')).astype(np.float64)
+
+    def remove(self, serial, kind, integration_time, reduction=None):
+        '''Delete a reference spectrum if it exists'''
+        key = self.key(serial, kind, integration_time, reduction)
+        with self._lock:
+            if self.index.pop(key, None) is None:
+                return
+            try:
+                os.remove(os.path.join(self.path, key + '.npy'))
+            except OSError:
+                pass
+            self._write_index()
@@ -0,0 +1,109 @@
+''' Chemios Auto Exposure Module
+
+Finds the integration time that puts the peak counts of a spectrum in a
+target band below saturation, using a few short probe scans.
+'''
+import logging
+import numpy as np
+
+DEFAULT_SATURATION = 65535
+DEFAULT_LIMITS = (1000, 10000000)
+
+
+class AutoExposure(object):
+    '''Class to choose integration times automatically
+
+    Counts grow roughly linearly with integration time, so after each
+    unsaturated probe the next integration time is extrapolated to the
+    middle of the target band. Saturated probes shrink the integration
+    time, staying above the longest unsaturated probe. Results are cached
+    per spectrometer and sample type.
+
+    Attributes:
+        target (tuple, optional): (low, high) fraction of saturation for the peak counts.
+            Defaults to (0.6, 0.85).
+        saturation (float, optional): Counts at saturation. Defaults to the device's
+            max_intensity, or 65535.
+        max_probes (int, optional): Most probe scans per search. Defaults to 8.
+
+    Note:
+        Use one AutoExposure for all spectrometers to share the cache::
+
+            exposure = AutoExposure()
+            integration_time = exposure.find(spec, sample_type='dye in ethanol')
+            spec.absorbance_read(integration_time, 10)
+    '''
+    def __init__(self, target=(0.6, 0.85), saturation=None, max_probes=8):
+        if not 0 < target[0] < target[1] < 1:
+            raise ValueError("Target must be two fractions of saturation between 0 and 1")
+        self.target = target
+        self.saturation = saturation
+        self.max_probes = max_probes
+        self.cache = {}
+        self.probes = []
+
+    def _device_limits(self, spectrometer):
+        device = spectrometer.ocean_optics
+        saturation = self.saturation or getattr(device, 'max_intensity', DEFAULT_SATURATION)
+        limits = getattr(device, 'integration_time_micros_limits', DEFAULT_LIMITS)
+        return float(saturation), limits
+
+    def find(self, spectrometer, sample_type=None, filter=0, initial=None, refresh=False):
+        '''Find the integration time for a spectrometer and sample
+
+        Args:
+            spectrometer (:obj:`OceanOptics`): Open spectrometer
+            sample_type (str, optional): Name of the sample, used as part of the cache key
+            filter (int, optional): First pixel to consider (as in absorbance_read). Defaults to 0.
+            initial (float, optional): Integration time of the first probe in microseconds.
+                Defaults to 10 ms.
+            refresh (bool, optional): If true, ignore the cached value. Defaults to false.
+
+        Returns:
+            int: Integration time in microseconds
+        '''
+        key = (spectrometer.spectrometer_model, sample_type)
+        if not refresh and key in self.cache:
+            return self.cache[key]
+        if spectrometer.acquiring:
+            raise ValueError("Stop continuous acquisition before searching for the integration time")
+        saturation, (shortest, longest) = self._device_limits(spectrometer)
+        low, high = self.target[0]*saturation, self.target[1]*saturation
+        goal = (low + high)/2
+        dark = np.asarray(spectrometer.dark_intensities, dtype=np.float64)
+
+        integration_time = initial or self.cache.get(key) or 10000
+        integration_time = int(min(max(integration_time, shortest), longest))
+        too_low, too_high = None, None  #longest dim probe and shortest bright probe
+        self.probes = []
+        for i in range(self.max_probes):
+            values = spectrometer.read_frame(integration_time)['intensities'][filter:]
+            pixel = int(np.argmax(values))
+            peak = values[pixel]
+            self.probes.append((integration_time, float(peak)))
+            if low <= peak <= high:
+                break
+            if peak < low:
+                too_low = max(too_low or integration_time, integration_time)
+            else:
+                too_high = min(too_high or integration_time, integration_time)
+            if peak >= 0.99*saturation:
+                #Saturated counts say nothing about the slope
+                next_time = integration_time/4
+            else:
+                base = dark[filter:][pixel] if len(dark) == len(values) + filter else 0.0
+                signal = peak - base
+                next_time = integration_time*10 if signal <= 0 else integration_time*(goal - base)/signal
+            if too_low and too_high and not too_low < next_time < too_high:
+                #Extrapolation left the bracket; split it geometrically instead
+                next_time = np.sqrt(too_low*too_high)
+            next_time = int(min(max(next_time, shortest), longest))
+            if next_time == integration_time:
+                logging.warning("Integration time limit of {} us reached with peak counts of {}"
+                                .format(integration_time, peak))
+                break
+            integration_time = next_time
+        else:
+            logging.warning("Peak counts not in the target band after {} probes".format(self.max_probes))
+        self.cache[key] = integration_time
+        return integration_time
@@ -0,0 +1,151 @@
+''' Chemios Spectral Feature Module
+
+Reduces each spectrum to the few numbers a control loop needs: peak
+wavelength, peak height, full width at half maximum (FWHM) and band areas.
+'''
+import numpy as np
+from ._processing import band_windows, band_weights
+
+
+class FeatureExtractor(object):
+    '''Class to extract spectral features frame by frame
+
+    Index windows and band weights are computed once from the wavelength
+    axis. With tracking, the peak search starts from a few pixels around the
+    previous peak and only widens when the peak leaves that range.
+
+    Attributes:
+        wavelengths (array): Wavelength axis of the frames in nm
+        peak_window (tuple, optional): (low, high) wavelengths in nm to search for the
+            peak. Defaults to the whole spectrum.
+        bands (list, optional): (low, high) wavelength pairs in nm to integrate
+        track (int, optional): Pixels either side of the previous peak to search first.
+            Defaults to 0 (search the whole peak window every frame).
+
+    Note:
+        Extract features from every frame of a continuous acquisition::
+
+            extractor = FeatureExtractor(spec.get_wavelengths(), peak_window=(450, 700),
+                                         bands=[(500, 550)], track=20)
+            spec.start_acquisition(1000)
+            for features in extractor.stream(spec.stream()):
+                controller.update(features['peak_wavelength'])
+    '''
+    def __init__(self, wavelengths, peak_window=None, bands=None, track=0):
+        self.wavelengths = np.asarray(wavelengths, dtype=np.float64)
+        self.bands = [tuple(band) for band in bands] if bands else []
+        self.track = track
+
+        #Precomputed index windows
+        if peak_window is None:
+            self._window = (0, len(self.wavelengths))
+        else:
+            self._window = band_windows(self.wavelengths, [peak_window])[0]
+        self._weights = None
+        if self.bands:
+            windows = band_windows(self.wavelengths, self.bands)
+            self._bands_range = (min(w[0] for w in windows), max(w[1] for w in windows))
+            start, stop = self._bands_range
+            self._weights = np.ascontiguousarray(band_weights(self.wavelengths, self.bands)[start:stop])
+        self._last_peak = None
+
+    def reset(self):
+        '''Forget the tracked peak'''
+        self._last_peak = None
+
+    def _argmax(self, values, start, stop):
+        segment = values[start:stop]
+        if not np.all(np.isfinite(segment)):
+            segment = np.where(np.isfinite(segment), segment, -np.inf)
+        return start + int(np.argmax(segment))
+
+    def _find_peak(self, values):
+        low, high = self._window
+        if self.track and self._last_peak is not None:
+            start = max(low, self._last_peak - self.track)
+            stop = min(high, self._last_peak + self.track + 1)
+            peak = self._argmax(values, start, stop)
+            #A maximum on the edge of the search range means the peak moved away
+            if (peak > start or start == low) and (peak < stop - 1 or stop == high):
+                return peak
+        return self._argmax(values, low, high)
+
+    def _crossing(self, values, peak, half, step):
+        '''Wavelength where values fall below half, walking from the peak by step'''
+        low, high = self._window
+        if step < 0:
+            side = values[low:peak + 1][::-1]
+        else:
+            side = values[peak:high]
+        below = np.flatnonzero(side < half)
+        if len(below) == 0:
+            return np.nan
+        outside = peak + step*below[0]
+        inside = outside - step
+        y0, y1 = values[inside], values[outside]
+        x0, x1 = self.wavelengths[inside], self.wavelengths[outside]
+        return x0 + (half - y0)*(x1 - x0)/(y1 - y0)
+
+    def extract(self, values, timestamp=None):
+        '''Extract the features of one frame
+
+        Args:
+            values (array): Intensities, absorbance or fluorescence of one frame, or a
+                [wavelengths, values] pair
+            timestamp (float, optional): Timestamp to copy into the record
+
+        Returns:
+            dict: 'peak_wavelength', 'peak_height', 'fwhm' (nm, NaN if the peak is not
+            resolved inside the peak window) and 'bands' (array of band areas) if bands
+            were given, plus 'timestamp' if passed
+        '''
+        values = np.asarray(values)
+        if values.ndim == 2:
+            values = values[-1]
+        if len(values) != len(self.wavelengths):
+            raise ValueError("Frame has {} pixels, expected {}".format(len(values), len(self.wavelengths)))
+        peak = self._find_peak(values)
+        self._last_peak = peak
+        low, high = self._window
+
+        #Sub-pixel peak position and height from a parabola through three pixels
+        position = self.wavelengths[peak]
+        height = values[peak]
+        if low < peak < high - 1:
+            y0, y1, y2 = values[peak - 1], values[peak], values[peak + 1]
+            denominator = y0 - 2*y1 + y2
+            if denominator != 0 and np.isfinite(denominator):
+                offset = 0.5*(y0 - y2)/denominator
+                position = position + offset*(self.wavelengths[peak + 1] - self.wavelengths[peak - 1])/2
+                height = y1 - 0.25*(y0 - y2)*offset
+
+        half = height/2
+        fwhm = self._crossing(values, peak, half, 1) - self._crossing(values, peak, half, -1)
+        features = {
+                    'peak_wavelength': float(position),
+                    'peak_height': float(height),
+                    'fwhm': float(fwhm)
+                   }
+        if self._weights is not None:
+            start, stop = self._bands_range
+            features['bands'] = values[start:stop] @ self._weights
+        if timestamp is not None:
+            features['timestamp'] = timestamp
+        return features
+
+    def stream(self, frames, key='intensities'):
+        '''Extract features from each frame of an iterable
+
+        Args:
+            frames (iterable): Frames as arrays, or dicts such as those from
+                :meth:`chemios.spectrometers.OceanOptics.stream`
+            key (str, optional): Key of the values in dict frames. Defaults to 'intensities'.
+
+        Yields:
+            dict: Features of each frame
+        '''
+        for frame in frames:
+            if isinstance(frame, dict):
+                yield self.extract(frame[key], frame.get('timestamp'))
+            else:
+                yield self.extract(frame)
@@ -0,0 +1,143 @@
+''' Chemios Spectrometer Group Module
+
+Reads several Ocean Optics spectrometers at once (e.g., an inline UV-Vis and
+a fluorescence head) and lines up their frames in time.
+'''
+from concurrent.futures import ThreadPoolExecutor
+from ._oceanoptics import OceanOptics
+
+
+class SpectrometerGroup(object):
+    '''Class to acquire from several spectrometers concurrently
+
+    Attributes:
+        spectrometer_models (list): Serial numbers of the spectrometers (e.g., FLMS02673)
+        seabreeze (:obj:): Seabreeze.spectrometers object
+        tolerance (float, optional): Largest spread in seconds between the timestamps of
+            frames in one joint frame. Defaults to the longest integration time.
+
+    Note:
+        Frames are timestamped with time.monotonic when they finish::
+
+            with SpectrometerGroup(['FLMS02673', 'QEP01234'], sb) as group:
+                frames = group.read({'FLMS02673': 1000, 'QEP01234': 100000})
+                group.start_acquisition(1000)
+                for joint in group.aligned_frames():
+                    uv_vis = joint['frames']['FLMS02673']['intensities']
+    '''
+    def __init__(self, spectrometer_models, seabreeze, tolerance=None):
+        self.spectrometer_models = list(spectrometer_models)
+        self.tolerance = tolerance
+        self.spectrometers = {model: OceanOptics(model, seabreeze) for model in self.spectrometer_models}
+        self.frames_unmatched = 0
+
+        #Internal variables
+        self._executor = None
+        self._integration_times = {}
+
+    def __enter__(self):
+        self._executor = ThreadPoolExecutor(max_workers=len(self.spectrometers))
+        try:
+            self._map(lambda spectrometer: spectrometer.__enter__())
+        except Exception:
+            self.__exit__()
+            raise
+        return self
+
+    def __exit__(self, *args):
+        for spectrometer in self.spectrometers.values():
+            spectrometer.__exit__()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __getitem__(self, model):
+        return self.spectrometers[model]
+
+    def _map(self, function):
+        '''Run function on each spectrometer concurrently, in model order'''
+        if self._executor is None:
+            raise NameError("Spectrometer group not opened")
+        futures = [self._executor.submit(function, self.spectrometers[model])
+                   for model in self.spectrometer_models]
+        return [future.result() for future in futures]
+
+    def _times(self, integration_times):
+        if isinstance(integration_times, dict):
+            missing = set(self.spectrometer_models) - set(integration_times)
+            if missing:
+                raise ValueError("No integration time for {}".format(sorted(missing)))
+            times = dict(integration_times)
+        else:
+            times = {model: integration_times for model in self.spectrometer_models}
+        self._integration_times = times
+        return times
+
+    def read(self, integration_times):
+        '''Trigger every spectrometer at once and wait for all frames
+
+        Args:
+            integration_times (float or dict): Integration time in microseconds, for all
+                spectrometers or per serial number
+
+        Returns:
+            dict: Serial number to frame ('timestamp' and 'intensities')
+        '''
+        times = self._times(integration_times)
+        frames = self._map(lambda spectrometer: spectrometer.read_frame(times[spectrometer.spectrometer_model]))
+        return dict(zip(self.spectrometer_models, frames))
+
+    def start_acquisition(self, integration_times, buffer_size=64):
+        '''Start continuous acquisition on every spectrometer
+
+        Args:
+            integration_times (float or dict): Integration time in microseconds, for all
+                spectrometers or per serial number
+            buffer_size (int, optional): Frames held per spectrometer. Defaults to 64.
+        '''
+        times = self._times(integration_times)
+        for model, spectrometer in self.spectrometers.items():
+            spectrometer.start_acquisition(times[model], buffer_size=buffer_size)
+
+    def stop_acquisition(self):
+        '''Stop continuous acquisition on every spectrometer'''
+        self._map(lambda spectrometer: spectrometer.stop_acquisition())
+
+    def aligned_frames(self, tolerance=None, timeout=None):
+        '''Iterate over joint frames from the continuous acquisition
+
+        The oldest frame of each spectrometer is compared. When their timestamps
+        are within tolerance they form a joint frame; otherwise the oldest one has no
+        partner, is dropped (counted in frames_unmatched) and replaced by the next.
+
+        Args:
+            tolerance (float, optional): Largest timestamp spread in seconds. Defaults to
+                the group tolerance.
+            timeout (float, optional): Seconds to wait for each frame
+
+        Yields:
+            dict: 'timestamp' (mean of the frames) and 'frames' (serial number to frame)
+        '''
+        if tolerance is None:
+            tolerance = self.tolerance
+        if tolerance is None:
+            tolerance = max(self._integration_times.values())*1e-6
+        heads = {}
+        while True:
+            for model in self.spectrometer_models:
+                if model not in heads:
+                    frame = self.spectrometers[model].get_frame(timeout)
+                    if frame is None:
+                        return
+                    heads[model] = frame
+            timestamps = {model: frame['timestamp'] for model, frame in heads.items()}
+            oldest = min(timestamps, key=timestamps.get)
+            if max(timestamps.values()) - timestamps[oldest] <= tolerance:
+                yield {
+                       'timestamp': sum(timestamps.values())/len(timestamps),
+                       'frames': heads
+                      }
+                heads = {}
+            else:
+                del heads[oldest]
+                self.frames_unmatched += 1
@@ -1,28 +1,72 @@
 ''' Chemios Ocean Optics Module
 '''
 #import seabreeze.spectrometers as sb
+import collections
+import threading
+import time
 import numpy as np
-from chemios.utils import convert_to_lists
-import pandas as pd
+from ._averaging import ScanAverager
+from ._processing import log_reference, absorbance_into, band_windows, band_weights, fluorescence_into
+from ._reduction import PixelReducer
+from ._spectrum_file import load_spectrum
+
+def _reference_file(reference, integration_time):
+    """Load a reference given as a spectrum file path, taking its integration time from the header"""
+    if isinstance(reference, str):
+        reference, header = load_spectrum(reference)
+        if integration_time is None:
+            integration_time = header['integration_time']
+    return reference, integration_time
+
+def _spectrum(wavelengths, values):
+    """Stack wavelengths and values into one contiguous (2 x pixels) float array"""
+    values = np.asarray(values, dtype=np.float64)
+    spectrum = np.empty((2, len(values)), dtype=np.float64)
+    spectrum[0] = wavelengths
+    spectrum[1] = values
+    return spectrum
 
-#Note to self: Make the buffer a list of dictionaries each with the stage position and spectraself.
-#Use pop(0) to pop off the first spectra in the buffer when get_spectrum is called
 class OceanOptics(object):
     """Class to define the spectrometers
 
     Attributes:
         spectrometer_model (str): Model of the spectrometer (e.g., FLMS02673)
         seabreeze (:obj:): Seabreeze.spectrometers object
+        calibration (:obj:`CalibrationStore`, optional): Store that keeps darks and blanks
+            stored with an integration time between sessions
 
     """
-    def __init__(self, spectrometer_model, seabreeze):
+    def __init__(self, spectrometer_model, seabreeze, calibration=None):
         self.spectrometer_model = spectrometer_model # Spectrometer model number
         self.seabreeze = seabreeze
+        self.calibration = calibration
         self.spectrometer_on = False # Initialize the spectrometer to off
         # Initialize wavelengths_splice, normalized_absorbance, and fluorescence to empty
         self.blank_intensities = []
         self.dark_intensities = []
-        self.buffer = []
+        self.blank_integration_time = None
+        self.dark_integration_time = None
+        self.leak_intensities = []
+        self.averager = None
+        self.reducer = None
+
+        #Continuous acquisition
+        self.buffer = collections.deque()
+        self.frames_acquired = 0
+        self.frames_dropped = 0
+        self._frame_ready = threading.Condition()
+        self._stop_acquisition = threading.Event()
+        self._acquisition_thread = None
+        self._acquisition_error = None
+        #Newest frame, which reads take without removing it from the buffer
+        self._newest_frame = None
+
+        #Caches
+        self._wavelengths = None
+        self._wavelengths_serial = None
+        self._integration_time = None
+        self._references = {}
+        self._reduction = None
 
         #Check that the spectrometer is connected 
         try:
@@ -36,22 +80,296 @@ class OceanOptics(object):
         try:
             self.ocean_optics = self.seabreeze.Spectrometer.from_serial_number(self.spectrometer_model)
             self.spectrometer_on = True
+            #A new device handle starts with an unknown integration time
+            self._integration_time = None
             return self
         except Exception:
             raise IOError("Spectrometer not connected")
     
     def __exit__(self, *args):
         #Close the spectrometer object on exit
+        self.stop_acquisition()
         try:
             self.ocean_optics.close()
         except Exception:
             pass
         
-    def read_spectrometer_raw(self, integration_time):
+    def get_wavelengths(self, raw=False):
+        """Get the wavelength axis of the spectrometer
+
+        The axis is read from the device once and cached until the
+        spectrometer_model changes or :meth:`invalidate_cache` is called.
+
+        Args:
+            raw (bool, optional): If true, return the axis of the whole detector even when
+                a reduction is set. Defaults to false.
+
+        Returns:
+            Numpy float array of wavelengths in nm, cropped and binned like the reads
+        """
+        if self._wavelengths is None or self._wavelengths_serial != self.spectrometer_model:
+            wavelengths = np.asarray(self.ocean_optics.wavelengths(), dtype=np.float64)
+            wavelengths.flags.writeable = False
+            self._wavelengths = wavelengths
+            self._wavelengths_serial = self.spectrometer_model
+            self._references = {}
+            self.reducer = None
+        if self._reduction is not None and self.reducer is None:
+            rois, binning = self._reduction
+            self.reducer = PixelReducer(self._wavelengths, rois, binning)
+        if raw or self.reducer is None:
+            return self._wavelengths
+        return self.reducer.wavelengths
+
+    def invalidate_cache(self):
+        """Forget the cached wavelength axis, integration time and reference spectra"""
+        self._wavelengths = None
+        self._wavelengths_serial = None
+        self._integration_time = None
+        self._references = {}
+        self.reducer = None
+
+    def set_reduction(self, rois=None, binning=1):
+        """Crop and bin every read from now on
+
+        The reduction is applied as soon as intensities come off the device, so
+        averaging, absorbance, fluorescence and the acquisition buffer all work on
+        the reduced pixels. Dark, blank and leak spectra may be stored either raw or
+        already reduced. Call with no arguments to read the whole detector again.
+
+        Args:
+            rois (list, optional): Increasing, non-overlapping (low, high) wavelength pairs
+                in nm to keep. Defaults to the whole spectrum.
+            binning (int, optional): Adjacent pixels averaged into one. Defaults to 1.
+
+        """
+        if self.acquiring:
+            raise ValueError("Stop continuous acquisition before changing the reduction")
+        if not rois and binning == 1:
+            self._reduction = None
+        else:
+            self._reduction = (rois, binning)
+        self.reducer = None
+        self._references = {}
+        if self.spectrometer_on:
+            #Build the reducer now so bad ROIs fail here rather than on the next read
+            try:
+                self.get_wavelengths()
+            except ValueError:
+                self._reduction = None
+                raise
+
+    def _reduce(self, intensities):
+        """Intensities from the device as a float array, cropped and binned if a reduction is set"""
+        if self._reduction is not None:
+            self.get_wavelengths()
+            return self.reducer.reduce(intensities)
+        return np.asarray(intensities, dtype=np.float64)
+
+    def _stored(self, values):
+        """Stored reference spectrum reduced like the reads, if it was stored raw"""
+        if self._reduction is not None and len(values) == len(self.get_wavelengths(raw=True)):
+            return self.reducer.reduce(values)
+        return values
+
+    def _set_integration_time(self, integration_time):
+        """Send the integration time to the device only when it changes"""
+        if integration_time != self._integration_time:
+            if self.acquiring:
+                raise ValueError("Acquisition is running at {} us; stop it to change the integration time"
+                                 .format(self._integration_time))
+            self.ocean_optics.integration_time_micros(integration_time)
+            self._integration_time = integration_time
+
+    @property
+    def acquiring(self):
+        """True while continuous acquisition is running"""
+        return self._acquisition_thread is not None and self._acquisition_thread.is_alive()
+
+    def start_acquisition(self, integration_time, buffer_size=64):
+        """Start acquiring frames continuously on a worker thread
+
+        Frames go into a ring buffer (self.buffer). When the buffer is full the oldest
+        frame is dropped, so the detector never waits for the consumer. While acquisition
+        runs, read_frame, read_spectrometer_raw, absorbance_read and fluorescence_read wait
+        for frames that started after they were called. They leave those frames in the
+        buffer, so stream() and get_frame() still see every frame.
+
+        Args:
+            integration_time (float): Integration time in microseconds
+            buffer_size (int, optional): Frames held in the ring buffer. Defaults to 64.
+
+        """
+        if not self.spectrometer_on:
+            raise NameError("Spectrometer not connected")
+        if self.acquiring:
+            raise ValueError("Acquisition is already running")
+        self._set_integration_time(integration_time)
+        self.get_wavelengths()
+        with self._frame_ready:
+            self.buffer = collections.deque(maxlen=buffer_size)
+            self.frames_acquired = 0
+            self.frames_dropped = 0
+            self._acquisition_error = None
+            self._newest_frame = None
+        self._stop_acquisition.clear()
+        self._acquisition_thread = threading.Thread(target=self._acquire, daemon=True,
+                                                    name='{}Acquisition'.format(self.spectrometer_model))
+        self._acquisition_thread.start()
+
+    def stop_acquisition(self):
+        """Stop continuous acquisition. Frames left in the buffer can still be read."""
+        self._stop_acquisition.set()
+        if self._acquisition_thread is not None:
+            self._acquisition_thread.join()
+            self._acquisition_thread = None
+
+    def _acquire(self):
+        while not self._stop_acquisition.is_set():
+            try:
+                intensities = self.ocean_optics.intensities(correct_dark_counts=True, correct_nonlinearity=True)
+                intensities = self._reduce(intensities)
+            except Exception as e:
+                self._acquisition_error = e
+                break
+            timestamp = time.monotonic()
+            with self._frame_ready:
+                if len(self.buffer) == self.buffer.maxlen:
+                    self.frames_dropped += 1
+                self._newest_frame = {
+                                      'index': self.frames_acquired,
+                                      'timestamp': timestamp,
+                                      'intensities': intensities
+                                     }
+                self.buffer.append(self._newest_frame)
+                self.frames_acquired += 1
+                self._frame_ready.notify_all()
+        with self._frame_ready:
+            self._stop_acquisition.set()
+            self._frame_ready.notify_all()
+
+    def get_frame(self, timeout=None):
+        """Take the oldest frame from the acquisition buffer
+
+        Args:
+            timeout (float, optional): Seconds to wait for a frame. Defaults to waiting forever.
+
+        Returns:
+            dict: 'index', 'timestamp' (time.monotonic seconds) and 'intensities',
+            or None once acquisition has stopped and the buffer is empty
+
+        """
+        with self._frame_ready:
+            ready = self._frame_ready.wait_for(
+                lambda: self.buffer or self._stop_acquisition.is_set(), timeout)
+            if not ready:
+                raise TimeoutError("No frame after {} seconds".format(timeout))
+            if self.buffer:
+                return self.buffer.popleft()
+        if self._acquisition_error is not None:
+            raise IOError("Acquisition stopped: {}".format(self._acquisition_error))
+        return None
+
+    def latest_frame(self, timeout=None):
+        """Take the newest frame from the acquisition buffer, discarding older ones
+
+        Control loops use this so they always act on the freshest spectrum.
+
+        Args:
+            timeout (float, optional): Seconds to wait for a frame. Defaults to waiting forever.
+
+        Returns:
+            dict: 'index', 'timestamp' (time.monotonic seconds) and 'intensities',
+            or None once acquisition has stopped and the buffer is empty
+
+        """
+        with self._frame_ready:
+            ready = self._frame_ready.wait_for(
+                lambda: self.buffer or self._stop_acquisition.is_set(), timeout)
+            if not ready:
+                raise TimeoutError("No frame after {} seconds".format(timeout))
+            if self.buffer:
+                frame = self.buffer.pop()
+                self.buffer.clear()
+                return frame
+        if self._acquisition_error is not None:
+            raise IOError("Acquisition stopped: {}".format(self._acquisition_error))
+        return None
+
+    def stream(self, timeout=None):
+        """Iterate over frames as they are acquired
+
+        Args:
+            timeout (float, optional): Seconds to wait for each frame
+
+        Yields:
+            dict: 'index', 'timestamp' and 'intensities' of each frame until acquisition stops
+
+        """
+        while True:
+            frame = self.get_frame(timeout)
+            if frame is None:
+                return
+            yield frame
+
+    def _fresh_frame(self, first_index):
+        """Newest acquired frame once its index reaches first_index, or None if acquisition stops
+
+        The frame stays in the buffer for stream consumers.
+        """
+        with self._frame_ready:
+            self._frame_ready.wait_for(lambda: (self._newest_frame is not None
+                                                and self._newest_frame['index'] >= first_index)
+                                       or self._stop_acquisition.is_set())
+            frame = self._newest_frame
+            if frame is not None and frame['index'] >= first_index:
+                return frame
+        return None
+
+    def _scans(self, count):
+        """Yield intensities of count scans that all start after the call"""
+        #The frame being integrated when the call came in may have started before it
+        next_index = self.frames_acquired + 1
+        for i in range(count):
+            frame = self._fresh_frame(next_index) if self.acquiring else None
+            if frame is None:
+                yield self._reduce(self.ocean_optics.intensities(correct_dark_counts=True,
+                                                                 correct_nonlinearity=True))
+            else:
+                next_index = frame['index'] + 1
+                yield frame['intensities']
+
+    def read_frame(self, integration_time):
+        """Read one frame of intensities with a timestamp
+
+        Args:
+            integration_time (float): Integration time in microseconds
+
+        Returns:
+            dict: 'timestamp' (time.monotonic seconds when the frame finished) and 'intensities'
+
+        """
+        self._set_integration_time(integration_time)
+        if self.acquiring:
+            frame = self._fresh_frame(self.frames_acquired + 1)
+            if frame is not None:
+                return {
+                        'timestamp': frame['timestamp'],
+                        'intensities': frame['intensities']
+                       }
+        intensities = self.ocean_optics.intensities(correct_dark_counts=True, correct_nonlinearity=True)
+        return {
+                'timestamp': time.monotonic(),
+                'intensities': self._reduce(intensities)
+               }
+
+    def read_spectrometer_raw(self, integration_time, as_array=False):
         """Function to print the raw data from the spectreomter
 
         Args:
             integration_time (float): Integration time in microseconds
+            as_array (bool, optional): If true, return a contiguous (2 x pixels) numpy float array
+                instead of lists. Defaults to false.
 
         Yields:
             Numpy matrix with first column as wavelengths and second column a intensisties
@@ -61,52 +379,206 @@ class OceanOptics(object):
         #     raise NameError("Spectrometer not connected")
 
         # Setting the integration time into the spectrometer and integrating
-        self.ocean_optics.integration_time_micros(integration_time)
+        self._set_integration_time(integration_time)
         # Assigning wavelength values into wavelengths
-        wavelengths = self.ocean_optics.wavelengths()
+        wavelengths = self.get_wavelengths()
         # Assigns intensity into intensities array
-        intensities = self.ocean_optics.intensities(correct_dark_counts=True, correct_nonlinearity=True)
+        intensities = next(self._scans(1))
         #Return spectrum array with wavelengths and intensities
-        spectrum = [wavelengths, intensities]
-        output = [[],[]]
-        #Convert int64 to int
-        for i, column in enumerate(spectrum):
-            for value in column:
-                try:
-                    output[i].append(float(value))             
-                except AttributeError:
-                    pass
-                except TypeError:
-                    pass
-        return output
-
-    def store_blank(self, blank):
+        spectrum = _spectrum(wavelengths, intensities)
+        if as_array:
+            return spectrum
+        return spectrum.tolist()
+
+    def store_blank(self, blank, integration_time=None):
         """ Method to save blank intensisties
 
         Args:
-            blank (array): Two column array of wavelengths and intesities
+            blank (array or str): Two column array of wavelengths and intesities, raw or reduced
+                (see set_reduction), or the path of a spectrum file from save_spectrum
+            integration_time (float, optional): Integration time of the blank in microseconds.
+                If given, absorbance_read checks that it reads at the same integration time,
+                and the blank is saved to the calibration store. Defaults to the integration
+                time in the spectrum file header.
 
         """
-        if isinstance(blank, list):
+        blank, integration_time = _reference_file(blank, integration_time)
+        if isinstance(blank, (list, np.ndarray)):
             #assuming it a two column array of wavelengths and intensities
-            self.blank_intensities = blank[1]
+            self.blank_intensities = np.array(blank[1], dtype=np.float64)
+            self.blank_integration_time = integration_time
+            self._references = {}
+            self._save_calibration('blank', self.blank_intensities, integration_time)
         else:
             raise ValueError('Please pass an array of wavelengths and intensities')
 
-    def store_dark(self, dark):
+    def store_dark(self, dark, integration_time=None):
         """ Method to save dark intensisties
 
         Args:
-            dark (array): Two column array of wavelengths and intesities
+            dark (array or str): Two column array of wavelengths and intesities, raw or reduced
+                (see set_reduction), or the path of a spectrum file from save_spectrum
+            integration_time (float, optional): Integration time of the dark in microseconds.
+                If given, absorbance_read checks that it reads at the same integration time,
+                and the dark is saved to the calibration store. Defaults to the integration
+                time in the spectrum file header.
 
         """
-        if isinstance(dark, list):
+        dark, integration_time = _reference_file(dark, integration_time)
+        if isinstance(dark, (list, np.ndarray)):
             #assuming it a two column array of wavelengths and intensities
-            self.dark_intensities = dark[1]
+            self.dark_intensities = np.array(dark[1], dtype=np.float64)
+            self.dark_integration_time = integration_time
+            self._references = {}
+            self._save_calibration('dark', self.dark_intensities, integration_time)
         else:
             raise ValueError('Please pass a list of wavelengths and intensities')
 
-    def absorbance_read(self, integration_time, scans_to_average, filter=0, normalized=False):
+    def _calibration_reduction(self, values):
+        """Reduction that stored values were taken with: None for raw spectra"""
+        if self._reduction is None or len(values) == len(self.get_wavelengths(raw=True)):
+            return None
+        return self._reduction
+
+    def _save_calibration(self, kind, values, integration_time):
+        if self.calibration is None or integration_time is None:
+            return
+        self.calibration.save(self.spectrometer_model, kind, values, integration_time,
+                              self._calibration_reduction(values))
+
+    def load_references(self, integration_time):
+        """Load valid darks and blanks for an integration time from the calibration store
+
+        References taken with the current reduction are preferred over raw ones.
+
+        Args:
+            integration_time (float): Integration time in microseconds
+
+        Returns:
+            list: Kinds ('dark', 'blank') that are missing or stale and need to be measured again
+
+        """
+        if self.calibration is None:
+            raise ValueError("No calibration store; pass calibration= when creating OceanOptics")
+        missing = []
+        for kind in ('dark', 'blank'):
+            values = None
+            for reduction in (self._reduction, None):
+                values = self.calibration.load(self.spectrometer_model, kind, integration_time, reduction)
+                if values is not None:
+                    break
+            if values is None:
+                missing.append(kind)
+                continue
+            setattr(self, kind + '_intensities', values)
+            setattr(self, kind + '_integration_time', integration_time)
+            self._references = {}
+        return missing
+
+    def store_excitation_leak(self, leak):
+        """ Method to save the spectrum of excitation light leaking into the detector
+
+        Used by fluorescence_read to correct for excitation leak.  Measure it with a
+        scattering, non-fluorescent sample at the integration time of the fluorescence reads.
+
+        Args:
+            leak (array or str): Two column array of wavelengths and intesities, or the path
+                of a spectrum file from save_spectrum
+
+        """
+        leak, integration_time = _reference_file(leak, None)
+        if isinstance(leak, (list, np.ndarray)):
+            self.leak_intensities = np.array(leak[1], dtype=np.float64)
+            self._references = {}
+        else:
+            raise ValueError('Please pass an array of wavelengths and intensities')
+
+    def _reference(self, filter, integration_time):
+        """Reference spectra for a filter and integration time, computed once
+
+        Returns:
+            dict: 'wavelengths' and 'dark' arrays, plus 'blank', 'blank_minus_dark' and
+                'log_blank_minus_dark' if a blank is stored, all starting at filter
+        """
+        key = (filter, integration_time)
+        reference = self._references.get(key)
+        if reference is not None:
+            return reference
+        for name, stored in (('blank', self.blank_integration_time), ('dark', self.dark_integration_time)):
+            if stored is not None and stored != integration_time:
+                raise ValueError("The {} was stored at {} us; please store one at {} us"
+                                 .format(name, stored, integration_time))
+        dark = self._stored(self.dark_intensities)
+        wavelengths = self.get_wavelengths()
+        if len(dark) != len(wavelengths):
+            raise ValueError("The dark has {} pixels but reads have {}; please store it again"
+                             .format(len(dark), len(wavelengths)))
+        dark = dark[filter:]
+        reference = {
+                     'wavelengths': wavelengths[filter:],
+                     'dark': dark
+                    }
+        if len(self.blank_intensities):
+            blank = self._stored(self.blank_intensities)
+            if len(blank) != len(wavelengths):
+                raise ValueError("Dark and blank have different numbers of pixels")
+            blank = blank[filter:]
+            reference['blank'] = blank
+            reference['blank_minus_dark'] = blank - dark
+            reference['log_blank_minus_dark'] = log_reference(dark, blank)
+        for array in reference.values():
+            array.flags.writeable = False
+        self._references[key] = reference
+        return reference
+
+    def _fluorescence_reference(self, filter, integration_time, bands, excitation_band):
+        """Band weights and leak correction for fluorescence, computed once"""
+        key = (filter, integration_time, bands, excitation_band)
+        reference = self._references.get(key)
+        if reference is not None:
+            return reference
+        reference = dict(self._reference(filter, integration_time))
+        wavelengths = reference['wavelengths']
+        reference['background'] = reference.get('blank', reference['dark'])
+        reference['weights'] = band_weights(wavelengths, bands) if bands else None
+        reference['leak'] = None
+        reference['window'] = None
+        if excitation_band is not None:
+            if len(self.leak_intensities) == 0:
+                raise ValueError("Please save the excitation leak with store_excitation_leak")
+            reference['leak'] = self._stored(self.leak_intensities)[filter:] - reference['dark']
+            reference['window'] = band_windows(wavelengths, [excitation_band])[0]
+        self._references[key] = reference
+        return reference
+
+    def _average_scans(self, scans_to_average, filter, averaging, alpha, target_snr):
+        """Average scans into self.averager, stopping early at target_snr
+
+        Returns:
+            Read-only array of the averaged intensities
+        """
+        #self.averager keeps the average, per-pixel noise and scan count of this read
+        averager = None
+        dark = self._stored(self.dark_intensities) if target_snr is not None else None
+        for scan in self._scans(scans_to_average):
+            if averager is None:
+                averager = self._get_averager(len(scan), averaging, alpha)
+            averager.add(scan)
+            if target_snr is not None and averager.count > 1:
+                if np.median(averager.snr(dark)[filter:]) >= target_snr:
+                    break
+        return averager.mean
+
+    def _get_averager(self, pixels, mode, alpha):
+        """Reuse the averager's buffers when the scan shape and mode are unchanged"""
+        averager = self.averager
+        if averager is None or (averager.pixels, averager.mode, averager.alpha) != (pixels, mode, alpha):
+            averager = self.averager = ScanAverager(pixels, mode=mode, alpha=alpha)
+        averager.reset()
+        return averager
+
+    def absorbance_read(self, integration_time, scans_to_average, filter=0, normalized=False,
+                        as_array=False, averaging='mean', alpha=0.1, target_snr=None):
         """
         Function to read the UV data from the spectrometer
         Stores the normalized absorbance and flourescence data into Spectrometer Object
@@ -116,14 +588,28 @@ class OceanOptics(object):
             scans_to_average (int): Number of scans to average over
             filter (int, optional): The starting point for the Spectrum (e.g, start from the 300th data point). Defaults to use the whole spectram
             normalize (bool): If true, absorbances will be normalized to the maximum absorbance.  Defaults to false.
+            as_array (bool, optional): If true, return a contiguous (2 x pixels) numpy float array
+                instead of lists. Defaults to false.
+            averaging (str, optional): 'mean' for a running mean or 'ema' for an exponential
+                moving average of the scans. Defaults to 'mean'.
+            alpha (float, optional): Weight of each new scan when averaging is 'ema'. Defaults to 0.1.
+            target_snr (float, optional): Stop before scans_to_average once the median signal to
+                noise ratio of the dark-subtracted intensities reaches this value.
 
         Yields:
             Numpy array with first column as wavelengths and second column as absorbance
+
+        Note:
+            The lists leave out pixels where the absorbance is not finite (e.g., the
+            blank equals the dark).  The array keeps every pixel, with NaN or inf there,
+            so frames always have the same width.
             
         """
         #check types
         if not isinstance(scans_to_average, int):
             raise ValueError('Please pass an integer number of scans to average')
+        if scans_to_average < 1:
+            raise ValueError('Please pass at least one scan to average')
         if not isinstance(filter, int):
             raise ValueError('Please pass an integer number for filter')
 
@@ -136,46 +622,77 @@ class OceanOptics(object):
             raise NameError("Spectrometer not connected")
 
         #Set integration time
-        self.ocean_optics.integration_time_micros(integration_time)
-
-        #Get wavelengths and drop useless data
-        wavelengths = self.ocean_optics.wavelengths()
-        wavelengths_splice = np.array(wavelengths[filter:])
-
-        #Subtract dark from blank
-        blank = np.array(self.blank_intensities[filter:])
-        dark = np.array(self.dark_intensities[filter:])
-        blank_minus_dark = np.subtract(blank, dark)
+        self._set_integration_time(integration_time)
+        reference = self._reference(filter, integration_time)
 
         #Find absorbance averaged over requested number of scans
-        average_buffer = [[] for i in range(scans_to_average)]
-        for i in range(scans_to_average):
-            average_buffer[i] = self.ocean_optics.intensities(correct_dark_counts=True, correct_nonlinearity=True)
-        average_intensities = np.mean(average_buffer, axis = 0) #average element wise the arrays
-        intensities_splice = np.array(average_intensities[filter:])
-        intensities_splice_minus_dark = np.subtract(intensities_splice, dark)
-        absorbance = -np.log10(blank_minus_dark/intensities_splice_minus_dark)
+        average_intensities = self._average_scans(scans_to_average, filter, averaging, alpha, target_snr)
+        absorbance = absorbance_into(average_intensities[filter:], reference['dark'],
+                                     reference['log_blank_minus_dark'], np.empty(len(reference['dark'])))
         if normalized:
-            maximum = np.amax(absorbance)
+            maximum = np.amax(absorbance[np.isfinite(absorbance)])
             absorbance = absorbance/maximum
 
+        #Return spectrum array with wavelengths and absorbances
+        spectrum = _spectrum(reference['wavelengths'], absorbance)
+        if as_array:
+            return spectrum
         #Remove Nans
-        absorbance = [x for x in absorbance if ~np.isnan(x)]
+        return spectrum[:, np.isfinite(absorbance)].tolist()
 
-        #Return spectrum array with wavelengths and absorbances
-        spectrum = [wavelengths_splice, intensities_splice]
-    
-        output = [[],[]]
-        #Convert int64 to int
-        for i, column in enumerate(spectrum):
-            for value in column:
-                try:
-                    output[i].append(float(value))             
-                except AttributeError:
-                    pass
-                except TypeError:
-                    pass
-        return output
-
-    def fluorescence_read(self,integration_time, scans_to_average, filter=0):
-        raise NotImplementedError()
+    def fluorescence_read(self, integration_time, scans_to_average, filter=0, bands=None,
+                          excitation_band=None, as_array=False, averaging='mean', alpha=0.1,
+                          target_snr=None):
+        """
+        Function to read fluorescence from the spectrometer
+
+        The blank (or the dark if no blank is stored) is subtracted from the averaged
+        intensities. With excitation_band, the stored excitation leak is scaled to the
+        light inside that band and subtracted as well.
+
+        Args:
+            integration_time (float): Integration time in microseconds
+            scans_to_average (int): Number of scans to average over
+            filter (int, optional): The starting point for the Spectrum (e.g, start from the 300th data point). Defaults to use the whole spectram
+            bands (tuple, optional): (low, high) wavelength pairs in nm to integrate,
+                e.g. ((500, 520), (600, 650))
+            excitation_band (tuple, optional): (low, high) wavelengths in nm where only excitation
+                light reaches the detector. Enables excitation-leak correction.
+            as_array (bool, optional): If true, return a contiguous (2 x pixels) numpy float array
+                instead of lists. Defaults to false.
+            averaging (str, optional): 'mean' or 'ema'. See absorbance_read.
+            alpha (float, optional): Weight of each new scan when averaging is 'ema'. Defaults to 0.1.
+            target_snr (float, optional): Stop early at this median signal to noise ratio
+
+        Yields:
+            Spectrum with first column as wavelengths and second column as fluorescence.
+            If bands are given, a tuple of the spectrum and a numpy array of the band areas.
+
+        """
+        #check types
+        if not isinstance(scans_to_average, int):
+            raise ValueError('Please pass an integer number of scans to average')
+        if scans_to_average < 1:
+            raise ValueError('Please pass at least one scan to average')
+        if not isinstance(filter, int):
+            raise ValueError('Please pass an integer number for filter')
+        if len(self.dark_intensities) == 0: raise ValueError("Please save dark values")
+        if not self.spectrometer_on:
+            raise NameError("Spectrometer not connected")
+
+        self._set_integration_time(integration_time)
+        bands = tuple(tuple(band) for band in bands) if bands else None
+        excitation_band = tuple(excitation_band) if excitation_band is not None else None
+        reference = self._fluorescence_reference(filter, integration_time, bands, excitation_band)
+
+        average_intensities = self._average_scans(scans_to_average, filter, averaging, alpha, target_snr)
+        fluorescence, areas = fluorescence_into(average_intensities[filter:], reference['background'],
+                                                np.empty(len(reference['dark'])), reference['leak'],
+                                                reference['window'], reference['weights'])
+
+        spectrum = _spectrum(reference['wavelengths'], fluorescence)
+        if not as_array:
+            spectrum = spectrum.tolist()
+        if bands:
+            return spectrum, areas
+        return spectrum
@@ -0,0 +1,240 @@
+''' Chemios Spectral Processing Module
+
+Vectorized absorbance over stacks of spectra (frames x pixels), e.g.
+frames from :class:`chemios.recording.SpectraArchive`.
+'''
+import numpy as np
+
+
+def reference_values(reference, dtype=np.float64):
+    '''Intensities of a reference given as values or a [wavelengths, values] pair'''
+    values = np.asarray(reference, dtype=dtype)
+    if values.ndim == 2 and values.shape[0] == 2:
+        values = values[1]
+    if values.ndim != 1:
+        raise ValueError("Please pass one reference spectrum")
+    return values
+
+
+def log_reference(dark, blank, dtype=np.float64):
+    '''log10(blank - dark), the part of the absorbance shared by every frame'''
+    dark = reference_values(dark, dtype)
+    blank = reference_values(blank, dtype)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.log10(blank - dark)
+
+
+def absorbance_into(intensities, dark, log_blank_minus_dark, out):
+    '''Absorbance of intensities written into out
+
+    Computes -log10((I - dark)/(blank - dark)) as
+    log10(blank - dark) - log10(I - dark), without temporaries beyond out.
+
+    Args:
+        intensities (array): (frames x pixels) or (pixels,) intensities
+        dark (array): Dark intensities, one per pixel
+        log_blank_minus_dark (array): Output of :func:`log_reference`
+        out (array): Destination with the shape of intensities
+
+    Returns:
+        out
+    '''
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.subtract(intensities, dark, out=out)
+        np.log10(out, out=out)
+        np.subtract(log_blank_minus_dark, out, out=out)
+    return out
+
+
+def iter_absorbance(intensities, dark, blank, chunk_frames=4096, dtype=np.float32):
+    '''Absorbance of a stack of spectra, one chunk of frames at a time
+
+    Only chunk_frames rows of the stack are in memory at once, so the stack
+    can be a memory-mapped file larger than RAM.
+
+    Args:
+        intensities (array): (frames x pixels) intensities
+        dark (array): Dark intensities, one per pixel
+        blank (array): Blank intensities, one per pixel
+        chunk_frames (int, optional): Frames per chunk. Defaults to 4096.
+        dtype (type, optional): Float type of the result. Defaults to np.float32.
+
+    Yields:
+        tuple: (index of the first frame, absorbance of the chunk)
+    '''
+    dark = reference_values(dark, dtype)
+    log_blank_minus_dark = log_reference(dark, blank, dtype)
+    frames = len(intensities)
+    for start in range(0, frames, chunk_frames):
+        chunk = intensities[start:start + chunk_frames]
+        out = np.empty(chunk.shape, dtype=dtype)
+        yield start, absorbance_into(chunk, dark, log_blank_minus_dark, out)
+
+
+def batch_absorbance(intensities, dark, blank, dtype=np.float64, chunk_frames=None, out=None):
+    '''Absorbance of a stack of spectra in one vectorized pass
+
+    Args:
+        intensities (array): (frames x pixels) intensities
+        dark (array): Dark intensities, one per pixel
+        blank (array): Blank intensities, one per pixel
+        dtype (type, optional): Float type of the result. Defaults to np.float64.
+        chunk_frames (int, optional): Process this many frames at a time to bound
+            temporary memory. Defaults to the whole stack at once.
+        out (array, optional): Destination, e.g. a np.memmap for stacks larger than RAM
+
+    Returns:
+        (frames x pixels) absorbance. Pixels where the blank equals the dark are NaN or inf.
+
+    Note:
+        Reprocess an archived run into a new memory-mapped file::
+
+            archive = SpectraArchive('runs/kinetics')
+            out = np.memmap('absorbance.f32', np.float32, 'w+', shape=archive.frames.shape)
+            batch_absorbance(archive.frames, dark, blank, np.float32, 4096, out)
+    '''
+    intensities = np.asarray(intensities)
+    if intensities.ndim != 2:
+        raise ValueError("Please pass a (frames x pixels) stack of intensities")
+    if out is None:
+        out = np.empty(intensities.shape, dtype=dtype)
+    elif out.shape != intensities.shape:
+        raise ValueError("out has shape {}, expected {}".format(out.shape, intensities.shape))
+    dark = reference_values(dark, out.dtype)
+    log_blank_minus_dark = log_reference(dark, blank, out.dtype)
+    chunk_frames = chunk_frames or max(len(intensities), 1)
+    for start in range(0, len(intensities), chunk_frames):
+        stop = start + chunk_frames
+        absorbance_into(intensities[start:stop], dark, log_blank_minus_dark, out[start:stop])
+    return out
+
+
+def band_windows(wavelengths, bands):
+    '''Pixel index windows covering wavelength bands
+
+    Args:
+        wavelengths (array): Wavelength axis in nm
+        bands (list): (low, high) wavelength pairs in nm
+
+    Returns:
+        list: (start, stop) pixel indices for slicing, one per band
+    '''
+    wavelengths = np.asarray(wavelengths, dtype=np.float64)
+    windows = []
+    for low, high in bands:
+        start = int(np.searchsorted(wavelengths, low, side='left'))
+        stop = int(np.searchsorted(wavelengths, high, side='right'))
+        if stop - start < 2:
+            raise ValueError("Band {}-{} nm covers fewer than two pixels".format(low, high))
+        windows.append((start, stop))
+    return windows
+
+
+def band_weights(wavelengths, bands, dtype=np.float64):
+    '''Trapezoid weights so that spectra @ weights integrates each band
+
+    Args:
+        wavelengths (array): Wavelength axis in nm
+        bands (list): (low, high) wavelength pairs in nm
+
+    Returns:
+        (pixels x bands) array
+    '''
+    wavelengths = np.asarray(wavelengths, dtype=np.float64)
+    weights = np.zeros((len(wavelengths), len(bands)), dtype=dtype)
+    for j, (start, stop) in enumerate(band_windows(wavelengths, bands)):
+        half_steps = np.diff(wavelengths[start:stop])/2
+        weights[start:stop - 1, j] += half_steps
+        weights[start + 1:stop, j] += half_steps
+    return weights
+
+
+def subtract_leak(signal, leak, window):
+    '''Subtract excitation light leaking into the detector, in place
+
+    The leak profile is scaled per frame so that it accounts for all the
+    signal inside the excitation window, then subtracted everywhere.
+
+    Args:
+        signal (array): (frames x pixels) or (pixels,) background-subtracted intensities
+        leak (array): Dark-subtracted spectrum of the excitation light alone
+        window (tuple): (start, stop) pixel indices of the excitation band
+
+    Returns:
+        signal
+    '''
+    start, stop = window
+    leak_total = np.sum(leak[start:stop])
+    if leak_total == 0:
+        raise ValueError("The excitation leak spectrum is zero inside the excitation band")
+    scale = np.sum(signal[..., start:stop], axis=-1, keepdims=True)/leak_total
+    signal -= scale*leak
+    return signal
+
+
+def fluorescence_into(intensities, background, out, leak=None, window=None, weights=None):
+    '''Background-subtracted fluorescence of intensities written into out
+
+    Args:
+        intensities (array): (frames x pixels) or (pixels,) intensities
+        background (array): Intensities to subtract, one per pixel (the blank, or the dark if
+            there is no blank)
+        out (array): Destination with the shape of intensities
+        leak (array, optional): Dark-subtracted excitation leak spectrum
+        window (tuple, optional): (start, stop) pixel indices of the excitation band
+        weights (array, optional): Output of :func:`band_weights`
+
+    Returns:
+        tuple: (out, band areas or None)
+    '''
+    np.subtract(intensities, background, out=out)
+    if leak is not None:
+        subtract_leak(out, leak, window)
+    areas = None
+    if weights is not None:
+        areas = out @ weights
+    return out, areas
+
+
+def batch_fluorescence(intensities, dark, wavelengths, blank=None, bands=None, leak=None,
+                       excitation_band=None, dtype=np.float64, chunk_frames=None):
+    '''Fluorescence of a stack of spectra in one vectorized pass
+
+    Args:
+        intensities (array): (frames x pixels) intensities
+        dark (array): Dark intensities, one per pixel
+        wavelengths (array): Wavelength axis in nm
+        blank (array, optional): Intensities of the blank (solvent) under excitation
+        bands (list, optional): (low, high) wavelength pairs in nm to integrate
+        leak (array, optional): Spectrum of the excitation light alone (e.g., a scattering,
+            non-fluorescent sample) for excitation-leak correction
+        excitation_band (tuple, optional): (low, high) wavelengths in nm where only excitation
+            light reaches the detector. Required with leak.
+        dtype (type, optional): Float type of the result. Defaults to np.float64.
+        chunk_frames (int, optional): Process this many frames at a time
+
+    Returns:
+        dict: 'fluorescence' (frames x pixels) and 'bands' (frames x bands, or None)
+    '''
+    intensities = np.asarray(intensities)
+    if intensities.ndim != 2:
+        raise ValueError("Please pass a (frames x pixels) stack of intensities")
+    dark = reference_values(dark, dtype)
+    background = dark if blank is None else reference_values(blank, dtype)
+    window = None
+    if leak is not None:
+        if excitation_band is None:
+            raise ValueError("Please pass the excitation_band for leak correction")
+        leak = reference_values(leak, dtype) - dark
+        window = band_windows(wavelengths, [excitation_band])[0]
+    weights = band_weights(wavelengths, bands, dtype) if bands else None
+    out = np.empty(intensities.shape, dtype=dtype)
+    areas = np.empty((len(intensities), len(bands)), dtype=dtype) if bands else None
+    chunk_frames = chunk_frames or max(len(intensities), 1)
+    for start in range(0, len(intensities), chunk_frames):
+        stop = start + chunk_frames
+        chunk_out, chunk_areas = fluorescence_into(intensities[start:stop], background, out[start:stop],
+                                                   leak, window, weights)
+        if areas is not None:
+            areas[start:stop] = chunk_areas
+    return {'fluorescence': out, 'bands': areas}
@@ -0,0 +1,73 @@
+''' Chemios Pixel Reduction Module
+
+Crops spectra to wavelength regions of interest (ROIs) and bins adjacent
+pixels, so averaging, processing and storage run on fewer pixels.
+'''
+import numpy as np
+from ._processing import band_windows
+
+
+class PixelReducer(object):
+    '''Class to crop and bin spectra right after they are read
+
+    The pixel indices to keep are computed once from the wavelength axis.
+    Binned pixels are averaged rather than summed, so reduced intensities keep
+    the scale of the raw counts (saturation, dark level). Pixels left over at
+    the end of an ROI that do not fill a bin are dropped.
+
+    Attributes:
+        raw_wavelengths (array): Wavelength axis of the detector in nm
+        rois (list, optional): Increasing, non-overlapping (low, high) wavelength pairs in nm
+            to keep. Defaults to the whole spectrum.
+        binning (int, optional): Adjacent pixels averaged into one. Defaults to 1.
+
+    Note:
+        Keep the visible range at a quarter of the pixels::
+
+            reducer = PixelReducer(spec.get_wavelengths(raw=True), rois=[(400, 700)], binning=4)
+            reduced = reducer.reduce(intensities)
+    '''
+    def __init__(self, raw_wavelengths, rois=None, binning=1):
+        if not isinstance(binning, int) or binning < 1:
+            raise ValueError("Please pass a positive integer binning factor")
+        self.raw_wavelengths = np.asarray(raw_wavelengths, dtype=np.float64)
+        self.rois = [tuple(roi) for roi in rois] if rois else None
+        self.binning = binning
+
+        windows = band_windows(self.raw_wavelengths, self.rois) if self.rois else [(0, len(self.raw_wavelengths))]
+        for (start, stop), (next_start, next_stop) in zip(windows, windows[1:]):
+            if next_start < stop:
+                raise ValueError("ROIs must be increasing and must not overlap")
+        index = []
+        for start, stop in windows:
+            stop = start + (stop - start)//binning*binning
+            if stop == start:
+                raise ValueError("ROI starting at pixel {} is narrower than one bin".format(start))
+            index.append(np.arange(start, stop))
+        self._index = np.concatenate(index)
+        #One contiguous window needs a slice, not a gather
+        self._slice = slice(int(self._index[0]), int(self._index[-1]) + 1) if len(windows) == 1 else None
+        self.raw_pixels = len(self.raw_wavelengths)
+        self.pixels = len(self._index)//binning
+        self.wavelengths = self.reduce(self.raw_wavelengths)
+        self.wavelengths.flags.writeable = False
+
+    def reduce(self, intensities):
+        '''Crop and bin one spectrum or a stack of spectra
+
+        Args:
+            intensities (array): (pixels,) or (frames x pixels) raw intensities
+
+        Returns:
+            New float array with the last axis reduced to self.pixels
+        '''
+        values = np.asarray(intensities, dtype=np.float64)
+        if values.shape[-1] != self.raw_pixels:
+            raise ValueError("Spectrum has {} pixels, expected {}".format(values.shape[-1], self.raw_pixels))
+        if self._slice is not None:
+            kept = values[..., self._slice]
+        else:
+            kept = np.take(values, self._index, axis=-1)
+        if self.binning == 1:
+            return np.array(kept)
+        return kept.reshape(values.shape[:-1] + (self.pixels, self.binning)).mean(axis=-1)
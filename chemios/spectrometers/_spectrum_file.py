@@ -0,0 +1,88 @@
+''' Chemios Spectrum File Module
+
+Binary files for spectra and references that load without parsing: a
+fixed 64 byte header followed by little-endian float32 rows. The first row
+is the wavelength axis and each further row is one spectrum, so a file
+holds a single reference or a whole run.
+
+Header layout (little-endian)::
+
+    magic               8 bytes     b'CHSPEC01'
+    rows                uint32      wavelengths plus spectra
+    pixels              uint32      values per row
+    integration_time    float64     microseconds, NaN if unknown
+    captured            float64     seconds since the epoch
+    reserved            32 bytes
+
+'''
+import os
+import struct
+import time
+import numpy as np
+
+MAGIC = b'CHSPEC01'
+HEADER = struct.Struct('<8sIIdd32x')
+HEADER_SIZE = HEADER.size
+DTYPE = np.dtype('<f4')
+
+
+def save_spectrum(path, spectrum, integration_time=None, captured=None):
+    '''Save spectra to a binary spectrum file
+
+    Args:
+        path (str): File to write, conventionally ending in .spec
+        spectrum (array): [wavelengths, values, ...] rows, e.g. the output of
+            read_spectrometer_raw or absorbance_read with as_array=True
+        integration_time (float, optional): Integration time in microseconds
+        captured (float, optional): Capture time in seconds since the epoch. Defaults to now.
+    '''
+    spectrum = np.asarray(spectrum)
+    if spectrum.ndim != 2 or spectrum.shape[0] < 2:
+        raise ValueError("Please pass wavelengths and at least one row of values")
+    header = HEADER.pack(MAGIC, spectrum.shape[0], spectrum.shape[1],
+                         np.nan if integration_time is None else integration_time,
+                         time.time() if captured is None else captured)
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(header)
+        f.write(np.ascontiguousarray(spectrum, dtype=DTYPE).tobytes())
+    os.replace(temporary, path)
+
+
+def read_header(path):
+    '''Read the header of a binary spectrum file
+
+    Returns:
+        dict: 'rows', 'pixels', 'integration_time' (None if unknown) and 'captured'
+    '''
+    with open(path, 'rb') as f:
+        raw = f.read(HEADER_SIZE)
+    if len(raw) < HEADER_SIZE or raw[:len(MAGIC)] != MAGIC:
+        raise IOError("{} is not a spectrum file".format(path))
+    magic, rows, pixels, integration_time, captured = HEADER.unpack(raw)
+    expected = HEADER_SIZE + rows*pixels*DTYPE.itemsize
+    if os.path.getsize(path) < expected:
+        raise IOError("{} is truncated".format(path))
+    return {
+            'rows': rows,
+            'pixels': pixels,
+            'integration_time': None if np.isnan(integration_time) else integration_time,
+            'captured': captured
+           }
+
+
+def load_spectrum(path):
+    '''Memory-map a binary spectrum file
+
+    Nothing is parsed or copied; pages are read from disk as rows are used.
+
+    Args:
+        path (str): File written by :func:`save_spectrum`
+
+    Returns:
+        tuple: (read-only (rows x pixels) float32 array, header dict as from :func:`read_header`)
+    '''
+    header = read_header(path)
+    spectrum = np.memmap(path, dtype=DTYPE, mode='r', offset=HEADER_SIZE,
+                         shape=(header['rows'], header['pixels']))
+    return spectrum, header
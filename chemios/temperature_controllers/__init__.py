@@ -0,0 +1,11 @@
+from chemios._lazy import lazy_exports
+
+#Exports are imported on first use
+_exports = {
+            'OmegaCN9300Series': '._omega',
+            'ModbusBus': '._bus',
+            'AsyncOmegaCN9300Series': '._async_omega',
+            'SettleDetector': '._settle'
+           }
+__all__ = list(_exports)
+__getattr__, __dir__ = lazy_exports(__name__, _exports)
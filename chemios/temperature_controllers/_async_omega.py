@@ -0,0 +1,128 @@
+''' Asyncio Omega Temperature Controller Module
+
+Runs the blocking Modbus calls of an Omega controller on a dedicated I/O
+thread, so event loops that also drive pumps and spectrometers never stall
+on a slow controller.
+'''
+
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class _AsyncProgrammingSession(object):
+    '''Async context manager around a ProgrammingSession'''
+    def __init__(self, controller, session):
+        self.controller = controller
+        self.session = session
+
+    async def __aenter__(self):
+        await self.controller._call(self.session.__enter__)
+        return self
+
+    async def __aexit__(self, *args):
+        await self.controller._call(self.session.__exit__)
+
+    async def set_temperature(self, temp_set_point, timeout=None):
+        '''Write a setpoint, skipping it if a newer one arrives first'''
+        return await self.controller._call(self.session.set_temperature, temp_set_point, timeout=timeout)
+
+
+class AsyncOmegaCN9300Series(object):
+    '''Class to control an Omega CN 9300 series controller from asyncio
+
+    Calls run one at a time on the controller's own thread. A timeout or
+    cancellation frees the caller at once, but a Modbus transaction already on
+    the wire finishes in the background before the next call starts.
+
+    Attributes:
+        omega (:obj:`OmegaCN9300Series`): Connected controller
+        timeout (float, optional): Default seconds to wait for each call. Defaults to
+            waiting forever.
+
+    Note:
+        Poll alongside other coroutines in one loop::
+
+            controller = AsyncOmegaCN9300Series(OmegaCN9300Series('/dev/ttyUSB0', 1), timeout=2)
+            await controller.set_temperature(80)
+            async for reading in controller.poll(interval=1):
+                print(reading['current_temp'])
+    '''
+    def __init__(self, omega, timeout=None):
+        self.omega = omega
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    def close(self):
+        '''Stop the I/O thread once queued calls finish'''
+        self._executor.shutdown(wait=False)
+
+    async def _call(self, function, *args, timeout=None):
+        if timeout is None:
+            timeout = self.timeout
+        loop = asyncio.get_event_loop()
+        future = loop.run_in_executor(self._executor, function, *args)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError("Omega controller {} did not answer within {} seconds"
+                               .format(self.omega.slave_address, timeout))
+
+    async def get_current_temperature(self, timeout=None):
+        ''' Coroutine to get the current temperature
+
+        Args:
+            timeout (float, optional): Seconds to wait. Defaults to self.timeout.
+
+        Returns:
+            dict: 'temp_set_point' and 'current_temp' in deg C
+        '''
+        return await self._call(self.omega.get_current_temperature, timeout=timeout)
+
+    async def set_temperature(self, temp_set_point, timeout=None):
+        ''' Coroutine to set the temperature
+
+        Args:
+            temp_set_point (float): temperature setpoint in deg C
+            timeout (float, optional): Seconds to wait. Defaults to self.timeout.
+
+        Returns:
+            dict: 'temp_set_point' and 'current_temp' in deg C
+        '''
+        return await self._call(self.omega.set_temperature, temp_set_point, timeout=timeout)
+
+    def program(self, min_interval=0):
+        '''Hold program mode for many setpoint writes (use with async with)'''
+        return _AsyncProgrammingSession(self, self.omega.program(min_interval))
+
+    async def poll(self, interval=1.0, timeout=None):
+        '''Read the temperature once per interval
+
+        Readings that time out are skipped; the next one starts on schedule.
+
+        Args:
+            interval (float, optional): Seconds between the starts of readings. Defaults to 1.
+            timeout (float, optional): Seconds to wait for each reading. Defaults to the
+                interval.
+
+        Yields:
+            dict: 'temp_set_point', 'current_temp' and 'timestamp' (time.monotonic seconds)
+        '''
+        timeout = interval if timeout is None and self.timeout is None else timeout
+        next_reading = time.monotonic()
+        while True:
+            try:
+                reading = await self.get_current_temperature(timeout=timeout)
+            except TimeoutError as e:
+                logging.warning(str(e))
+                reading = None
+            if reading is not None:
+                reading['timestamp'] = time.monotonic()
+                yield reading
+            #Skip the slots a slow reading overran rather than reading in a burst
+            now = time.monotonic()
+            next_reading += interval
+            while next_reading < now:
+                next_reading += interval
+            await asyncio.sleep(next_reading - now)
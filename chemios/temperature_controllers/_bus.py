@@ -0,0 +1,217 @@
+''' Modbus Bus Module
+
+Shares one RS-485 port between several Modbus controllers. A single
+worker thread puts one transaction on the bus at a time, waits out the
+inter-frame silence, and serves writes before polls.
+'''
+
+import collections
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import Future
+import minimalmodbus
+
+#Transaction priorities, lowest first
+WRITE = 0
+READ = 1
+
+
+def frame_gap(baudrate):
+    '''Modbus RTU silent interval between frames in seconds
+
+    3.5 character times of 11 bits, fixed at 1.75 ms above 19200 baud.
+    '''
+    if baudrate > 19200:
+        return 0.00175
+    return 3.5*11/baudrate
+
+
+class _BusInstrument(object):
+    '''Instrument whose transactions are scheduled by a ModbusBus'''
+    def __init__(self, bus, instrument):
+        self.bus = bus
+        self.instrument = instrument
+        self.address = instrument.address
+
+    def read_register(self, *args, **kwargs):
+        return self.bus.execute(READ, self.instrument.read_register, *args, **kwargs)
+
+    def read_registers(self, *args, **kwargs):
+        return self.bus.execute(READ, self.instrument.read_registers, *args, **kwargs)
+
+    def write_register(self, *args, **kwargs):
+        return self.bus.execute(WRITE, self.instrument.write_register, *args, **kwargs)
+
+    def write_registers(self, *args, **kwargs):
+        return self.bus.execute(WRITE, self.instrument.write_registers, *args, **kwargs)
+
+
+class ModbusBus(object):
+    '''Class to schedule Modbus transactions on one RS-485 port
+
+    Attributes:
+        port (str): Serial port of the bus
+        baudrate (int, optional): Baud rate of every controller on the bus. Defaults to 19200,
+            the rate of minimalmodbus and of controllers used without a bus.
+
+    Note:
+        Pass the bus to each controller, then poll them all::
+
+            with ModbusBus('/dev/ttyUSB0') as bus:
+                zones = [OmegaCN9300Series('/dev/ttyUSB0', address, bus=bus) for address in range(1, 17)]
+                bus.start_polling(zones, interval=1.0)
+                zones[3].set_temperature(80)    #Goes ahead of queued polls
+                print(bus.readings[4])
+    '''
+    def __init__(self, port, baudrate=19200):
+        self.port = port
+        self.baudrate = baudrate
+        self.gap = frame_gap(baudrate)
+        self.transactions = 0
+        self.readings = {}
+        self.cycle_times = collections.deque(maxlen=100)
+        self.overruns = 0
+
+        #Internal variables
+        self._instruments = {}
+        self._queue = []
+        self._sequence = itertools.count()
+        self._ready = threading.Condition()
+        self._closed = False
+        self._last_frame = 0.0
+        self._stop_polling = threading.Event()
+        self._polling_thread = None
+        self._worker = threading.Thread(target=self._work, daemon=True, name='ModbusBus')
+        self._worker.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def instrument(self, slave_address):
+        '''Instrument for a slave address whose transactions go through the bus
+
+        Args:
+            slave_address (int): Address of the controller from 1 to 247
+
+        Returns:
+            Object with the read_register(s) and write_register(s) methods of
+            minimalmodbus.Instrument
+        '''
+        if slave_address not in self._instruments:
+            instrument = minimalmodbus.Instrument(self.port, slave_address, mode=minimalmodbus.MODE_RTU)
+            serial = getattr(instrument, 'serial', None)
+            if serial is not None:
+                serial.baudrate = self.baudrate
+            self._instruments[slave_address] = _BusInstrument(self, instrument)
+        return self._instruments[slave_address]
+
+    def submit(self, priority, function, *args, **kwargs):
+        '''Queue a transaction
+
+        Args:
+            priority (int): WRITE or READ; lower priorities run first, in order of submission
+            function (callable): Function that performs exactly one transaction
+
+        Returns:
+            :obj:`concurrent.futures.Future` with the result of function
+        '''
+        future = Future()
+        with self._ready:
+            if self._closed:
+                raise IOError("Bus on {} is closed".format(self.port))
+            heapq.heappush(self._queue, (priority, next(self._sequence), future, function, args, kwargs))
+            self._ready.notify()
+        return future
+
+    def execute(self, priority, function, *args, **kwargs):
+        '''Queue a transaction and wait for its result'''
+        if threading.current_thread() is self._worker:
+            raise ValueError("Transactions cannot be queued from inside a transaction")
+        return self.submit(priority, function, *args, **kwargs).result()
+
+    def _work(self):
+        while True:
+            with self._ready:
+                self._ready.wait_for(lambda: self._queue or self._closed)
+                if not self._queue:
+                    return
+                priority, sequence, future, function, args, kwargs = heapq.heappop(self._queue)
+            if not future.set_running_or_notify_cancel():
+                continue
+            #Keep the bus silent between frames
+            wait = self._last_frame + self.gap - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                result = function(*args, **kwargs)
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+            finally:
+                self._last_frame = time.monotonic()
+                self.transactions += 1
+
+    def start_polling(self, controllers, interval=1.0, callback=None):
+        '''Poll the temperature of every controller once per interval
+
+        Each reading is stored in self.readings by slave address with a
+        'timestamp' (time.monotonic seconds). Cycles that take longer than the
+        interval are counted in self.overruns.
+
+        Args:
+            controllers (list): Controllers with get_current_temperature, e.g. OmegaCN9300Series
+            interval (float, optional): Seconds between the starts of polling cycles. Defaults to 1.
+            callback (callable, optional): Called with (slave address, reading) after each poll
+        '''
+        if self._polling_thread is not None:
+            raise ValueError("Polling is already running")
+        self._stop_polling.clear()
+        self._polling_thread = threading.Thread(target=self._poll, args=(list(controllers), interval, callback),
+                                                daemon=True, name='ModbusBusPolling')
+        self._polling_thread.start()
+
+    def stop_polling(self):
+        '''Stop polling after the current cycle'''
+        self._stop_polling.set()
+        if self._polling_thread is not None:
+            self._polling_thread.join()
+            self._polling_thread = None
+
+    def _poll(self, controllers, interval, callback):
+        next_cycle = time.monotonic()
+        while not self._stop_polling.is_set():
+            start = time.monotonic()
+            for controller in controllers:
+                if self._stop_polling.is_set():
+                    return
+                try:
+                    reading = controller.get_current_temperature()
+                except Exception as e:
+                    logging.warning("Polling controller {} on {} failed: {}"
+                                    .format(controller.slave_address, self.port, e))
+                    continue
+                reading['timestamp'] = time.monotonic()
+                self.readings[controller.slave_address] = reading
+                if callback is not None:
+                    callback(controller.slave_address, reading)
+            self.cycle_times.append(time.monotonic() - start)
+            next_cycle += interval
+            if time.monotonic() > next_cycle:
+                self.overruns += 1
+                next_cycle = time.monotonic()
+            self._stop_polling.wait(max(next_cycle - time.monotonic(), 0))
+
+    def close(self):
+        '''Stop polling, finish queued transactions and stop the worker'''
+        self.stop_polling()
+        with self._ready:
+            self._closed = True
+            self._ready.notify_all()
+        self._worker.join()
@@ -1,6 +1,10 @@
 ''' Omega Temperature Controller Module
 '''
 
+import itertools
+import logging
+import threading
+import time
 import minimalmodbus
 
 #required values
@@ -27,21 +31,144 @@ pre_security_register = 768
 security_register_pre = 5376
 security_register_post = 5632
 
+
+class ProgrammingSession(object):
+    '''Program mode of an Omega controller, held for many setpoint writes
+
+    The controller is unlocked when the first session opens and locked again
+    when the last one closes, so sessions can be nested and shared by threads.
+
+    Attributes:
+        omega (:obj:`OmegaCN9300Series`): Controller to program
+        min_interval (float, optional): Fewest seconds between setpoint writes, also applied
+            to omega.set_temperature while the session is open. Defaults to 0.
+
+    Note:
+        A write through :meth:`set_temperature` that comes too soon waits for its
+        turn. Setpoints passed from other threads while it waits are coalesced so
+        only the latest is written, but a single thread is paced rather than
+        thinned. Ramps that should only apply the newest value use :meth:`submit`,
+        which never waits::
+
+            with omega.program(min_interval=0.5) as session:
+                for setpoint in ramp:
+                    session.submit(setpoint)
+                    time.sleep(0.05)
+    '''
+    def __init__(self, omega, min_interval=0):
+        self.omega = omega
+        self.min_interval = min_interval
+
+    def __enter__(self):
+        self.omega._open_session(self.min_interval)
+        return self
+
+    def __exit__(self, *args):
+        try:
+            self.omega._flush_setpoints()
+        finally:
+            self.omega._close_session(self.min_interval)
+
+    def set_temperature(self, temp_set_point):
+        '''Write a setpoint, skipping it if a newer one arrives first
+
+        Returns:
+            bool: True if this setpoint was written, False if a newer one replaced it
+        '''
+        return self.omega._write_setpoint(temp_set_point, self.min_interval)
+
+    def submit(self, temp_set_point):
+        '''Queue a setpoint without waiting
+
+        A writer thread writes the newest queued setpoint once per min_interval;
+        older ones that it has not reached are dropped. The session writes the
+        last one before it closes. Poll the controller from other threads only
+        through a :obj:`ModbusBus`, which keeps their transactions apart.
+        '''
+        self.omega._submit_setpoint(temp_set_point, self.min_interval)
+
+
 class OmegaCN9300Series(object):
     '''Class to Control Omega CN 9311 Temperature Controller
 
+    The setpoint and device information change only when written, so they
+    are cached. A poll with a fresh cached setpoint reads only the temperature.
+
+    The temperature and setpoint registers are far apart, so they are read one
+    at a time: a block read spanning both returns 100 registers, which takes
+    several times longer on the bus than the two single reads.
+
     Attributes:
         port (str): Serial port over which communication should be sent
         slave_address (int): Address of the temperature controller from 1 to 247
+        setpoint_max_age (float, optional): Seconds before the cached setpoint is read again,
+            to catch changes from the front panel. Defaults to 60. None caches it until
+            :meth:`invalidate_cache`.
+        bus (:obj:`ModbusBus`, optional): Bus that schedules the transactions when several
+            controllers share the port
 
     Notes:
         Set the address on the Level C of the menu of the omega temperature controller
     '''
     
-    def __init__(self, port, slave_address):
-        self.controller = minimalmodbus.Instrument(port, slave_address, mode=minimalmodbus.MODE_RTU)
+    def __init__(self, port, slave_address, setpoint_max_age=60, bus=None):
+        if bus is None:
+            self.controller = minimalmodbus.Instrument(port, slave_address, mode=minimalmodbus.MODE_RTU)
+        elif bus.port != port:
+            raise ValueError("Bus is on {}, not {}".format(bus.port, port))
+        else:
+            self.controller = bus.instrument(slave_address)
+        self.slave_address = slave_address
+        self.setpoint_max_age = setpoint_max_age
+        self.transactions = 0
+
+        #Caches
+        self._setpoint = None
+        self._setpoint_time = None
+        self._device_info = None
+        self._temperature = None
+
+        #Program mode
+        self._session_lock = threading.Lock()
+        self._session_intervals = []
+        self._write_lock = threading.Lock()
+        #Guards the numbering and the pending setpoint, so the newest always wins
+        self._pending_lock = threading.Lock()
+        self._setpoint_count = itertools.count(1)
+        self._pending_setpoint = (0, None)
+        self._writer = None
+        self._writer_error = None
+        self._written_setpoint = 0
+        self._last_write = 0.0
+
         #Try a command to see if the instrument works
-        self.controller.read_register(temperature_setpoint_register, numberOfDecimals=1 )
+        self.get_current_temperature()
+
+    def invalidate_cache(self):
+        '''Forget the cached setpoint and device information'''
+        self._setpoint = None
+        self._setpoint_time = None
+        self._device_info = None
+
+    def _cache_setpoint(self, setpoint):
+        self._setpoint = setpoint
+        self._setpoint_time = time.monotonic()
+
+    def _setpoint_fresh(self):
+        if self._setpoint is None:
+            return False
+        if self.setpoint_max_age is None:
+            return True
+        return time.monotonic() - self._setpoint_time <= self.setpoint_max_age
+
+    def _read_register(self, register, decimals=0):
+        self.transactions += 1
+        return self.controller.read_register(register, decimals)
+
+    def _write_register(self, register, value, decimals=0, functioncode=16):
+        #Function code 16 is the minimalmodbus default
+        self.transactions += 1
+        self.controller.write_register(register, value, decimals, functioncode)
 
     def get_current_temperature(self):
         ''' Method to get the current temperature
@@ -53,33 +180,167 @@ class OmegaCN9300Series(object):
                     }
 
         '''
-        setpoint = self.controller.read_register(temperature_setpoint_register, numberOfDecimals=1 ) #read only one setpoint register
-        temperature = self.controller.read_register(temperature_register, 1)
+        if self._setpoint_fresh():
+            temperature = self._read_register(temperature_register, 1)
+        else:
+            setpoint = self._read_register(temperature_setpoint_register, 1)
+            temperature = self._read_register(temperature_register, 1)
+            self._cache_setpoint(setpoint)
+        self._temperature = temperature
         update = {
-                  'temp_set_point': setpoint,
+                  'temp_set_point': self._setpoint,
                   'current_temp': temperature
                  }
         return update
 
+    def get_device_info(self):
+        ''' Method to get the type of instrument and output configuration
+
+        Read from the controller once and cached until :meth:`invalidate_cache`.
+
+        Returns:
+            int: Contents of the device information register
+        '''
+        if self._device_info is None:
+            self._device_info = self._read_register(device_info_register)
+        return self._device_info
+
+    def program(self, min_interval=0):
+        ''' Method to hold program mode for many setpoint writes
+
+        Unlocking and locking cost four transactions, so ramps should write their
+        setpoints inside one session::
+
+            with omega.program(min_interval=0.5):
+                for setpoint in ramp:
+                    omega.set_temperature(setpoint)
+
+        Args:
+            min_interval (float, optional): Fewest seconds between setpoint writes. When
+                sessions are nested, the longest interval of those open applies. Defaults to 0.
+
+        Returns:
+            :obj:`ProgrammingSession` to use in a with statement
+        '''
+        return ProgrammingSession(self, min_interval)
+
+    def _open_session(self, min_interval=0):
+        with self._session_lock:
+            if not self._session_intervals:
+                #Enter Program Mode
+                self._write_register(pre_security_register, pre_security_check, functioncode=write_register)
+                self._write_register(security_register_pre, security_check)
+            self._session_intervals.append(min_interval)
+
+    def _join_session(self):
+        '''Hold the open session and return its min_interval, or None if no session is open'''
+        with self._session_lock:
+            if not self._session_intervals:
+                return None
+            min_interval = max(self._session_intervals)
+            self._session_intervals.append(min_interval)
+            return min_interval
+
+    def _close_session(self, min_interval=0):
+        with self._session_lock:
+            self._session_intervals.remove(min_interval)
+            if not self._session_intervals:
+                #exit Program Mode
+                self._write_register(pre_security_register, pre_security_clear_post)
+                self._write_register(security_register_post, security_check)
+
+    def _queue_setpoint(self, temp_set_point):
+        '''Make a setpoint the pending one and return its number'''
+        with self._pending_lock:
+            number = next(self._setpoint_count)
+            self._pending_setpoint = (number, temp_set_point)
+        return number
+
+    def _write_pending(self, min_interval):
+        '''Write the pending setpoint once min_interval has passed; hold _write_lock'''
+        wait = self._last_write + min_interval - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        with self._pending_lock:
+            latest, setpoint = self._pending_setpoint
+        self._write_register(temperature_setpoint_register, setpoint, 1, functioncode=write_register)
+        self._last_write = time.monotonic()
+        self._written_setpoint = latest
+        #The controller accepted the setpoint, so it does not need reading back
+        self._cache_setpoint(round(setpoint, 1))
+        return latest
+
+    def _write_setpoint(self, temp_set_point, min_interval=0):
+        '''Write the latest pending setpoint; callers that queued behind a write coalesce'''
+        number = self._queue_setpoint(temp_set_point)
+        with self._write_lock:
+            if self._written_setpoint >= number:
+                #Written by a caller ahead of this one, or replaced by a newer setpoint
+                return self._written_setpoint == number
+            return self._write_pending(min_interval) == number
+
+    def _submit_setpoint(self, temp_set_point, min_interval=0):
+        '''Queue a setpoint for the writer thread, starting it if it is idle'''
+        if self._writer_error is not None:
+            raise IOError("Setpoint writer failed: {}".format(self._writer_error))
+        with self._pending_lock:
+            self._pending_setpoint = (next(self._setpoint_count), temp_set_point)
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_submitted, args=(min_interval,),
+                                                daemon=True, name='OmegaSetpointWriter')
+                self._writer.start()
+
+    def _write_submitted(self, min_interval):
+        while True:
+            with self._write_lock:
+                with self._pending_lock:
+                    if self._pending_setpoint[0] <= self._written_setpoint:
+                        #Nothing newer; a later submit starts a new writer
+                        self._writer = None
+                        return
+                try:
+                    self._write_pending(min_interval)
+                except Exception as e:
+                    logging.warning("Omega controller {} setpoint write failed: {}".format(self.slave_address, e))
+                    with self._pending_lock:
+                        self._writer_error = e
+                        self._writer = None
+                    return
+
+    def _flush_setpoints(self):
+        '''Wait until the writer thread has written the last submitted setpoint'''
+        with self._pending_lock:
+            writer = self._writer
+        if writer is not None:
+            writer.join()
+        error, self._writer_error = self._writer_error, None
+        if error is not None:
+            raise IOError("Setpoint writer failed: {}".format(error))
+
     def set_temperature(self, temp_set_point): #memory location for temperature set needed
         ''' Method to set the temperature
+
+        Inside a :meth:`program` session only the setpoint is written, at most
+        once per min_interval of the session, and the update holds the last
+        temperature read. Otherwise the controller is unlocked and locked around
+        the write and the temperature is read.
         
         Args:
             temp_set_point (float): temperature setpoint in deg C
 
         '''
         #TODO ensure that the proper responses are received
-        #Enter Program Mode
-        self.controller.write_register(pre_security_register,pre_security_check, functioncode = write_register)
-        self.controller.write_register(security_register_pre, security_check)
-        #write to setpoint register
-        self.controller.write_register(temperature_setpoint_register, temp_set_point, numberOfDecimals = 1, functioncode = write_register)
-        #exit Program Mode
-        self.controller.write_register(pre_security_register, pre_security_clear_post)
-        self.controller.write_register(security_register_post, security_check)
-        #Get setpoint and current temperature
+        min_interval = self._join_session()
+        if min_interval is not None:
+            try:
+                self._write_setpoint(temp_set_point, min_interval)
+            finally:
+                self._close_session(min_interval)
+            return {
+                    'temp_set_point': self._setpoint,
+                    'current_temp': self._temperature
+                   }
+        with self.program():
+            self._write_setpoint(temp_set_point)
         update = self.get_current_temperature()
         return update
-
-
-
@@ -0,0 +1,287 @@
+''' Temperature Settle Detector Module
+
+Decides when a temperature zone has settled by fitting a first order
+response to the readings as they arrive, instead of waiting a fixed time.
+'''
+
+import collections
+import math
+import time
+
+
+class SettleDetector(object):
+    '''Class to detect when a temperature has settled
+
+    A first order response obeys dT/dt = (T_final - T)/tau, a straight line in
+    T. Each pair of readings adds one point (mean temperature, rate) to an
+    exponentially weighted least squares fit of that line, which gives the time
+    constant tau. With tau known, the readings of the last few time constants
+    are fit to T(t) = T_final + A*exp(-(t - now)/tau), so A is the distance
+    still to close. The zone is stable once A is within tolerance by a margin of
+    confidence standard errors.
+
+    With a setpoint more than tolerance from the first reading, a flat stretch
+    is dead time rather than a settled zone: nothing is fit until the
+    temperature has moved by more than tolerance, and the fit starts from the
+    reading before that move.
+
+    Attributes:
+        tolerance (float, optional): Largest distance from the final temperature in
+            deg C. Defaults to 0.5.
+        setpoint (float, optional): Setpoint in deg C, to report the offset of the final
+            temperature from it
+        confidence (float, optional): Standard errors kept as margin. Defaults to 2.
+        min_samples (int, optional): Fewest readings before the zone can be stable.
+            Defaults to 5.
+        forgetting (float, optional): Weight kept by older points of the time constant fit
+            at each reading, between 0 and 1. Defaults to 0.95.
+        window (float, optional): Time constants of readings in the final temperature fit.
+            Defaults to 2.
+        max_samples (int, optional): Most readings kept for that fit. Defaults to 1000.
+        resolution (float, optional): Step of the readings in deg C. Defaults to 0.1, the
+            resolution of the Omega controllers.
+
+    Note:
+        Feed it the readings of a controller::
+
+            detector = SettleDetector(tolerance=0.2)
+            omega.set_temperature(80)
+            detector.reset(setpoint=80)
+            while not detector.stable:
+                detector.add(omega.get_current_temperature())
+                print(detector.time_to_settle)
+                time.sleep(1)
+    '''
+    def __init__(self, tolerance=0.5, setpoint=None, confidence=2.0, min_samples=5, forgetting=0.95,
+                 window=2.0, max_samples=1000, resolution=0.1):
+        if not 0 < forgetting <= 1:
+            raise ValueError("forgetting must be between 0 and 1")
+        self.tolerance = tolerance
+        self.confidence = confidence
+        self.min_samples = max(min_samples, 3)
+        self.forgetting = forgetting
+        self.window = window
+        self.max_samples = max_samples
+        self.resolution = resolution
+        self.reset(setpoint)
+
+    def reset(self, setpoint=None):
+        '''Start a new temperature step
+
+        Args:
+            setpoint (float, optional): New setpoint in deg C
+        '''
+        self.setpoint = setpoint
+        self._restart()
+
+    def _restart(self):
+        '''Forget the readings and fits, keeping the setpoint'''
+        self.samples = 0
+        self.temperature = None
+        self.timestamp = None
+        self.time_constant = None
+        self.final_temperature = None
+        self.distance = None
+        self.uncertainty = math.inf
+        self.noise = 0.0
+        self.readings = collections.deque(maxlen=self.max_samples)
+        #Weighted sums of the fit of rate against temperature
+        self._sums = [0.0]*7
+        self._squared_weights = 0.0
+        self._time_constant_error = math.inf
+        #First reading of a step whose response has not begun
+        self._baseline = None
+
+    def _fit_time_constant(self):
+        '''Time constant from the rate fit and its relative standard error, or None'''
+        weight, sx, sy, sxx, sxy, syy, sdt = self._sums
+        points = weight**2/self._squared_weights
+        mean_x, mean_y = sx/weight, sy/weight
+        var_x = sxx/weight - mean_x**2
+        if points < self.min_samples or var_x <= 1e-12:
+            return None
+        covariance = sxy/weight - mean_x*mean_y
+        slope = covariance/var_x
+        if slope >= 0:
+            return None
+        residual = max(syy/weight - mean_y**2 - slope*covariance, 0.0)*points/(points - 2)
+        return -1/slope, math.sqrt(residual/(points*var_x))/-slope
+
+    def _drift(self):
+        '''Temperature change over the rate fit's window at its mean rate'''
+        weight, sx, sy, sxx, sxy, syy, sdt = self._sums
+        return abs(sy/weight)*sdt
+
+    def _fit_levels(self, tau):
+        '''Least squares fit of the readings to a final temperature plus a decaying distance
+
+        Returns:
+            tuple: (final temperature, distance now, standard error of the distance,
+            reading noise, sum of squared residuals), or None if the fit is singular
+        '''
+        now = self.timestamp
+        n = len(self.readings)
+        #exp(-(t - now)/tau) is 1 now, so its coefficient is the distance left
+        basis = [math.exp((now - t)/tau) for t, T in self.readings]
+        temperatures = [T for t, T in self.readings]
+        sb = sum(basis)
+        sbb = sum(b*b for b in basis)
+        sy = sum(temperatures)
+        sby = sum(b*T for b, T in zip(basis, temperatures))
+        determinant = n*sbb - sb*sb
+        if determinant <= 1e-12:
+            return None
+        final = (sbb*sy - sb*sby)/determinant
+        distance = (n*sby - sb*sy)/determinant
+        squares = sum((T - final - distance*b)**2 for b, T in zip(basis, temperatures))
+        residual = squares/(n - 2)
+        return final, distance, math.sqrt(residual*n/determinant), math.sqrt(residual), squares
+
+    def _fit_final(self):
+        '''Fit the recent readings, refining the time constant from their levels
+
+        The rate fit stops updating the time constant once the temperature flattens,
+        so it is refined here by a parabola through the residuals of three nearby
+        time constants.
+
+        Returns:
+            tuple: (final temperature, distance now, standard error of the distance,
+            reading noise), or None with too few readings
+        '''
+        tau = self.time_constant
+        while len(self.readings) > 3 and self.timestamp - self.readings[0][0] > self.window*tau:
+            self.readings.popleft()
+        if len(self.readings) < 4:
+            return None
+        step = 0.05
+        fits = [self._fit_levels(tau*(1 + step*k)) for k in (-1, 0, 1)]
+        if all(fits):
+            low, middle, high = (fit[4] for fit in fits)
+            curvature = low - 2*middle + high
+            if curvature > 0:
+                shift = max(min(0.5*(low - high)/curvature, 2), -2)
+                tau = tau*(1 + step*shift)
+                self.time_constant = tau
+                fits[1] = self._fit_levels(tau)
+        fit = fits[1]
+        return fit[:4] if fit is not None else None
+
+    def _fit_flat(self):
+        '''Mean of the readings while no decay can be fit, or None while they drift'''
+        if self.samples < 3 or self._drift() > self.tolerance:
+            return None
+        temperatures = [T for t, T in self.readings]
+        n = len(temperatures)
+        mean = sum(temperatures)/n
+        noise = math.sqrt(sum((T - mean)**2 for T in temperatures)/(n - 1))
+        return mean, 0.0, noise/math.sqrt(n), noise
+
+    def update(self, temperature, timestamp=None):
+        '''Add one reading
+
+        Args:
+            temperature (float): Temperature in deg C
+            timestamp (float, optional): Seconds (e.g., time.monotonic). Defaults to now.
+
+        Returns:
+            bool: True if the zone is stable
+        '''
+        if timestamp is None:
+            timestamp = time.monotonic()
+        if self.temperature is not None and timestamp <= self.timestamp:
+            raise ValueError("Readings must have increasing timestamps")
+        if self.samples == 0 and self.setpoint is not None and abs(temperature - self.setpoint) > self.tolerance:
+            self._baseline = temperature
+        elif self._baseline is not None and abs(temperature - self._baseline) > self.tolerance:
+            #The response has begun; the dead time before it would bias the fit
+            previous = (self.timestamp, self.temperature)
+            self._restart()
+            self.timestamp, self.temperature = previous
+            self.readings.append(previous)
+            self.samples = 1
+        if self.temperature is not None:
+            dt = timestamp - self.timestamp
+            x = (temperature + self.temperature)/2
+            y = (temperature - self.temperature)/dt
+            sums = self._sums
+            for i, term in enumerate((1.0, x, y, x*x, x*y, y*y, dt)):
+                sums[i] = self.forgetting*sums[i] + term
+            self._squared_weights = self.forgetting**2*self._squared_weights + 1
+            fit = self._fit_time_constant()
+            #The level fit refines the time constant; only a more precise rate fit replaces it
+            if fit is not None and fit[1] < self._time_constant_error:
+                self.time_constant, self._time_constant_error = fit
+        self.temperature = temperature
+        self.timestamp = timestamp
+        self.samples += 1
+        self.readings.append((timestamp, temperature))
+
+        if self.awaiting_response:
+            fit = None
+        elif self.time_constant is not None:
+            fit = self._fit_final()
+        else:
+            fit = self._fit_flat()
+        if fit is None:
+            self.final_temperature, self.distance, self.uncertainty = None, None, math.inf
+        else:
+            self.final_temperature, self.distance, self.uncertainty, self.noise = fit
+        return self.stable
+
+    def add(self, reading):
+        '''Add a reading from get_current_temperature
+
+        Args:
+            reading (dict): 'current_temp', and optionally 'temp_set_point' and 'timestamp'
+
+        Returns:
+            bool: True if the zone is stable
+        '''
+        setpoint = reading.get('temp_set_point')
+        if setpoint is not None and setpoint != self.setpoint:
+            if self.setpoint is not None:
+                #A new setpoint starts a new step
+                self.reset(setpoint)
+            self.setpoint = setpoint
+        return self.update(reading['current_temp'], reading.get('timestamp'))
+
+    def _margin_error(self):
+        #Readings are rounded to the resolution, which the fit cannot average away
+        return math.hypot(self.uncertainty, self.resolution/2)
+
+    @property
+    def awaiting_response(self):
+        '''True while the temperature has not yet moved after a step to a distant setpoint'''
+        return self._baseline is not None
+
+    @property
+    def stable(self):
+        '''True once the temperature is within tolerance of its final value'''
+        if self.samples < self.min_samples or self.distance is None or self.awaiting_response:
+            return False
+        return abs(self.distance) + self.confidence*self._margin_error() <= self.tolerance
+
+    @property
+    def offset(self):
+        '''Final temperature minus the setpoint in deg C, or None'''
+        if self.final_temperature is None or self.setpoint is None:
+            return None
+        return self.final_temperature - self.setpoint
+
+    @property
+    def time_to_settle(self):
+        '''Predicted seconds until the zone is stable
+
+        0 if it is stable, None until there is a fit, and inf if the uncertainty
+        is too large for the tolerance.
+        '''
+        if self.distance is None:
+            return None
+        if self.stable:
+            return 0.0
+        margin = self.tolerance - self.confidence*self._margin_error()
+        if margin <= 0:
+            return math.inf
+        if abs(self.distance) <= margin or not self.time_constant:
+            return 0.0
+        return self.time_constant*math.log(abs(self.distance)/margin)
@@ -6,31 +6,15 @@
  */
  '''
 
-import numpy as np
 import json
 import logging
-import datetime
 import time
 import sys
 import glob
-import serial
-import datetime
-import arrow
     
 def convert_to_lists(df):
-    '''Convert data frame to list of lists'''
-    output = []
-    for i in range(len(list(df))):
-        column = df.iloc[:,i]
-        output.append(column.values.tolist())       
-    for i in output:
-        for j in i:
-            try:
-                x = output[i][j]                
-                output[i][j] = x.item()
-            except Exception:
-                pass
-    return output
+    '''Convert data frame to list of lists, one list of Python scalars per column'''
+    return [df.iloc[:, i].tolist() for i in range(df.shape[1])]
 
 def import_module(name):
     '''Import a module from a string'''
@@ -42,7 +26,7 @@ def import_module(name):
 
 
 #Useful functions for serial
-def serial_write(ser, cmd):
+def serial_write(ser, cmd, handle=None, output=False):
     """ General Serial Writing Method
 
     Args:
@@ -50,10 +34,23 @@ def serial_write(ser, cmd):
         cmd (str): String being sent
         handle(str): Function handle (needed for error reporting)
         output(bool): If true, fucntion returns output/errors from serial defvece
+    Returns:
+        The response up to a newline or ETX if output is true
     """
     ser.flushOutput()
     ser.write(cmd.encode())
     logging.debug('Sent serial cmd ' + cmd)
+    if output:
+        response = bytearray()
+        while True:
+            byte = ser.read(1)
+            if not byte:
+                logging.debug('{} got no complete response to {}'.format(handle or 'serial_write', cmd))
+                break
+            response += byte
+            if byte in (b'\n', b'\x03'):
+                break
+        return response.decode(errors='replace').strip()
 
 def sio_write(sio, cmd, 
               output=False, exp = None, ctx = 'Device', 
@@ -82,8 +79,7 @@ def sio_write(sio, cmd,
             return 1
     logging.debug('Sent serial cmd ' + cmd)
     if output:
-        start = arrow.utcnow()
-        timeout = datetime.timedelta(seconds = timeout)
+        start = time.monotonic()
         response_buffer = ''
         while True:
             sio.flush()
@@ -99,9 +95,9 @@ def sio_write(sio, cmd,
                                     '{} might not be connected.'
                                     .format(exp, cmd, ctx))
                 return response_buffer
-            elapsed_time = arrow.utcnow() - start
+            elapsed_time = time.monotonic() - start
             if elapsed_time > timeout:
-                logging.debug('chemios.utils.sio_write timeout after {} seconds.'.format(str(elapsed_time.seconds)))
+                logging.debug('chemios.utils.sio_write timeout after {} seconds.'.format(int(elapsed_time)))
                 if response != exp and exp:
                     logging.warning('Did not receive expected response of {} from command {}. '
                                     '{} might not be connected.'
@@ -112,6 +108,7 @@ def sio_write(sio, cmd,
 class SerialTestClass(object):
     """A serial port test class using a mock port """
     def __init__(self):
+        import serial
         self._port = "loop://"
         self._timeout = 0
         self._baudrate = 9600
@@ -128,6 +125,7 @@ def discover_serial_ports():
         :returns:
             A list of the serial ports available on the system
     """
+    import serial
     #For windows
     if sys.platform.startswith('win'):
         ports = ['COM%s' % (i + 1) for i in range(256)]
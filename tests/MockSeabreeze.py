@@ -7,16 +7,16 @@
  *
  */
  '''
-import pandas as pd
+from chemios.spectrometers import load_spectrum
 
 #File paths
-sample_spectrometer_data = './sample_data/sample_spectrometer_data.csv'
+sample_spectrometer_data = './sample_data/sample_spectrometer_data.spec'
 
 class Spectrometer(object):
     def __init__(self):
-        df = pd.read_csv(sample_spectrometer_data)
-        self.wavelength_values = df.wavelength.values.tolist()
-        self.intensity_values = df.intensity.values.tolist()
+        spectrum, header = load_spectrum(sample_spectrometer_data)
+        self.wavelength_values = spectrum[0].tolist()
+        self.intensity_values = spectrum[1].tolist()
 
     @classmethod
     def from_serial_number(cls, spectrometer_model):
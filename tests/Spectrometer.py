@@ -7,17 +7,15 @@
  *
  */
  '''
-from chemios.spectrometers import OceanOptics
-from chemios.utils import convert_to_lists
+from chemios.spectrometers import OceanOptics, load_spectrum
 import MockSeabreeze
 import unittest
-import pandas as pd
 import sys
 
 #File paths
-sample_spectrometer_data = './sample_data/sample_spectrometer_data.csv'
-sample_blank_file_csv = './sample_data/sample_blank_data.csv'
-sample_dark_file_csv = './sample_data/sample_dark_data.csv'
+sample_spectrometer_data = './sample_data/sample_spectrometer_data.spec'
+sample_blank_file = './sample_data/sample_blank_data.spec'
+sample_dark_file = './sample_data/sample_dark_data.spec'
 
 #Need python3 for some of the methods used in unittest
 assert sys.version_info >= (3, 0)
@@ -28,12 +26,10 @@ class TestSpectrometer(unittest.TestCase):
     def setUp(self):
         self.model = 'LH1357'
         self.spec = OceanOptics(self.model, MockSeabreeze)
-        df = pd.read_csv(sample_spectrometer_data)
-        self.data = convert_to_lists(df)
-        df = pd.read_csv(sample_blank_file_csv)
-        self.blank = convert_to_lists(df)
-        df = pd.read_csv(sample_dark_file_csv)
-        self.dark = convert_to_lists(df)
+        self.data, header = load_spectrum(sample_spectrometer_data)
+        #References are passed as spectrum files, as from save_spectrum
+        self.blank = sample_blank_file
+        self.dark = sample_dark_file
 
     def tearDown(self):
         del self.spec
@@ -42,7 +38,7 @@ class TestSpectrometer(unittest.TestCase):
     def test_read_spectrometer_raw(self):
         with self.spec as spec:
             output = spec.read_spectrometer_raw(1000)
-        self.assertCountEqual(output[1],self.data[1])
+        self.assertCountEqual(output[1],self.data[1].tolist())
 
     #Check that you can store blank
     def test_blank_intensities(self):
@@ -0,0 +1,120 @@
+'''
+/*
+ * Copyright 2018 Chemios
+ * Synthetic Modbus
+ *
+ * Stand-in for minimalmodbus.Instrument that simulates Omega CN9300
+ * temperature controllers
+ *
+ */
+ '''
+import math
+import threading
+import time
+import minimalmodbus
+
+TEMPERATURE_REGISTER = 28
+SETPOINT_REGISTER = 127
+DEVICE_INFO_REGISTER = 0x04FC
+DEVICE_INFO = 9311
+
+#Settings shared by every synthetic controller; tests may change them
+settings = {
+            'ambient': 25.0,
+            'time_constant': 60.0,   #seconds for the temperature to close 63% of the gap
+            'max_block': 125,        #most registers per read the controller allows
+            'frame_time': 0.0,       #seconds each transaction occupies the bus
+           }
+
+#Controllers by (port, slave address) so that several instruments share state
+controllers = {}
+#Transactions on each port in order, as (slave address, kind, register)
+bus_log = {}
+_bus_locks = {}
+
+
+def reset():
+    controllers.clear()
+    bus_log.clear()
+    _bus_locks.clear()
+
+
+class Controller(object):
+    '''Simulated controller with a first order response to its setpoint'''
+    def __init__(self):
+        self.registers = {DEVICE_INFO_REGISTER: DEVICE_INFO}
+        self.setpoint = settings['ambient']
+        self.temperature = settings['ambient']
+        self.locked = True
+        self.writes = []
+        self._pre_security = None
+        self._last = time.monotonic()
+
+    def update(self):
+        now = time.monotonic()
+        fraction = 1 - math.exp(-(now - self._last)/settings['time_constant'])
+        self.temperature += (self.setpoint - self.temperature)*fraction
+        self._last = now
+
+    def read(self, register):
+        self.update()
+        if register == TEMPERATURE_REGISTER:
+            return int(round(self.temperature*10))
+        if register == SETPOINT_REGISTER:
+            return int(round(self.setpoint*10))
+        return self.registers.get(register, 0)
+
+    def write(self, register, value):
+        self.update()
+        self.writes.append((register, value))
+        if register == 768:
+            self._pre_security = value
+        elif register == 5376 and self._pre_security == 5:
+            self.locked = False
+        elif register == 5632 and self._pre_security == 6:
+            self.locked = True
+        elif register == SETPOINT_REGISTER:
+            if self.locked:
+                raise minimalmodbus.SlaveReportedException("Setpoint is locked")
+            self.setpoint = value/10.0
+        else:
+            self.registers[register] = value
+
+
+class Instrument(object):
+    '''Synthetic minimalmodbus.Instrument'''
+    def __init__(self, port, slaveaddress, mode='rtu', **kwargs):
+        self.port = port
+        self.address = slaveaddress
+        self.mode = mode
+        self.transactions = 0
+        self.device = controllers.setdefault((port, slaveaddress), Controller())
+        self._bus = _bus_locks.setdefault(port, threading.Lock())
+        self._log = bus_log.setdefault(port, [])
+
+    def _transaction(self, kind, register):
+        #A second transaction while one is on the bus is a collision
+        if not self._bus.acquire(blocking=False):
+            raise minimalmodbus.InvalidResponseError("Collision on {}".format(self.port))
+        try:
+            self.transactions += 1
+            self._log.append((self.address, kind, register))
+            if settings['frame_time']:
+                time.sleep(settings['frame_time'])
+        finally:
+            self._bus.release()
+
+    def read_register(self, registeraddress, number_of_decimals=0, functioncode=3, signed=False):
+        self._transaction('read', registeraddress)
+        value = self.device.read(registeraddress)
+        return value/10.0**number_of_decimals if number_of_decimals else value
+
+    def read_registers(self, registeraddress, number_of_registers, functioncode=3):
+        if number_of_registers > settings['max_block']:
+            raise minimalmodbus.IllegalRequestError("Too many registers")
+        self._transaction('read', registeraddress)
+        return [self.device.read(registeraddress + i) for i in range(number_of_registers)]
+
+    def write_register(self, registeraddress, value, number_of_decimals=0, functioncode=16, signed=False):
+        self._transaction('write', registeraddress)
+        self.device.write(registeraddress, int(round(value*10**number_of_decimals)))
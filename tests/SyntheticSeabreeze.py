@@ -0,0 +1,66 @@
+'''
+/*
+ * Copyright 2018 Chemios
+ * Synthetic Seabreeze
+ *
+ * Stand-in for seabreeze.spectrometers that produces synthetic spectra
+ *
+ */
+ '''
+import time
+import numpy as np
+
+PIXELS = 2048
+MAX_COUNTS = 65535
+DARK_COUNTS = 1000.0
+
+#Settings shared by every synthetic spectrometer; tests may change them
+settings = {
+            'transmission': 0.5,
+            'noise': 0.0,
+            'real_time': False,
+           }
+
+
+class Spectrometer(object):
+    '''Synthetic spectrometer with a gaussian lamp and a fixed transmission'''
+    max_intensity = MAX_COUNTS
+    integration_time_micros_limits = (10, 10000000)
+
+    def __init__(self, serial_number):
+        self.serial_number = serial_number
+        self.integration_time = 1000
+        self.wavelength_values = np.linspace(200.0, 1000.0, PIXELS)
+        self.lamp = np.exp(-((self.wavelength_values - 600.0)/150.0)**2)
+        self.calls = {'wavelengths': 0, 'intensities': 0}
+        #(start, stop) time.monotonic seconds of each reading
+        self.acquisitions = []
+        self._random = np.random.RandomState(0)
+
+    @classmethod
+    def from_serial_number(cls, spectrometer_model):
+        if isinstance(spectrometer_model, str):
+            return cls(spectrometer_model)
+
+    def integration_time_micros(self, integration_time):
+        self.integration_time = integration_time
+
+    def wavelengths(self):
+        self.calls['wavelengths'] += 1
+        return self.wavelength_values.copy()
+
+    def intensities(self, correct_dark_counts=True, correct_nonlinearity=True):
+        self.calls['intensities'] += 1
+        start = time.monotonic()
+        if settings['real_time']:
+            #Block for the integration time like a real detector
+            time.sleep(self.integration_time*1e-6)
+        self.acquisitions.append((start, time.monotonic()))
+        signal = 20.0*self.integration_time*self.lamp*settings['transmission']
+        counts = DARK_COUNTS + signal
+        if settings['noise']:
+            counts = counts + self._random.normal(0, settings['noise'], PIXELS)
+        return np.minimum(counts, MAX_COUNTS)
+
+    def close(self):
+        return
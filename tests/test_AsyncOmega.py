@@ -0,0 +1,74 @@
+from chemios.temperature_controllers import OmegaCN9300Series, AsyncOmegaCN9300Series
+import SyntheticModbus
+import minimalmodbus
+import asyncio
+import time
+import pytest
+
+
+@pytest.fixture()
+def controller(monkeypatch):
+    SyntheticModbus.reset()
+    SyntheticModbus.settings.update(max_block=125, frame_time=0.0, time_constant=60.0)
+    monkeypatch.setattr(minimalmodbus, 'Instrument', SyntheticModbus.Instrument)
+    controller = AsyncOmegaCN9300Series(OmegaCN9300Series('/dev/ttyUSB0', 1), timeout=1)
+    yield controller
+    controller.close()
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def test_get_and_set(controller):
+    async def main():
+        update = await controller.set_temperature(60)
+        assert update['temp_set_point'] == 60
+        async with controller.program() as session:
+            assert await session.set_temperature(61)
+        return await controller.get_current_temperature()
+    assert run(main())['temp_set_point'] == 61
+
+
+def test_stalled_controller_does_not_block_loop(controller):
+    SyntheticModbus.settings.update(frame_time=0.5)
+    ticks = []
+
+    async def ticker():
+        for i in range(10):
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.01)
+
+    async def main():
+        task = asyncio.ensure_future(ticker())
+        with pytest.raises(TimeoutError):
+            await controller.get_current_temperature(timeout=0.1)
+        await task
+    run(main())
+    assert len(ticks) == 10 and ticks[-1] - ticks[0] < 0.4
+
+
+def test_cancel_and_poll(controller):
+    async def main():
+        SyntheticModbus.settings.update(frame_time=0.2)
+        task = asyncio.ensure_future(controller.set_temperature(70))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        SyntheticModbus.settings.update(frame_time=0.0)
+        readings = []
+        poll = controller.poll(interval=0.05)
+        async for reading in poll:
+            readings.append(reading)
+            if len(readings) == 3:
+                break
+        await poll.aclose()
+        return readings
+    readings = run(main())
+    assert [sorted(reading) for reading in readings] == [['current_temp', 'temp_set_point', 'timestamp']]*3
+    assert readings[-1]['timestamp'] - readings[0]['timestamp'] >= 0.045
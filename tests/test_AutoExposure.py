@@ -0,0 +1,34 @@
+from chemios.spectrometers import OceanOptics, AutoExposure
+import SyntheticSeabreeze
+import pytest
+
+
+@pytest.fixture()
+def spec():
+    SyntheticSeabreeze.settings.update(transmission=0.5, noise=0.0, real_time=False)
+    with OceanOptics('FLMS02673', SyntheticSeabreeze) as spec:
+        yield spec
+
+
+@pytest.mark.parametrize('transmission', [0.001, 0.05, 0.5, 1.0])
+@pytest.mark.parametrize('initial', [None, 100, 1000000])
+def test_find_integration_time(spec, transmission, initial):
+    SyntheticSeabreeze.settings.update(transmission=transmission)
+    exposure = AutoExposure()
+    integration_time = exposure.find(spec, initial=initial)
+    peak = spec.read_frame(integration_time)['intensities'].max()
+    assert 0.6*65535 <= peak <= 0.85*65535
+    assert len(exposure.probes) <= exposure.max_probes
+
+
+def test_cache(spec):
+    exposure = AutoExposure()
+    integration_time = exposure.find(spec, sample_type='dye')
+    calls = spec.ocean_optics.calls['intensities']
+    assert exposure.find(spec, sample_type='dye') == integration_time
+    assert spec.ocean_optics.calls['intensities'] == calls
+    SyntheticSeabreeze.settings.update(transmission=0.05)
+    assert exposure.find(spec, sample_type='dark dye') > integration_time
+    #A refresh starts from the cached value
+    exposure.find(spec, sample_type='dye', refresh=True)
+    assert exposure.probes[0][0] == integration_time
@@ -0,0 +1,53 @@
+from chemios.spectrometers import OceanOptics, CalibrationStore
+from chemios.spectrometers._calibration import roi_key
+import SyntheticSeabreeze
+import numpy as np
+import time
+
+
+def test_save_load(tmp_path):
+    store = CalibrationStore(str(tmp_path), max_age={'dark': 60})
+    dark = np.linspace(900, 1100, 2048)
+    store.save('FLMS02673', 'dark', dark, 1000)
+    store.save('FLMS02673', 'blank', dark*2, 1000, reduction=([(300, 400)], 2))
+    assert np.allclose(store.load('FLMS02673', 'dark', 1000), dark)
+    assert store.load('FLMS02673', 'dark', 2000) is None
+    assert store.load('FLMS02673', 'blank', 1000) is None
+    assert store.load('FLMS02673', 'blank', 1000, ([(300, 400)], 2)) is not None
+
+    #A new store reads the index back, and stale darks are not loaded
+    store.save('FLMS02673', 'dark', dark, 1000, captured=time.time() - 120)
+    reopened = CalibrationStore(str(tmp_path), max_age={'dark': 60})
+    assert reopened.load('FLMS02673', 'dark', 1000) is None
+    assert reopened.age('FLMS02673', 'dark', 1000) >= 120
+    #Blanks have no max age
+    assert reopened.is_valid('FLMS02673', 'blank', 1000, ([(300, 400)], 2))
+    reopened.remove('FLMS02673', 'dark', 1000)
+    assert reopened.age('FLMS02673', 'dark', 1000) is None
+    assert roi_key(([(300, 400), (500, 700.5)], 4)) == 'roi300-400_500-700.5_bin4'
+    #Keys keep every digit of long integration times and ROI bounds
+    assert CalibrationStore.key('FLMS02673', 'dark', 1234567) != CalibrationStore.key('FLMS02673', 'dark', 1234570)
+    assert CalibrationStore.key('FLMS02673', 'dark', 1000.7) != CalibrationStore.key('FLMS02673', 'dark', 1000)
+    assert CalibrationStore.key('FLMS02673', 'dark', 1000.0) == 'FLMS02673/dark_1000us_full'
+    assert roi_key(([(400.0000001, 700)], 1)) != roi_key(([(400.0000002, 700)], 1))
+
+
+def test_oceanoptics_load_references(tmp_path):
+    SyntheticSeabreeze.settings.update(transmission=1.0, noise=0.0, real_time=False)
+    store = CalibrationStore(str(tmp_path), max_age=3600)
+    with OceanOptics('FLMS02673', SyntheticSeabreeze, calibration=store) as spec:
+        assert spec.load_references(1000) == ['dark', 'blank']
+        blank = spec.read_spectrometer_raw(1000, as_array=True)
+        dark = blank.copy()
+        dark[1] = SyntheticSeabreeze.DARK_COUNTS
+        spec.store_blank(blank, integration_time=1000)
+        spec.store_dark(dark, integration_time=1000)
+
+    SyntheticSeabreeze.settings.update(transmission=0.1)
+    with OceanOptics('FLMS02673', SyntheticSeabreeze, calibration=store) as spec:
+        assert spec.load_references(1000) == []
+        assert spec.load_references(2000) == ['dark', 'blank']
+        spec.set_reduction(rois=[(400, 700)], binning=2)
+        assert spec.load_references(1000) == []
+        wavelengths, absorbance = spec.absorbance_read(1000, 1, as_array=True)
+        assert np.allclose(absorbance, 1.0, atol=1e-4)
@@ -0,0 +1,158 @@
+from chemios.control import PID, SetpointProfile, RateLimiter, PumpActuator, SpectralSensor, TemperatureSensor, ControlLoop
+from chemios.spectrometers import OceanOptics, FeatureExtractor
+import SyntheticSeabreeze
+import math
+import time
+import pytest
+
+
+class FakePump(object):
+    def __init__(self):
+        self.rate = {'value': 0.0, 'units': 'mL/min'}
+        self.commands = []
+
+    def set_rate(self, rate):
+        self.rate = rate
+        self.commands.append(rate['value'])
+
+
+class Plant(object):
+    '''Concentration that follows the pump rate with a first order lag'''
+    def __init__(self, pump, gain=10.0, time_constant=0.1):
+        self.pump = pump
+        self.gain = gain
+        self.time_constant = time_constant
+        self.value = 0.0
+        self._last = time.monotonic()
+
+    def __call__(self):
+        now = time.monotonic()
+        target = self.gain*self.pump.rate['value']
+        self.value += (target - self.value)*(1 - math.exp(-(now - self._last)/self.time_constant))
+        self._last = now
+        return self.value, now
+
+
+def test_pid_anti_windup():
+    pid = PID(kp=1.0, ki=10.0, setpoint=10.0, output_limits=(0, 2))
+    for i in range(100):
+        assert pid.update(0.0, dt=0.1) == 2
+    #The integral did not wind up while saturated, so the output drops at once
+    assert pid.update(20.0, dt=0.1) < 2
+    reverse = PID(kp=1.0, setpoint=10.0, reverse=True, bias=1.0)
+    assert reverse.update(12.0, dt=0.1) == pytest.approx(3.0)
+    with pytest.raises(ValueError):
+        PID(kp=1.0, output_limits=(2, 1))
+
+
+def test_setpoint_profile():
+    profile = SetpointProfile([(10, 540), (0, 500)])
+    assert profile(-1) == 500
+    assert profile(5) == pytest.approx(520)
+    assert profile(20) == 540
+    assert profile.duration == 10
+
+
+def test_rate_limiter():
+    limiter = RateLimiter(minimum=0.1, maximum=2.0, max_rate=1.0, deadband=0.01)
+    assert limiter.limit(5.0, timestamp=0.0) == 2.0
+    assert limiter.limited
+    #At most 1 per second
+    assert limiter.limit(0.0, timestamp=0.5) == pytest.approx(1.5)
+    assert limiter.limit(1.505, timestamp=1.5) == pytest.approx(1.5)
+    assert limiter.limited
+
+
+def test_rate_limiter_after_hold():
+    limiter = RateLimiter(0, 2, max_rate=0.1)
+    #Held at the maximum for a minute, then asked for a large step
+    for t in range(61):
+        assert limiter.limit(5.0, timestamp=float(t)) == 2.0
+    assert limiter.limit(0.0, timestamp=61.0) == pytest.approx(1.9)
+    #Small slews each period still add up inside a deadband
+    limiter = RateLimiter(max_rate=0.1, deadband=0.005)
+    limiter.reset(1.0, timestamp=0.0)
+    for i in range(1, 101):
+        value = limiter.limit(0.0, timestamp=0.02*i)
+    assert value == pytest.approx(0.8)
+
+
+def test_pump_actuator_skips_repeats():
+    pump = FakePump()
+    actuator = PumpActuator(pump, units='mL/min', limiter=RateLimiter(minimum=0, maximum=1))
+    assert actuator(0.5) == 0.5
+    assert actuator(0.5001) == 0.5
+    assert actuator(3) == 1
+    assert pump.commands == [0.5, 1]
+    assert pump.rate == {'value': 1, 'units': 'mL/min'}
+
+
+def test_control_loop_tracks_setpoint():
+    pump = FakePump()
+    plant = Plant(pump)
+    pid = PID(kp=0.05, ki=1.0, output_limits=(0, 2))
+    actuator = PumpActuator(pump, limiter=RateLimiter(0, 2, max_rate=10))
+    profile = SetpointProfile([(0, 5), (0.5, 5), (0.6, 8)])
+    with ControlLoop(plant, pid, actuator, period=0.01, setpoint=profile) as loop:
+        time.sleep(1.5)
+    assert not loop.running
+    assert plant.value == pytest.approx(8, abs=0.2)
+    assert pump.rate['value'] == pytest.approx(0.8, abs=0.03)
+    record = loop.history[-1]
+    assert record['setpoint'] == 8
+    summary = loop.metrics.summary()
+    assert summary['iterations'] >= 100
+    assert summary['errors'] == 0
+    #Loose bounds: the metrics are measured, and no iteration stalled
+    assert 0 <= summary['jitter_p95'] < 0.5
+    assert 0 <= summary['latency_max'] < 0.5
+
+
+def test_control_loop_counts_overruns_and_errors():
+    calls = []
+
+    def slow_sensor():
+        calls.append(time.monotonic())
+        if len(calls) == 2:
+            raise IOError("No reading")
+        time.sleep(0.025)
+        return 1.0
+
+    loop = ControlLoop(slow_sensor, PID(kp=1.0), lambda output: output, period=0.01)
+    loop.start()
+    time.sleep(0.3)
+    loop.stop()
+    assert loop.metrics.errors == 1
+    assert loop.metrics.overruns >= loop.metrics.iterations
+    #Missed slots are skipped, so iterations start on the grid without bursts
+    gaps = [b - a for a, b in zip(calls[2:], calls[3:])]
+    assert min(gaps) > 0.02
+
+
+def test_spectral_sensor_reads_newest_frame():
+    SyntheticSeabreeze.settings.update(transmission=1.0, noise=0.0, real_time=True)
+    try:
+        with OceanOptics('FLMS02673', SyntheticSeabreeze) as spec:
+            spec.start_acquisition(2000, buffer_size=16)
+            time.sleep(0.05)
+            sensor = SpectralSensor(spec, FeatureExtractor(spec.get_wavelengths(), peak_window=(400, 800)),
+                                    timeout=1)
+            value, timestamp = sensor()
+            assert value == pytest.approx(600, abs=0.5)
+            #The newest frame was taken and older ones discarded
+            assert 0 <= time.monotonic() - timestamp < 0.5
+            assert len(spec.buffer) <= 1
+            spec.stop_acquisition()
+    finally:
+        SyntheticSeabreeze.settings.update(real_time=False)
+
+
+def test_temperature_sensor_stamps_before_read():
+    class Controller(object):
+        def get_current_temperature(self):
+            self.called = time.monotonic()
+            return {'temp_set_point': 60.0, 'current_temp': 50.0}
+    controller = Controller()
+    value, timestamp = TemperatureSensor(controller)()
+    assert value == 50.0
+    assert timestamp <= controller.called
@@ -0,0 +1,47 @@
+from chemios.spectrometers import FeatureExtractor
+import numpy as np
+import time
+import pytest
+
+wavelengths = np.linspace(300, 800, 2048)
+
+
+def gaussian(centre, sigma=10.0, height=1.0):
+    return height*np.exp(-0.5*((wavelengths - centre)/sigma)**2)
+
+
+def test_peak_features():
+    extractor = FeatureExtractor(wavelengths, peak_window=(400, 700), bands=[(500, 600)])
+    features = extractor.extract(gaussian(551.3, sigma=10, height=2.0), timestamp=1.5)
+    assert features['peak_wavelength'] == pytest.approx(551.3, abs=0.05)
+    assert features['peak_height'] == pytest.approx(2.0, rel=1e-3)
+    assert features['fwhm'] == pytest.approx(2*np.sqrt(2*np.log(2))*10, rel=1e-3)
+    assert features['bands'][0] == pytest.approx(2.0*10*np.sqrt(2*np.pi), rel=1e-3)
+    assert features['timestamp'] == 1.5
+
+
+def test_unresolved_peak():
+    extractor = FeatureExtractor(wavelengths, peak_window=(540, 560))
+    assert np.isnan(extractor.extract(gaussian(550, sigma=50))['fwhm'])
+
+
+def test_peak_tracking():
+    extractor = FeatureExtractor(wavelengths, track=5)
+    #A second, taller peak far away is found once the tracked peak leaves the search range
+    for centre in np.linspace(500, 520, 50):
+        frame = gaussian(centre) + gaussian(700, height=0.5)
+        assert extractor.extract(frame)['peak_wavelength'] == pytest.approx(centre, abs=0.05)
+    frames = [{'timestamp': i, 'intensities': gaussian(600)} for i in range(3)]
+    records = list(extractor.stream(frames))
+    assert [r['timestamp'] for r in records] == [0, 1, 2]
+    assert records[0]['peak_wavelength'] == pytest.approx(600, abs=0.05)
+
+
+def test_frames_per_second():
+    extractor = FeatureExtractor(wavelengths, peak_window=(400, 700), bands=[(450, 500), (550, 650)],
+                                 track=20)
+    frame = gaussian(550)
+    start = time.perf_counter()
+    for i in range(200):
+        extractor.extract(frame)
+    assert time.perf_counter() - start < 1.0
@@ -0,0 +1,87 @@
+from chemios.temperature_controllers import OmegaCN9300Series, ModbusBus
+from chemios.temperature_controllers._bus import frame_gap, WRITE, READ
+import SyntheticModbus
+import minimalmodbus
+import threading
+import time
+import pytest
+
+PORT = '/dev/ttyUSB0'
+
+
+@pytest.fixture()
+def bus(monkeypatch):
+    SyntheticModbus.reset()
+    SyntheticModbus.settings.update(max_block=125, frame_time=0.0, time_constant=60.0)
+    monkeypatch.setattr(minimalmodbus, 'Instrument', SyntheticModbus.Instrument)
+    with ModbusBus(PORT, baudrate=115200) as bus:
+        yield bus
+
+
+def test_frame_gap():
+    assert frame_gap(9600) == pytest.approx(0.00401, abs=1e-5)
+    assert frame_gap(115200) == 0.00175
+
+
+def test_default_baudrate(monkeypatch):
+    class Instrument(SyntheticModbus.Instrument):
+        def __init__(self, *args, **kwargs):
+            super(Instrument, self).__init__(*args, **kwargs)
+            #minimalmodbus opens its ports at 19200 baud
+            self.serial = type('Serial', (object,), {'baudrate': 19200})()
+    SyntheticModbus.reset()
+    monkeypatch.setattr(minimalmodbus, 'Instrument', Instrument)
+    with ModbusBus(PORT) as bus:
+        instrument = bus.instrument(1).instrument
+    assert instrument.serial.baudrate == 19200
+
+
+def test_poll_16_zones(bus):
+    SyntheticModbus.settings.update(frame_time=0.02)
+    zones = [OmegaCN9300Series(PORT, address, bus=bus) for address in range(1, 17)]
+    readings = []
+    bus.start_polling(zones, interval=1.0, callback=lambda address, reading: readings.append(address))
+    time.sleep(1.5)
+    assert sorted(bus.readings) == list(range(1, 17))
+    assert len(readings) >= 16 and max(bus.cycle_times) < 1.0
+    assert bus.overruns == 0
+
+    #Writes from other threads while polling neither collide nor wait for the cycle
+    errors = []
+    def ramp(zone):
+        try:
+            for setpoint in (30, 35, 40):
+                zone.set_temperature(setpoint)
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=ramp, args=(zone,)) for zone in zones[:4]]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    bus.stop_polling()
+    assert errors == []
+    for zone in zones[:4]:
+        assert SyntheticModbus.controllers[(PORT, zone.slave_address)].setpoint == 40
+
+
+def test_writes_first(bus):
+    order = []
+    blocker = threading.Event()
+    bus.submit(READ, blocker.wait)
+    futures = [bus.submit(READ, order.append, 'read'),
+               bus.submit(WRITE, order.append, 'write')]
+    blocker.set()
+    for future in futures:
+        future.result()
+    assert order == ['write', 'read']
+
+
+def test_errors_and_close(bus):
+    with pytest.raises(ZeroDivisionError):
+        bus.execute(READ, lambda: 1/0)
+    with pytest.raises(ValueError):
+        OmegaCN9300Series('/dev/ttyUSB1', 1, bus=bus)
+    bus.close()
+    with pytest.raises(IOError):
+        bus.submit(READ, time.time)
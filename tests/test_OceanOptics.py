@@ -0,0 +1,203 @@
+from chemios.spectrometers import OceanOptics, ScanAverager, batch_absorbance, iter_absorbance, batch_fluorescence
+import SyntheticSeabreeze
+import numpy as np
+import time
+import pytest
+
+
+def trapezoid(y, x):
+    return np.sum(np.diff(x)*(y[1:] + y[:-1])/2)
+
+
+@pytest.fixture()
+def spec():
+    '''Connected spectrometer with blank and dark stored'''
+    SyntheticSeabreeze.settings.update(transmission=1.0, noise=0.0)
+    spectrometer = OceanOptics('FLMS02673', SyntheticSeabreeze)
+    with spectrometer as spec:
+        blank = spec.read_spectrometer_raw(1000, as_array=True)
+        dark = blank.copy()
+        dark[1] = SyntheticSeabreeze.DARK_COUNTS
+        spec.store_blank(blank)
+        spec.store_dark(dark)
+        SyntheticSeabreeze.settings.update(transmission=0.1)
+        yield spec
+
+
+def test_read_spectrometer_raw(spec):
+    output = spec.read_spectrometer_raw(1000)
+    assert isinstance(output, list) and isinstance(output[1][0], float)
+    array = spec.read_spectrometer_raw(1000, as_array=True)
+    assert array.shape == (2, SyntheticSeabreeze.PIXELS)
+    assert array.flags['C_CONTIGUOUS']
+    assert np.allclose(array, output)
+
+
+def test_absorbance_read(spec):
+    wavelengths, absorbance = spec.absorbance_read(1000, 3, filter=300, as_array=True)
+    assert len(wavelengths) == SyntheticSeabreeze.PIXELS - 300
+    #Transmission of 10% is an absorbance of 1
+    assert np.allclose(absorbance, 1.0)
+    output = spec.absorbance_read(1000, 3, filter=300, normalized=True)
+    assert np.allclose(output[1], 1.0)
+    assert len(output[0]) == len(output[1])
+
+
+def test_cached_wavelengths_and_references(spec):
+    device = spec.ocean_optics
+    device.calls['wavelengths'] = 0
+    for i in range(5):
+        spec.absorbance_read(1000, 1, filter=100, as_array=True)
+    assert device.calls['wavelengths'] == 0
+    assert (100, 1000) in spec._references
+    spec.store_blank(spec.read_spectrometer_raw(1000, as_array=True))
+    assert spec._references == {}
+    spec.spectrometer_model = 'FLMS00001'
+    spec.get_wavelengths()
+    assert device.calls['wavelengths'] == 1
+
+
+def test_reference_integration_time(spec):
+    spec.store_dark(spec.read_spectrometer_raw(2000, as_array=True), integration_time=2000)
+    with pytest.raises(ValueError):
+        spec.absorbance_read(1000, 1)
+
+
+def test_continuous_acquisition(spec):
+    spec.start_acquisition(1000, buffer_size=8)
+    frames = []
+    for frame in spec.stream(timeout=1):
+        frames.append(frame)
+        if len(frames) == 20:
+            break
+    wavelengths, absorbance = spec.absorbance_read(1000, 2, as_array=True)
+    with pytest.raises(ValueError):
+        spec.read_spectrometer_raw(2000)
+    spec.stop_acquisition()
+    assert not spec.acquiring
+    timestamps = [frame['timestamp'] for frame in frames]
+    assert timestamps == sorted(timestamps)
+    assert frames[0]['intensities'].shape == (SyntheticSeabreeze.PIXELS,)
+    assert np.allclose(absorbance[300:1800], 1.0)
+    assert spec.frames_acquired >= 22
+    assert len(spec.buffer) <= 8
+    #Remaining frames drain, then the stream ends
+    remaining = len(spec.buffer)
+    assert len(list(spec.stream())) == remaining
+    assert spec.get_frame() is None
+
+
+def test_reads_leave_frames_for_stream(spec):
+    spec.start_acquisition(1000, buffer_size=1000)
+    first = spec.get_frame(timeout=1)
+    start = time.monotonic()
+    frame = spec.read_frame(1000)
+    spec.absorbance_read(1000, 3, as_array=True)
+    spec.read_spectrometer_raw(1000)
+    spec.stop_acquisition()
+    assert frame['timestamp'] > start
+    #Every frame is still there for the stream
+    indices = [first['index']] + [frame['index'] for frame in spec.stream()]
+    assert indices == list(range(indices[0], indices[0] + len(indices)))
+    assert spec.frames_dropped == 0
+
+
+def test_zero_scans(spec):
+    with pytest.raises(ValueError):
+        spec.absorbance_read(1000, 0)
+    with pytest.raises(ValueError):
+        spec.fluorescence_read(1000, 0)
+
+
+def test_scan_averager():
+    scans = np.random.RandomState(1).normal(100, 5, (200, 64))
+    averager = ScanAverager(64)
+    for scan in scans:
+        averager.add(scan)
+    assert np.allclose(averager.mean, scans.mean(axis=0))
+    assert np.allclose(averager.variance, scans.var(axis=0, ddof=1))
+    assert np.allclose(averager.noise, scans.std(axis=0, ddof=1)/np.sqrt(200))
+    ema = ScanAverager(64, mode='ema', alpha=0.2)
+    for scan in scans:
+        ema.add(scan)
+    assert np.allclose(ema.mean, 100, atol=10)
+    assert np.allclose(np.sqrt(ema.variance), 5, atol=3)
+
+
+def test_absorbance_target_snr(spec):
+    SyntheticSeabreeze.settings.update(noise=20.0)
+    spec.absorbance_read(1000, 500, filter=300, target_snr=50)
+    assert 1 < spec.averager.count < 500
+    spec.absorbance_read(1000, 5, averaging='ema', alpha=0.5)
+    assert spec.averager.count == 5
+
+
+def test_batch_absorbance(tmp_path):
+    dark = np.full(64, 1000.0)
+    blank = np.full(64, 11000.0)
+    transmission = np.random.RandomState(2).uniform(0.01, 1, (500, 1))
+    intensities = dark + (blank - dark)*transmission*np.ones(64)
+    expected = -np.log10(transmission)*np.ones(64)
+    assert np.allclose(batch_absorbance(intensities, dark, blank), expected)
+    out = np.memmap(str(tmp_path/'absorbance.f32'), np.float32, 'w+', shape=intensities.shape)
+    batch_absorbance(intensities, dark, [np.arange(64), blank], chunk_frames=64, out=out)
+    assert np.allclose(out, expected, atol=1e-5)
+    chunks = list(iter_absorbance(intensities, dark, blank, chunk_frames=128))
+    assert [start for start, chunk in chunks] == [0, 128, 256, 384]
+    assert chunks[0][1].dtype == np.float32
+    assert np.allclose(np.concatenate([chunk for start, chunk in chunks]), expected, atol=1e-5)
+
+
+def test_batch_fluorescence():
+    wavelengths = np.linspace(300, 800, 501)
+    dark = np.full(501, 1000.0)
+    leak = dark + 5000*np.exp(-((wavelengths - 400)/5)**2)
+    emission = np.exp(-((wavelengths - 600)/20)**2)
+    scales = np.array([[0.5], [1.0], [2.0]])
+    intensities = dark + 100*scales*emission + scales*(leak - dark)
+    result = batch_fluorescence(intensities, dark, wavelengths, bands=[(550, 650)],
+                                leak=leak, excitation_band=(380, 420))
+    assert np.allclose(result['fluorescence'], 100*scales*emission, atol=1e-6)
+    expected = [trapezoid(100*s*emission[250:351], wavelengths[250:351]) for s in scales[:, 0]]
+    assert np.allclose(result['bands'][:, 0], expected)
+
+
+def test_fluorescence_read(spec):
+    spectrum, areas = spec.fluorescence_read(1000, 2, filter=100, bands=[(500, 550), (600, 700)],
+                                             as_array=True)
+    assert spectrum.shape == (2, SyntheticSeabreeze.PIXELS - 100)
+    assert areas.shape == (2,)
+    assert np.allclose(areas, [trapezoid(spectrum[1][(spectrum[0] >= a) & (spectrum[0] <= b)],
+                                            spectrum[0][(spectrum[0] >= a) & (spectrum[0] <= b)])
+                               for a, b in [(500, 550), (600, 700)]])
+    with pytest.raises(ValueError):
+        spec.fluorescence_read(1000, 1, excitation_band=(380, 420))
+
+
+def test_reduction(spec):
+    raw = spec.read_spectrometer_raw(1000, as_array=True)
+    spec.set_reduction(rois=[(300, 400), (500, 700)], binning=4)
+    wavelengths = spec.get_wavelengths()
+    assert len(wavelengths) == spec.reducer.pixels < SyntheticSeabreeze.PIXELS/8
+    assert len(spec.get_wavelengths(raw=True)) == SyntheticSeabreeze.PIXELS
+    assert np.all(np.diff(wavelengths) > 0)
+    reduced = spec.read_spectrometer_raw(1000, as_array=True)
+    assert reduced.shape == (2, len(wavelengths))
+    #Raw blank and dark stored before the reduction still apply
+    absorbance = spec.absorbance_read(1000, 2, as_array=True)
+    assert absorbance.shape == reduced.shape
+    assert np.allclose(absorbance[1], 1.0)
+    spec.start_acquisition(1000, buffer_size=4)
+    frame = spec.get_frame(timeout=5)
+    spec.stop_acquisition()
+    assert frame['intensities'].shape == (len(wavelengths),)
+    #Reduced references must match the reduction
+    spec.store_dark(reduced)
+    spec.set_reduction(rois=[(300, 400)])
+    with pytest.raises(ValueError):
+        spec.absorbance_read(1000, 1)
+    spec.set_reduction()
+    assert spec.read_spectrometer_raw(1000, as_array=True).shape == raw.shape
+    with pytest.raises(ValueError):
+        spec.set_reduction(rois=[(500, 700), (300, 400)])
+    assert spec.reducer is None
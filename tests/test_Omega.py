@@ -0,0 +1,131 @@
+from chemios.temperature_controllers import OmegaCN9300Series
+import SyntheticModbus
+import minimalmodbus
+import time
+import pytest
+
+
+@pytest.fixture()
+def omega(monkeypatch):
+    SyntheticModbus.reset()
+    SyntheticModbus.settings.update(max_block=125, frame_time=0.0, time_constant=60.0)
+    monkeypatch.setattr(minimalmodbus, 'Instrument', SyntheticModbus.Instrument)
+    return OmegaCN9300Series('/dev/ttyUSB0', 1)
+
+
+def test_poll_reads_temperature_only(omega):
+    #The constructor read the setpoint and the temperature
+    assert omega.transactions == 2
+    update = omega.get_current_temperature()
+    assert update == {'temp_set_point': 25.0, 'current_temp': 25.0}
+    assert omega.transactions == 3
+    assert SyntheticModbus.bus_log['/dev/ttyUSB0'][-1] == (1, 'read', 28)
+
+
+def test_set_temperature(omega):
+    update = omega.set_temperature(80.0)
+    assert update['temp_set_point'] == 80.0
+    assert SyntheticModbus.controllers[('/dev/ttyUSB0', 1)].setpoint == 80.0
+    #Five writes and one read
+    assert omega.transactions == 2 + 6
+
+
+def test_cache_invalidation(omega):
+    SyntheticModbus.controllers[('/dev/ttyUSB0', 1)].setpoint = 50.0
+    assert omega.get_current_temperature()['temp_set_point'] == 25.0
+    omega.invalidate_cache()
+    assert omega.get_current_temperature()['temp_set_point'] == 50.0
+    omega.setpoint_max_age = 0
+    transactions = omega.transactions
+    omega.get_current_temperature()
+    assert omega.transactions == transactions + 2
+
+
+def test_lock_function_codes(omega, monkeypatch):
+    calls = []
+    write_register = omega.controller.write_register
+    def record(register, value, decimals, functioncode):
+        calls.append((register, functioncode))
+        write_register(register, value, decimals, functioncode)
+    monkeypatch.setattr(omega.controller, 'write_register', record)
+    omega.set_temperature(60.0)
+    #Same function codes as the unlock, write and lock sequence has always used
+    assert calls == [(768, 6), (5376, 16), (127, 6), (768, 16), (5632, 16)]
+
+
+def test_device_info(omega):
+    assert omega.get_device_info() == SyntheticModbus.DEVICE_INFO
+    transactions = omega.transactions
+    omega.get_device_info()
+    assert omega.transactions == transactions
+
+
+def test_programming_session(omega):
+    device = SyntheticModbus.controllers[('/dev/ttyUSB0', 1)]
+    transactions = omega.transactions
+    with omega.program():
+        assert not device.locked
+        with omega.program() as session:
+            for setpoint in range(30, 40):
+                update = omega.set_temperature(setpoint)
+                assert update == {'temp_set_point': setpoint, 'current_temp': 25.0}
+            assert session.set_temperature(45)
+        assert not device.locked
+    assert device.locked
+    assert device.setpoint == 45
+    #Unlock, eleven setpoints and lock
+    assert omega.transactions == transactions + 2 + 11 + 2
+
+
+def test_coalesced_setpoints(omega):
+    import threading
+    device = SyntheticModbus.controllers[('/dev/ttyUSB0', 1)]
+    with omega.program(min_interval=0.2) as session:
+        session.set_temperature(30)
+        threads = [threading.Thread(target=session.set_temperature, args=(setpoint,))
+                   for setpoint in (31, 32, 33)]
+        for thread in threads:
+            thread.start()
+            thread.join(0.02)
+        for thread in threads:
+            thread.join()
+    setpoints = [value/10 for register, value in device.writes if register == 127]
+    assert setpoints[0] == 30 and setpoints[-1] == 33
+    assert len(setpoints) < 4
+
+
+def test_session_interval_applies_to_set_temperature(omega):
+    device = SyntheticModbus.controllers[('/dev/ttyUSB0', 1)]
+    start = time.monotonic()
+    with omega.program(min_interval=0.1):
+        for setpoint in (30, 31, 32):
+            omega.set_temperature(setpoint)
+    assert time.monotonic() - start >= 0.2
+    assert [value/10 for register, value in device.writes if register == 127] == [30, 31, 32]
+    assert device.locked
+
+
+def test_newest_setpoint_written_last(omega):
+    import threading
+    device = SyntheticModbus.controllers[('/dev/ttyUSB0', 1)]
+    for round_ in range(20):
+        with omega.program() as session:
+            threads = [threading.Thread(target=session.set_temperature, args=(30 + i,)) for i in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        #The setpoint queued last, whatever thread it came from, is the one left on the controller
+        number, setpoint = omega._pending_setpoint
+        assert omega._written_setpoint == number
+        assert device.setpoint == setpoint
+
+
+def test_submit_writes_only_newest(omega):
+    device = SyntheticModbus.controllers[('/dev/ttyUSB0', 1)]
+    with omega.program(min_interval=0.05) as session:
+        for setpoint in range(30, 80):
+            session.submit(setpoint)
+    setpoints = [value/10 for register, value in device.writes if register == 127]
+    assert setpoints[-1] == 79 and len(setpoints) < 50
+    assert device.setpoint == 79 and device.locked
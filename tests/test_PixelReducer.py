@@ -0,0 +1,44 @@
+from chemios.spectrometers import PixelReducer
+import numpy as np
+import pytest
+
+
+@pytest.fixture()
+def wavelengths():
+    return np.linspace(200.0, 1000.0, 801)
+
+
+def test_whole_spectrum_binning(wavelengths):
+    reducer = PixelReducer(wavelengths, binning=4)
+    assert reducer.pixels == 200
+    assert np.allclose(reducer.wavelengths[:2], [201.5, 205.5])
+    stack = np.arange(2*801, dtype=np.float64).reshape(2, 801)
+    reduced = reducer.reduce(stack)
+    assert reduced.shape == (2, 200)
+    assert np.allclose(reduced[1, 0], 801 + 1.5)
+
+
+def test_rois(wavelengths):
+    reducer = PixelReducer(wavelengths, rois=[(300, 309), (500, 504)])
+    assert np.allclose(reducer.wavelengths, list(range(300, 310)) + list(range(500, 505)))
+    values = np.arange(801.0)
+    reduced = reducer.reduce(values)
+    assert np.allclose(reduced, reducer.wavelengths - 200)
+    #The result never aliases the input
+    reduced[0] = -1
+    assert values[100] == 100
+
+
+@pytest.mark.parametrize('rois,binning', [
+    ([(500, 600), (550, 650)], 1),
+    ([(300, 301)], 4),
+    (None, 0),
+])
+def test_invalid(wavelengths, rois, binning):
+    with pytest.raises(ValueError):
+        PixelReducer(wavelengths, rois, binning)
+
+
+def test_wrong_pixels(wavelengths):
+    with pytest.raises(ValueError):
+        PixelReducer(wavelengths).reduce(np.zeros(800))
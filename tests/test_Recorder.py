@@ -0,0 +1,111 @@
+from chemios.recording import Recorder
+import numpy as np
+import glob
+import json
+import os
+import pytest
+
+
+def load_column(path, stream, column):
+    files = sorted(glob.glob(os.path.join(path, stream, column, '*.npy')))
+    return np.concatenate([np.load(f) for f in files])
+
+
+def test_record_pump_and_temperature(tmp_path):
+    path = str(tmp_path)
+    with Recorder(path, chunk_size=16, fmt='npy') as recorder:
+        for i in range(40):
+            recorder.record('pump_1', {'name': 'ChemyxPump', 'syringe_diameter': None,
+                                       'rate': {'value': '{:.3f}'.format(i), 'units': 'mL/min'}})
+            recorder.record('oven', {'temp_set_point': 80.0, 'current_temp': 20.0 + i})
+    rates = load_column(path, 'pump_1', 'rate.value')
+    assert np.allclose(rates, np.arange(40))
+    assert list(load_column(path, 'pump_1', 'rate.units')) == ['mL/min']*40
+    assert np.allclose(load_column(path, 'oven', 'current_temp'), 20 + np.arange(40))
+    timestamps = load_column(path, 'oven', 'timestamp')
+    assert np.all(np.diff(timestamps) >= 0)
+    with open(os.path.join(path, 'run.json')) as f:
+        metadata = json.load(f)
+    assert metadata['streams']['pump_1']['rows'] == 40
+    assert metadata['streams']['pump_1']['chunks'] == 3
+
+
+def test_record_spectra(tmp_path):
+    path = str(tmp_path)
+    spectrum = [list(np.linspace(300, 800, 64)), list(np.random.rand(64))]
+    with Recorder(path, chunk_size=8, fmt='npy') as recorder:
+        for i in range(10):
+            recorder.record('uv_vis', spectrum)
+    values = load_column(path, 'uv_vis', 'value')
+    assert values.shape == (10, 2, 64)
+    assert np.allclose(values[3], spectrum)
+
+
+def test_decreasing_timestamp(tmp_path):
+    with Recorder(str(tmp_path), fmt='npy') as recorder:
+        recorder.record('oven', {'current_temp': 20.0}, timestamp=2.0)
+        with pytest.raises(ValueError):
+            recorder.record('oven', {'current_temp': 21.0}, timestamp=1.0)
+
+
+def test_object_column_keeps_its_type(tmp_path):
+    path = str(tmp_path)
+    with Recorder(path, chunk_size=4, fmt='npy') as recorder:
+        for value in ['1.5', '2.5', '3.5', '4.5', 'error', '6.5']:
+            recorder.record('pump_1', {'status': value})
+    chunks = sorted(glob.glob(os.path.join(path, 'pump_1', 'status', '*.npy')))
+    #The first chunk made the column float, so the string becomes NaN rather than a str chunk
+    assert [np.load(f).dtype for f in chunks] == [np.float64, np.float64]
+    values = load_column(path, 'pump_1', 'status')
+    assert np.isnan(values[4]) and values[5] == 6.5
+
+
+def test_parquet_round_trip(tmp_path):
+    pytest.importorskip('pyarrow')
+    from chemios.recording import RunReader
+    path = str(tmp_path)
+    spectrum = np.random.RandomState(0).rand(2, 16)
+    #Parquet is the default when pyarrow is installed
+    with Recorder(path, chunk_size=4) as recorder:
+        for i in range(10):
+            recorder.record('pump_1', {'rate': {'value': float(i), 'units': 'mL/min'},
+                                       'status': 'error' if i == 6 else str(i)}, timestamp=float(i))
+            recorder.record('uv_vis', spectrum, timestamp=float(i))
+    assert len(glob.glob(os.path.join(path, 'pump_1', '*.parquet'))) == 3
+    run = RunReader(path)
+    chunks = list(run.chunks('pump_1', ['rate.value', 'rate.units', 'status']))
+    rates = np.concatenate([chunk['rate.value'] for chunk in chunks])
+    assert np.allclose(rates, np.arange(10))
+    assert list(np.concatenate([chunk['rate.units'] for chunk in chunks])) == ['mL/min']*10
+    status = np.concatenate([chunk['status'] for chunk in chunks])
+    assert status.dtype == np.float64 and np.isnan(status[6]) and status[7] == 7
+    spectra = np.concatenate([chunk['value'] for chunk in run.chunks('uv_vis', ['value'])])
+    assert spectra.shape == (10, 2, 16)
+    assert np.allclose(spectra[9], spectrum)
+
+
+def test_reading_timestamp_and_names(tmp_path):
+    path = str(tmp_path)
+    with Recorder(path, chunk_size=4, fmt='npy') as recorder:
+        recorder.record('oven', {'current_temp': 20.0, 'timestamp': 1234.5}, timestamp=1.0)
+        with pytest.raises(ValueError):
+            recorder.record('oven', {'../escape': 1.0})
+        with pytest.raises(ValueError):
+            recorder.record('../escape', {'current_temp': 1.0})
+    #The recorder's time column is kept and the reading's own timestamp is renamed
+    assert list(load_column(path, 'oven', 'timestamp')) == [1.0]
+    assert list(load_column(path, 'oven', 'reading_timestamp')) == [1234.5]
+    assert not os.path.exists(os.path.join(str(tmp_path), '..', 'escape'))
+
+
+def test_spectra_chunks_bounded_in_bytes(tmp_path):
+    path = str(tmp_path)
+    spectrum = np.ones((2, 2048))
+    with Recorder(path, chunk_bytes=2**20, fmt='npy') as recorder:
+        for i in range(100):
+            recorder.record('uv_vis', spectrum)
+            recorder.record('oven', {'current_temp': 20.0})
+        #A row of the spectrum stream is about 32 kB, so a chunk holds 31 of them
+        assert recorder.streams['uv_vis'].chunk_size == 31
+        assert recorder.streams['oven'].chunk_size == 4096
+    assert load_column(path, 'uv_vis', 'value').shape == (100, 2, 2048)
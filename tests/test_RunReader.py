@@ -0,0 +1,72 @@
+from chemios.recording import Recorder, RunReader
+import numpy as np
+import pytest
+
+
+@pytest.fixture()
+def run(tmp_path):
+    '''Record a sine wave temperature log and a pump log'''
+    path = str(tmp_path)
+    with Recorder(path, chunk_size=100, fmt='npy') as recorder:
+        for i in range(1000):
+            t = i*0.1
+            recorder.record('oven', {'temp_set_point': 80.0, 'current_temp': np.sin(t)}, timestamp=t)
+            recorder.record('pump_1', {'rate': {'value': i, 'units': 'mL/min'}}, timestamp=t)
+            recorder.record('pump_2', {'rate': {'value': -i, 'units': 'mL/min'}}, timestamp=t)
+    return RunReader(path)
+
+
+def test_streams_and_columns(run):
+    assert run.streams == ['oven', 'pump_1', 'pump_2']
+    assert 'current_temp' in run.columns('oven')
+    assert run.time_range('oven') == pytest.approx((0.0, 99.9))
+
+
+def test_time_range_selection(run):
+    chunks = list(run.chunks('oven', ['current_temp'], start=12.0, stop=25.0))
+    timestamps = np.concatenate([c['timestamp'] for c in chunks])
+    assert timestamps[0] == pytest.approx(12.0)
+    assert timestamps[-1] == pytest.approx(24.9)
+    assert len(timestamps) == 130
+
+
+def test_select_streams(run):
+    names = set(name for name, chunk in run.select('pump_*', ['rate.value'], stop=5))
+    assert names == {'pump_1', 'pump_2'}
+
+
+def test_minmax(run):
+    envelope = run.minmax('pump_1', 'rate.value', buckets=10)
+    assert len(envelope['timestamp']) == 10
+    assert np.array_equal(envelope['min'], np.arange(0, 1000, 100))
+    assert np.array_equal(envelope['max'], np.arange(99, 1000, 100))
+    assert envelope['count'].sum() == 1000
+
+
+def test_lttb(run):
+    timestamps, values = run.lttb('oven', 'current_temp', points=50)
+    assert len(timestamps) == 50
+    assert timestamps[0] == 0.0
+    assert timestamps[-1] == pytest.approx(99.9)
+    assert np.all(np.diff(timestamps) > 0)
+    #The extremes of the sine wave survive downsampling
+    assert values.max() > 0.99 and values.min() < -0.99
+
+
+def test_parquet_reads_requested_columns(tmp_path, monkeypatch):
+    pq = pytest.importorskip('pyarrow.parquet')
+    path = str(tmp_path)
+    with Recorder(path, chunk_size=10, fmt='parquet') as recorder:
+        for i in range(20):
+            recorder.record('oven', {'temp_set_point': 80.0, 'current_temp': float(i)}, timestamp=float(i))
+    requested = []
+    read = pq.ParquetFile.read
+
+    def record_columns(self, columns=None, **kwargs):
+        requested.append(columns)
+        return read(self, columns=columns, **kwargs)
+    monkeypatch.setattr(pq.ParquetFile, 'read', record_columns)
+    chunks = list(RunReader(path).chunks('oven', ['current_temp', 'missing']))
+    assert requested == [['timestamp', 'current_temp']]*2
+    assert np.allclose(np.concatenate([c['current_temp'] for c in chunks]), np.arange(20))
+    assert np.all(np.isnan(chunks[0]['missing']))
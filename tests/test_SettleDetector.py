@@ -0,0 +1,65 @@
+from chemios.temperature_controllers import SettleDetector
+import numpy as np
+import math
+import pytest
+
+
+def step(seed, time_constant=60.0, start=25.0, final=80.0, noise=0.05, dead_time=0.0):
+    '''Quantized readings of a first order step, one per second'''
+    random = np.random.RandomState(seed)
+    for t in range(3000):
+        true = final - (final - start)*math.exp(-max(t - dead_time, 0)/time_constant)
+        yield float(t), round(true + random.normal(0, noise), 1), true
+
+
+@pytest.mark.parametrize('tolerance', [0.5, 0.2])
+def test_stable_only_within_tolerance(tolerance):
+    fixed_wait = 10*60.0
+    for seed in range(5):
+        detector = SettleDetector(tolerance=tolerance, setpoint=80)
+        for t, reading, true in step(seed):
+            if detector.update(reading, t):
+                break
+        assert abs(true - 80) <= tolerance
+        assert t < fixed_wait
+
+
+@pytest.mark.parametrize('dead_time', [8.0, 30.0])
+def test_dead_time(dead_time):
+    for seed in range(3):
+        detector = SettleDetector(tolerance=0.5, setpoint=80)
+        for t, reading, true in step(seed, dead_time=dead_time):
+            stable = detector.update(reading, t)
+            if t < dead_time:
+                assert detector.awaiting_response and detector.time_to_settle is None
+            if stable:
+                break
+        assert abs(true - 80) <= 0.5
+        assert detector.offset == pytest.approx(0, abs=0.5)
+        assert t < dead_time + 10*60.0
+
+
+def test_fit_and_prediction():
+    detector = SettleDetector(tolerance=0.5)
+    for t, reading, true in step(0):
+        detector.update(reading, t)
+        if t == 120:
+            break
+    assert detector.time_constant == pytest.approx(60, rel=0.1)
+    assert detector.final_temperature == pytest.approx(80, abs=1.5)
+    ideal = 60*math.log(55/0.5) - 120
+    assert detector.time_to_settle == pytest.approx(ideal, rel=0.25)
+    assert not detector.stable
+
+
+def test_flat_and_new_setpoint():
+    detector = SettleDetector(tolerance=0.5, min_samples=5)
+    assert detector.time_to_settle is None
+    for t in range(10):
+        detector.add({'temp_set_point': 25.0, 'current_temp': 25.0 + 0.1*(t % 2), 'timestamp': float(t)})
+    assert detector.stable
+    assert detector.offset == pytest.approx(0.05, abs=0.05)
+    detector.add({'temp_set_point': 60.0, 'current_temp': 25.1, 'timestamp': 10.0})
+    assert detector.samples == 1 and not detector.stable
+    with pytest.raises(ValueError):
+        detector.update(25.0, 5.0)
@@ -0,0 +1,110 @@
+from chemios.simulation import (DeviceServer, HarvardApparatusSimulator, NewEraSimulator, ModbusBusSimulator,
+                                SimulatedSeabreeze, SimulationHarness, scale_benchmark)
+from chemios.simulation import _harness
+from chemios.simulation._modbus import crc16
+from chemios.pumps import HarvardApparatus, NewEra
+from chemios.temperature_controllers import OmegaCN9300Series
+from chemios.spectrometers import OceanOptics
+import numpy as np
+import os
+import serial
+import threading
+import time
+import pytest
+
+pytestmark = pytest.mark.skipif(not hasattr(os, 'openpty'), reason="needs pseudo-terminals")
+
+
+@pytest.fixture()
+def server():
+    server = DeviceServer()
+    server.start()
+    yield server
+    server.stop()
+
+
+def test_crc16():
+    #Read holding registers 0x006B-0x006D of slave 17, from the Modbus specification
+    assert crc16(bytes([0x11, 0x03, 0x00, 0x6B, 0x00, 0x03])) == bytes([0x76, 0x87])
+
+
+def test_pumps_on_pseudo_terminals(server):
+    ha = server.add(HarvardApparatusSimulator())
+    ne = server.add(NewEraSimulator(address=1))
+    pump = HarvardApparatus('Phd-Ultra', serial.Serial(ha.port, 9600, timeout=0))
+    pump.set_rate({'value': 0.25, 'units': 'mL/min'})
+    #The flushOutput before the next command would discard an unread one
+    time.sleep(0.05)
+    pump.run()
+    other = NewEra('NE-1000', 1, ser=serial.Serial(ne.port, 9600, timeout=0.1))
+    other.run()
+    time.sleep(0.1)
+    assert ha.running and ha.rate == pytest.approx(0.25)
+    assert ne.running
+    assert ha.commands == 3 and ne.commands == 2
+
+
+def test_omega_over_modbus_rtu(server):
+    bus = server.add(ModbusBusSimulator())
+    zone = bus.add_slave(3)
+    zone.time_constant = 0.1
+    omega = OmegaCN9300Series(bus.port, 3)
+    omega.set_temperature(60)
+    assert zone.setpoint == 60 and zone.locked
+    time.sleep(0.5)
+    assert omega.get_current_temperature()['current_temp'] == pytest.approx(60, abs=1)
+    assert omega.get_device_info() == 9311
+    assert bus.errors == 0
+
+
+def test_simulated_seabreeze():
+    seabreeze = SimulatedSeabreeze()
+    device = seabreeze.add_device('SIM00001', signal=lambda: 1.0, real_time=False)
+    with OceanOptics('SIM00001', seabreeze) as spec:
+        wavelengths, intensities = spec.read_spectrometer_raw(1000, as_array=True)
+    assert wavelengths[np.argmax(intensities)] == pytest.approx(550, abs=10)
+    assert device.frames == 1
+    with pytest.raises(IOError):
+        OceanOptics('SIM00002', seabreeze)
+
+
+class FailingPump(object):
+    def __init__(self):
+        self.commands = 0
+
+    def set_rate(self, rate):
+        self.commands += 1
+        raise IOError("no reply")
+
+
+def test_drive_pump_gives_up_on_failing_pump(monkeypatch):
+    monkeypatch.setattr(_harness, 'PUMP_RETRY_DELAY', (0.001, 0.004))
+    pump = FailingPump()
+    latencies = []
+    #Returns rather than retrying until stopped
+    SimulationHarness._drive_pump(None, pump, threading.Event(), latencies)
+    assert pump.commands == _harness.PUMP_MAX_FAILURES
+    assert latencies == []
+
+
+def test_harness_benchmark():
+    with SimulationHarness(pumps=2, controllers=3, spectrometers=1, controllers_per_bus=2,
+                           pump_models=('HarvardApparatus',)) as harness:
+        assert len(harness.buses) == 2
+        report = harness.benchmark(duration=1.0, poll_interval=0.1, loop_period=0.05)
+    assert report['devices'] == {'pumps': 2, 'controllers': 3, 'spectrometers': 1}
+    #The loop pump and the free-running pump both send commands
+    assert report['pump_commands_per_second'] > 10
+    assert report['modbus_transactions_per_second'] == pytest.approx(30, rel=0.3)
+    assert report['frames_per_second'] > 20
+    #Loose bound; the latency depends on the load of the machine running the tests
+    assert 0 <= report['loop_latency_p95'] < 0.5
+    assert report['cpu_per_device'] > 0
+    assert report['simulator_cpu_per_device'] > 0
+    assert harness.server is None
+
+
+def test_scale_benchmark():
+    reports = scale_benchmark([1, 2], duration=0.3, controllers=0, spectrometers=0, poll_interval=0.1)
+    assert [report['n'] for report in reports] == [1, 2]
+    assert reports[1]['devices']['pumps'] == 2
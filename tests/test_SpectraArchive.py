@@ -0,0 +1,51 @@
+from chemios.recording import SpectraArchive
+import numpy as np
+import pytest
+
+wavelengths = np.linspace(200, 900, 128)
+
+
+def test_append_and_read(tmp_path):
+    path = str(tmp_path)
+    frames = np.random.rand(50, 128).astype(np.float32)
+    with SpectraArchive(path, wavelengths, mode='w', block_frames=16) as archive:
+        for i, frame in enumerate(frames):
+            archive.append(frame, timestamp=float(i))
+    archive = SpectraArchive(path)
+    assert len(archive) == 50
+    assert np.allclose(archive.wavelengths, wavelengths)
+    timestamps, selected = archive.read(10, 20)
+    assert isinstance(selected, np.memmap)
+    assert np.array_equal(timestamps, np.arange(10, 20))
+    assert np.array_equal(selected, frames[10:20])
+
+
+def test_append_spectrum_pair(tmp_path):
+    path = str(tmp_path)
+    spectrum = [list(wavelengths), list(np.ones(128))]
+    with SpectraArchive(path, wavelengths, mode='w') as archive:
+        archive.append(spectrum)
+    with SpectraArchive(path, mode='a') as archive:
+        archive.append(spectrum)
+        with pytest.raises(ValueError):
+            archive.append(np.ones(64))
+    archive = SpectraArchive(path)
+    assert len(archive) == 2
+    assert archive.timestamps[1] >= archive.timestamps[0]
+    assert np.all(archive.frames == 1)
+
+
+def test_frames_after_last_flush_recovered(tmp_path):
+    path = str(tmp_path)
+    archive = SpectraArchive(path, wavelengths, mode='w', block_frames=16)
+    for i in range(5):
+        archive.append(np.ones(128), timestamp=float(i + 1))
+    archive.flush()
+    for i in range(5, 12):
+        archive.append(np.ones(128), timestamp=float(i + 1))
+    #No close, as after a crash: the header still counts 5 frames
+    archive._frames.flush()
+    archive._timestamps.flush()
+    reopened = SpectraArchive(path)
+    assert len(reopened) == 12
+    assert np.array_equal(reopened.timestamps, np.arange(1, 13))
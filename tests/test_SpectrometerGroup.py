@@ -0,0 +1,44 @@
+from chemios.spectrometers import SpectrometerGroup
+import SyntheticSeabreeze
+import pytest
+
+models = ['FLMS02673', 'QEP01234']
+
+
+@pytest.fixture()
+def real_time():
+    SyntheticSeabreeze.settings.update(transmission=0.5, noise=0.0, real_time=True)
+    yield
+    SyntheticSeabreeze.settings.update(real_time=False)
+
+
+def test_concurrent_read(real_time):
+    with SpectrometerGroup(models, SyntheticSeabreeze) as group:
+        frames = group.read(100000)
+        acquisitions = [group.spectrometers[model].ocean_optics.acquisitions[-1] for model in models]
+    assert set(frames) == set(models)
+    #Both 100 ms integrations run at the same time
+    assert max(start for start, stop in acquisitions) < min(stop for start, stop in acquisitions)
+    assert abs(frames[models[0]]['timestamp'] - frames[models[1]]['timestamp']) < 0.05
+
+
+def test_aligned_frames(real_time):
+    with SpectrometerGroup(models, SyntheticSeabreeze) as group:
+        group.start_acquisition({models[0]: 10000, models[1]: 30000})
+        joints = []
+        for joint in group.aligned_frames(timeout=1):
+            joints.append(joint)
+            if len(joints) == 5:
+                break
+        group.stop_acquisition()
+    for joint in joints:
+        timestamps = [frame['timestamp'] for frame in joint['frames'].values()]
+        assert max(timestamps) - min(timestamps) <= 0.03
+    assert group.frames_unmatched > 0
+    assert [j['timestamp'] for j in joints] == sorted(j['timestamp'] for j in joints)
+
+
+def test_missing_integration_time():
+    with SpectrometerGroup(models, SyntheticSeabreeze) as group:
+        with pytest.raises(ValueError):
+            group.read({models[0]: 1000})
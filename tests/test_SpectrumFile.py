@@ -0,0 +1,50 @@
+from chemios.spectrometers import OceanOptics, save_spectrum, load_spectrum
+import SyntheticSeabreeze
+import numpy as np
+import pytest
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path/'run.spec')
+    wavelengths = np.linspace(200, 1000, 2048)
+    frames = np.random.RandomState(0).uniform(0, 65535, (10, 2048))
+    save_spectrum(path, np.vstack([wavelengths, frames]), integration_time=1000, captured=12.5)
+    spectrum, header = load_spectrum(path)
+    assert isinstance(spectrum, np.memmap) and spectrum.dtype == np.float32
+    assert spectrum.shape == (11, 2048)
+    assert header == {'rows': 11, 'pixels': 2048, 'integration_time': 1000, 'captured': 12.5}
+    assert np.allclose(spectrum[1:], frames, rtol=1e-6)
+    with pytest.raises(ValueError):
+        spectrum[0, 0] = 0
+
+
+def test_invalid_files(tmp_path):
+    path = str(tmp_path/'blank.spec')
+    with pytest.raises(ValueError):
+        save_spectrum(path, np.zeros(10))
+    save_spectrum(path, np.zeros((2, 100)))
+    assert load_spectrum(path)[1]['integration_time'] is None
+    with open(path, 'r+b') as f:
+        f.truncate(200)
+    with pytest.raises(IOError):
+        load_spectrum(path)
+    with open(path, 'wb') as f:
+        f.write(b'wavelength,intensity\n')
+    with pytest.raises(IOError):
+        load_spectrum(path)
+
+
+def test_store_references_from_files(tmp_path):
+    SyntheticSeabreeze.settings.update(transmission=1.0, noise=0.0, real_time=False)
+    with OceanOptics('FLMS02673', SyntheticSeabreeze) as spec:
+        blank = spec.read_spectrometer_raw(1000, as_array=True)
+        dark = blank.copy()
+        dark[1] = SyntheticSeabreeze.DARK_COUNTS
+        save_spectrum(str(tmp_path/'blank.spec'), blank, integration_time=1000)
+        save_spectrum(str(tmp_path/'dark.spec'), dark, integration_time=1000)
+        spec.store_blank(str(tmp_path/'blank.spec'))
+        spec.store_dark(str(tmp_path/'dark.spec'))
+        assert spec.blank_integration_time == 1000
+        SyntheticSeabreeze.settings.update(transmission=0.1)
+        wavelengths, absorbance = spec.absorbance_read(1000, 1, as_array=True)
+        assert np.allclose(absorbance, 1.0, atol=1e-4)
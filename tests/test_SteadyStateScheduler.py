@@ -0,0 +1,119 @@
+from chemios.protocols import SteadyStateScheduler, residence_time
+from chemios.temperature_controllers import OmegaCN9300Series
+import SyntheticModbus
+import minimalmodbus
+import math
+import pytest
+import time
+
+
+class FakePump(object):
+    def __init__(self, value, units='mL/min', direction='INF'):
+        self.rate = {'value': value, 'units': units}
+        self.direction = direction
+
+    def set_rate(self, rate):
+        self.rate = rate
+
+
+def rates(*values):
+    return [{'value': value, 'units': 'mL/min'} for value in values]
+
+
+def test_residence_time():
+    pumps = [FakePump(500, 'uL/min'), FakePump(0.5), FakePump(3, direction='WDR')]
+    assert residence_time(pumps, 2.0) == pytest.approx(120.0)
+    assert residence_time([FakePump(0)], 2.0) == float('inf')
+
+
+def test_dispersion_waits():
+    pumps = [FakePump(1.0)]
+    plug = SteadyStateScheduler(pumps, reactor_volume=1.0)
+    assert plug.washout_time() == pytest.approx(60.0)
+    dispersed = SteadyStateScheduler(pumps, reactor_volume=1.0, peclet=50)
+    assert dispersed.breakthrough_time() < 60.0 < dispersed.washout_time()
+    #Less dispersion, sharper front
+    sharper = SteadyStateScheduler(pumps, reactor_volume=1.0, peclet=500)
+    assert dispersed.washout_time() > sharper.washout_time() > 60.0
+    transfer = SteadyStateScheduler(pumps, reactor_volume=1.0, transfer_volume=0.5)
+    assert transfer.washout_time() == pytest.approx(90.0)
+
+
+def test_acquires_at_steady_state():
+    pumps = [FakePump(0.5), FakePump(0.5)]
+    scheduler = SteadyStateScheduler(pumps, reactor_volume=0.004, peclet=100)
+    conditions = [{'rates': rates(0.5, 0.5)}, {'rates': rates(0.25, 0.25)}]
+    times = []
+    results = scheduler.run(conditions, lambda condition: times.append(time.monotonic()) or condition)
+    assert results == conditions
+    assert pumps[0].rate == {'value': 0.25, 'units': 'mL/min'}
+    #The slower condition waits twice as long
+    first, second = (record['waited'] for record in scheduler.history)
+    assert first >= 0.24*scheduler._washout
+    assert second >= 0.48*scheduler._washout
+    assert second < 0.48*scheduler._washout + 0.1
+    assert not any(record['pipelined'] for record in scheduler.history)
+
+
+def test_pipelines_next_condition():
+    pumps = [FakePump(1.0)]
+    scheduler = SteadyStateScheduler(pumps, reactor_volume=0.01, peclet=100, acquisition_time=0.05)
+    conditions = [{'rates': rates(1.0)}, {'rates': rates(2.0)}, {'rates': rates(1.0)}]
+
+    def acquire(condition):
+        time.sleep(0.05)
+        return pumps[0].rate['value']
+
+    #Each acquisition runs while the next condition flows in
+    assert scheduler.run(conditions, acquire) == [2.0, 1.0, 1.0]
+    assert [record['pipelined'] for record in scheduler.history] == [True, True, False]
+    #Too long an acquisition is not overlapped
+    scheduler.acquisition_time = 10
+    assert not scheduler.can_pipeline({'rates': rates(2.0)})
+
+
+def test_waits_for_temperature(monkeypatch):
+    SyntheticModbus.reset()
+    SyntheticModbus.settings.update(max_block=125, frame_time=0.0, time_constant=0.2)
+    monkeypatch.setattr(minimalmodbus, 'Instrument', SyntheticModbus.Instrument)
+    omega = OmegaCN9300Series('/dev/ttyUSB0', 1)
+    scheduler = SteadyStateScheduler([FakePump(1.0)], reactor_volume=0.002, temperature_controllers=[omega],
+                                     acquisition_time=0.05, poll_interval=0.02)
+    conditions = [{'rates': rates(1.0), 'temperatures': [60]}, {'rates': rates(1.0), 'temperatures': [40]}]
+    readings = scheduler.run(conditions, lambda condition: omega.get_current_temperature()['current_temp'],
+                             timeout=10)
+    assert readings[0] == pytest.approx(60, abs=0.5)
+    assert readings[1] == pytest.approx(40, abs=0.5)
+    #Heated fluid would reach the detector at once, so the ramp is not pipelined
+    assert not scheduler.history[0]['pipelined']
+    scheduler.stop()
+    assert scheduler.wait_for_steady_state() is False
+
+
+class LaggingZone(object):
+    '''Temperature zone that holds its old temperature for a dead time after each step'''
+    def __init__(self, dead_time=0.3, time_constant=0.1, temperature=25.0):
+        self.dead_time = dead_time
+        self.time_constant = time_constant
+        self.start = temperature
+        self.setpoint = temperature
+        self.changed = time.monotonic()
+
+    def set_temperature(self, setpoint):
+        self.start = self.get_current_temperature()['current_temp']
+        self.setpoint = setpoint
+        self.changed = time.monotonic()
+
+    def get_current_temperature(self):
+        elapsed = max(time.monotonic() - self.changed - self.dead_time, 0)
+        temperature = self.setpoint + (self.start - self.setpoint)*math.exp(-elapsed/self.time_constant)
+        return {'temp_set_point': self.setpoint, 'current_temp': round(temperature, 1)}
+
+
+def test_waits_for_lagging_zone():
+    zone = LaggingZone()
+    scheduler = SteadyStateScheduler([FakePump(1.0)], reactor_volume=0.002, temperature_controllers=[zone],
+                                     poll_interval=0.02)
+    readings = scheduler.run([{'rates': rates(1.0), 'temperatures': [80]}],
+                             lambda condition: zone.get_current_temperature()['current_temp'], timeout=10)
+    assert readings[0] == pytest.approx(80, abs=0.5)
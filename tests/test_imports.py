@@ -0,0 +1,54 @@
+import chemios
+import json
+import os
+import subprocess
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ['numpy', 'pandas', 'arrow', 'tinydb', 'minimalmodbus', 'asyncio', 'serial']
+#Optional limit in seconds on each import, e.g. CHEMIOS_IMPORT_BUDGET=0.25; wall-clock
+#times vary too much between machines to check by default
+BUDGET = os.environ.get('CHEMIOS_IMPORT_BUDGET')
+
+
+def import_time(statement, repeats=3):
+    '''Best time of statement in fresh interpreters, and the heavy modules it loaded'''
+    code = ("import sys, time, json\n"
+            "start = time.perf_counter()\n"
+            "{}\n"
+            "elapsed = time.perf_counter() - start\n"
+            "print(json.dumps([elapsed, sorted(m for m in {!r} if m in sys.modules)]))").format(statement, HEAVY)
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    results = []
+    for i in range(repeats):
+        output = subprocess.check_output([sys.executable, '-W', 'ignore', '-c', code], env=env, cwd=ROOT)
+        results.append(json.loads(output.decode().strip().splitlines()[-1]))
+    return min(result[0] for result in results), results[0][1]
+
+
+@pytest.mark.parametrize('statement, loaded', [
+    ('import chemios', []),
+    ('from chemios.pumps import Chemyx', ['serial']),
+    ('from chemios.pumps import HarvardApparatus, NewEra', ['serial']),
+    ('from chemios.protocols import ProtocolScheduler, SteadyStateScheduler', []),
+    ('from chemios.temperature_controllers import SettleDetector', []),
+    ('from chemios.control import ControlLoop, PID', []),
+])
+def test_import_time(statement, loaded):
+    elapsed, modules = import_time(statement, repeats=3 if BUDGET else 1)
+    assert modules == loaded
+    if BUDGET:
+        assert elapsed < float(BUDGET)
+
+
+def test_lazy_attributes():
+    assert 'pumps' in dir(chemios)
+    assert chemios.Protocol is chemios.protocols.Protocol
+    assert 'OceanOptics' in dir(chemios.spectrometers)
+    from chemios.spectrometers import OceanOptics
+    assert chemios.spectrometers.OceanOptics is OceanOptics
+    with pytest.raises(AttributeError):
+        chemios.spectrometers.NotADriver
+    with pytest.raises(ImportError):
+        from chemios.pumps import NotAPump  # noqa: F401
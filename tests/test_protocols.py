@@ -1,6 +1,9 @@
-from chemios import Protocol
+from chemios import Protocol, ProtocolScheduler, StatusCodes
 from random import randint, random
 import asyncio
+import threading
+import time
+import pytest
 from time import sleep
 
 
@@ -34,3 +37,82 @@ class MockProtocol(Protocol):
             return True
 
 
+class TimedProtocol(Protocol):
+    '''Protocol that holds its devices for a fixed time and logs when'''
+
+    def __init__(self, devices, duration=0.1, log=None):
+        super(TimedProtocol, self).__init__(devices=devices)
+        self.duration = duration
+        self.log = log if log is not None else []
+
+    def start(self):
+        begin = time.monotonic()
+        time.sleep(self.duration)
+        self.log.append((begin, time.monotonic(), self.devices))
+        return self.name
+
+
+def _overlaps(a, b):
+    return a[0] < b[1] and b[0] < a[1]
+
+
+def test_disjoint_devices_run_in_parallel():
+    pump_1, pump_2 = object(), object()
+    log = []
+    protocols = [TimedProtocol([pump_1], 0.2, log), TimedProtocol([pump_2], 0.2, log)]
+    ProtocolScheduler().run(protocols)
+    assert _overlaps(log[0], log[1])
+    for protocol in protocols:
+        assert protocol.status() == StatusCodes.stopped()
+
+
+def test_shared_device_is_exclusive():
+    pump, controller = object(), object()
+    log = []
+    protocols = [TimedProtocol([pump], 0.1, log),
+                 TimedProtocol([controller, pump], 0.1, log)]
+    ProtocolScheduler().run(protocols)
+    assert not _overlaps(log[0], log[1])
+
+
+def test_opposite_lock_order_does_not_deadlock():
+    pump, controller = object(), object()
+    protocols = []
+    for i in range(20):
+        devices = [pump, controller] if i % 2 else [controller, pump]
+        protocols.append(TimedProtocol(devices, 0.001))
+    results = ProtocolScheduler().run(protocols, timeout=10)
+    assert len(results) == 20
+
+
+def test_async_protocol():
+    class AsyncProtocol(Protocol):
+        async def start(self):
+            await asyncio.sleep(0)
+            return 'done'
+    assert ProtocolScheduler().run([AsyncProtocol()]) == ['done']
+
+
+def test_lease_timeout():
+    pump = object()
+    scheduler = ProtocolScheduler()
+    with scheduler.lease([pump]):
+        held = threading.Event()
+        def other():
+            with pytest.raises(TimeoutError):
+                scheduler.lease([pump], timeout=0.05).acquire()
+            held.set()
+        thread = threading.Thread(target=other)
+        thread.start()
+        thread.join()
+        assert held.is_set()
+
+
+def test_protocol_error_sets_status():
+    class FailingProtocol(Protocol):
+        def start(self):
+            raise ValueError('Pump not connected')
+    protocol = FailingProtocol()
+    with pytest.raises(ValueError):
+        ProtocolScheduler().run([protocol])
+    assert protocol.status() == StatusCodes.stopped('Pump not connected')
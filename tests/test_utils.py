@@ -1 +1,9 @@
+from chemios.utils import convert_to_lists
+import pandas as pd
 
+
+def test_convert_to_lists():
+    df = pd.DataFrame({'wavelength': [400.0, 401.0], 'intensity': [10, 12]})
+    output = convert_to_lists(df)
+    assert output == [[400.0, 401.0], [10, 12]]
+    assert type(output[1][0]) is int